@@ -4,64 +4,518 @@ Flask application for PDF form filling
 """
 import os
 import json
-from flask import Flask, render_template, request, send_file, jsonify
+import time
+from functools import wraps
+from flask import (
+    Flask, Request, Response, abort, g, render_template, request, send_file, jsonify, url_for
+)
+import hashlib
+import mimetypes
 from io import BytesIO
 from datetime import datetime
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import ClosingIterator, get_input_stream
 import sys
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from backend.pdf_filler import fill_pdf_form, fill_pdf_from_bytes
-from backend.pdf_validator import validate_uploaded_pdf
-from backend.field_mapping import FORM_FIELDS
+# The PDF stack (reportlab, pypdf, BiDi) is imported by the routes that fill,
+# so the app boots and answers /health and /api/fields without loading it
+from backend.specialization import TenantConstants
+from backend.pdf_validator import (
+    validate_uploaded_pdf, prescreen_pdf, PrescreenedUploadStream, EXPECTED_PAGE_COUNT
+)
+from backend.upload_buffer import open_upload, SPOOL_THRESHOLD
+from backend.request_body import (
+    decompress_body, read_signature_part, CONTENT_ENCODINGS, UnsupportedEncoding, BodyTooLarge
+)
+from backend.profiling import RequestProfiler, PROFILE_FORMATS
+from backend.pdf_output import OUTPUT_MODES, parse_pages
+from backend.field_schema import SCHEMA_MAX_AGE, get_schema
+from backend.admission import check_payload
+from backend.form_registry import REGISTRY_DIR, RELOAD_INTERVAL, TemplateRegistry, builtin_template
+from backend.static_assets import (
+    AssetManifest, PrecompressedBody, IMMUTABLE_CACHE_CONTROL, SHELL_ASSETS, STATIC_DIR, file_digest
+)
+from backend.metrics import (
+    metrics, stage, start_request, end_request, server_timing_header, SIZE_BUCKETS
+)
+
+
+class FormFillerRequest(Request):
+    """Request that pre-screens uploaded PDFs while they are being received"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        stream = super()._get_file_stream(
+            total_content_length, content_type, filename, content_length
+        )
+        if filename and filename.lower().endswith('.pdf'):
+            return PrescreenedUploadStream(stream)
+        return stream
+
+
+class SendTimingMiddleware:
+    """Times sending API response bodies, which happens after Flask's hooks"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        app_iter = self.wsgi_app(environ, start_response)
+        if not environ.get('PATH_INFO', '').startswith('/api/'):
+            return app_iter
+        send_start = time.perf_counter()
+
+        def record_send():
+            # Server-Timing has already been sent, so this only reaches /metrics
+            metrics.observe('stage_duration_seconds', time.perf_counter() - send_start,
+                            labels={'stage': 'send'})
+            metrics.flush()
+
+        # send_file responses bypass Response.call_on_close, so wrap the iterator
+        return ClosingIterator(app_iter, record_send)
+
+
+class DecompressRequestMiddleware:
+    """Inflates compressed request bodies before Flask reads them"""
+
+    def __init__(self, wsgi_app, config):
+        self.wsgi_app = wsgi_app
+        self.config = config
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip()
+        if not encoding or encoding.lower() == 'identity':
+            return self.wsgi_app(environ, start_response)
+
+        # The sent and the inflated body are both held to MAX_CONTENT_LENGTH
+        limit = self.config['MAX_CONTENT_LENGTH']
+        try:
+            stream = get_input_stream(environ, max_content_length=limit)
+            body, size = decompress_body(stream, encoding, limit,
+                                         self.config['UPLOAD_SPOOL_THRESHOLD'])
+        except UnsupportedEncoding as e:
+            return self.error(start_response, '415 Unsupported Media Type', str(e),
+                              [('Accept-Encoding', ', '.join(CONTENT_ENCODINGS))])
+        except (BodyTooLarge, RequestEntityTooLarge) as e:
+            message = str(e) if isinstance(e, BodyTooLarge) else 'Request body is too large'
+            return self.error(start_response, '413 Request Entity Too Large', message)
+        except ValueError as e:
+            return self.error(start_response, '400 Bad Request', str(e))
+
+        environ['formfiller.wire_length'] = environ.get('CONTENT_LENGTH')
+        environ['wsgi.input'] = body
+        environ['CONTENT_LENGTH'] = str(size)
+        environ.pop('HTTP_CONTENT_ENCODING')
+        return ClosingIterator(self.wsgi_app(environ, start_response), body.close)
+
+    @staticmethod
+    def error(start_response, status, message, headers=()):
+        """JSON error response, in the format of the routes' errors"""
+        payload = json.dumps({'error': message}).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'),
+                                ('Content-Length', str(len(payload)))] + list(headers))
+        return [payload]
+
 
 app = Flask(__name__)
+app.request_class = FormFillerRequest
+app.wsgi_app = SendTimingMiddleware(DecompressRequestMiddleware(app.wsgi_app, app.config))
 app.config['TEMPLATES_FOLDER'] = 'templates'
 app.config['TEMPLATE_PDF'] = os.path.join('templates', 'template.pdf')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['UPLOAD_SPOOL_THRESHOLD'] = SPOOL_THRESHOLD  # mmap uploads above this size
+# 'overlay' merges a reportlab overlay; 'acroform' fills widgets on a derived template
+app.config['FILL_MODE'] = os.environ.get('FORM_FILL_MODE', 'overlay')
+app.config['ACROFORM_FLATTEN'] = os.environ.get('ACROFORM_FLATTEN', '0') == '1'
+# 'fast' appends the fill to the template; 'small' rewrites it compacted.
+# Overridden per request by the ?output= query parameter or X-Output-Mode header
+app.config['OUTPUT_MODE'] = os.environ.get('FORM_OUTPUT_MODE', 'fast')
+# Per-tenant constant field values (tenants/<tenant_id>.json), selected by
+# the ?tenant= query parameter or the X-Tenant header
+app.config['TENANTS_DIR'] = os.environ.get('TENANTS_DIR', 'tenants')
+# Reject submissions with keys that are not form fields (?strict=1 per request)
+app.config['STRICT_FIELDS'] = os.environ.get('FORM_STRICT_FIELDS', '0') == '1'
+# Form definitions (<dir>/<template_id>.json|yaml), reloaded when they change;
+# routes without a template ID fill DEFAULT_TEMPLATE
+app.config['TEMPLATE_REGISTRY_DIR'] = os.environ.get('TEMPLATE_REGISTRY_DIR', REGISTRY_DIR)
+app.config['DEFAULT_TEMPLATE'] = os.environ.get('FORM_DEFAULT_TEMPLATE', 'visit_report')
+app.config['TEMPLATE_RELOAD_INTERVAL'] = float(
+    os.environ.get('TEMPLATE_RELOAD_INTERVAL', RELOAD_INTERVAL))  # 0 disables reloading
+# Allow `X-Profile: pstats|collapsed` to return a profile instead of the PDF
+app.config['PROFILING_ENABLED'] = os.environ.get('FORM_PROFILING', '0') == '1'
+
+tenant_constants = TenantConstants(app.config['TENANTS_DIR'])
+
+template_registry = TemplateRegistry(app.config['TEMPLATE_REGISTRY_DIR'],
+                                     builtin_template(app.config['TEMPLATE_PDF']))
+template_registry.refresh()
+template_registry.watch(app.config['TEMPLATE_RELOAD_INTERVAL'])
+
+# Serialize the field schema now rather than on the first /api/fields request
+get_schema()
+
+# Hashed builds of the static files (tools/build_static_assets.py), if any
+assets = AssetManifest()
+
+# The form page, rendered and compressed once (see index())
+_index_page = None
+
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file: its immutable hashed build, or the plain file"""
+    hashed_name = assets.hashed_name(filename)
+    if hashed_name:
+        return url_for('hashed_asset', filename=hashed_name)
+    return url_for('static', filename=filename)
+
+
+def cache_stats(module_name, cache_name):
+    """Stats of a backend cache, without importing its module just to report them"""
+    module = sys.modules.get(module_name)
+    return getattr(module, cache_name).stats() if module else {}
+
+
+metrics.register_gauges('compiled_templates',
+                        lambda: cache_stats('backend.merge_plan', 'compiled_templates'))
+metrics.register_gauges('specialized_templates',
+                        lambda: cache_stats('backend.specialization', 'specialized_templates'))
+metrics.register_gauges('template_registry', template_registry.stats)
+
+
+def warm_up():
+    """Load the PDF stack, register fonts and compile the template ahead of traffic"""
+    from backend.pdf_filler import warm_up as warm_up_pdf_stack
+    warm_up_pdf_stack(app.config['TEMPLATE_PDF'])
+    if app.config['FILL_MODE'] == 'acroform':
+        from backend.acroform import get_acroform_filler
+        get_acroform_filler(app.config['TEMPLATE_PDF'])
+    template_registry.warm_up()
+
+
+@app.before_request
+def start_timing():
+    """Start recording pipeline stages for API requests"""
+    if request.path.startswith('/api/'):
+        g.request_start = time.perf_counter()
+        g.timings = start_request()
+
+
+@app.after_request
+def record_timing(response):
+    """Add a Server-Timing header and record the request in the metrics"""
+    timings = g.pop('timings', None)
+    if timings is None:
+        return response
+    end_request()
+    endpoint = request.endpoint or 'unknown'
+    total = time.perf_counter() - g.request_start
+    response.headers['Server-Timing'] = server_timing_header(timings + [('total', total)])
+
+    metrics.inc('requests_total', {'endpoint': endpoint, 'status': response.status_code})
+    metrics.observe('request_duration_seconds', total, labels={'endpoint': endpoint})
+    for stage_name, seconds in timings:
+        metrics.observe('stage_duration_seconds', seconds, labels={'stage': stage_name})
+    # Bytes as sent, before any Content-Encoding was inflated
+    request_size = int(request.environ.get('formfiller.wire_length') or request.content_length or 0)
+    if request_size:
+        metrics.observe('request_size_bytes', request_size, SIZE_BUCKETS, {'endpoint': endpoint})
+    if response.content_length:
+        metrics.observe('response_size_bytes', response.content_length,
+                        SIZE_BUCKETS, {'endpoint': endpoint})
+
+    return response
+
+
+def profilable(view):
+    """Run the view under a profiler when profiling is enabled and requested"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        kind = request.headers.get('X-Profile') if app.config['PROFILING_ENABLED'] else None
+        if not kind:
+            return view(*args, **kwargs)
+        if kind not in PROFILE_FORMATS:
+            return jsonify({
+                'error': f'X-Profile must be one of: {", ".join(PROFILE_FORMATS)}'
+            }), 400
+
+        with RequestProfiler(kind) as profiler:
+            response = app.make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return response  # Errors are more useful than a profile of them
+        return Response(profiler.report(), mimetype='text/plain')
+    return wrapper
+
+
+def requested_output_mode():
+    """The output mode asked for by the request, or the configured default"""
+    return request.args.get('output') or request.headers.get('X-Output-Mode') or app.config['OUTPUT_MODE']
+
+
+def output_mode_error(output_mode):
+    """400 response for an unknown output mode, or None if it is valid"""
+    if output_mode in OUTPUT_MODES:
+        return None
+    return jsonify({
+        'error': f'Output mode must be one of: {", ".join(OUTPUT_MODES)}'
+    }), 400
+
+
+def requested_pages(page_count=EXPECTED_PAGE_COUNT):
+    """Template page indices asked for with ?pages=, or None for all pages"""
+    spec = request.args.get('pages')
+    return parse_pages(spec, page_count) if spec else None
+
+
+def requested_form(template_id):
+    """The FormTemplate of a route's template ID (the default form without one), or None"""
+    return template_registry.get(template_id or app.config['DEFAULT_TEMPLATE'])
+
+
+def unknown_template(template_id):
+    """404 response for a template ID the registry doesn't have"""
+    return jsonify({
+        'error': f'Unknown template: {template_id or app.config["DEFAULT_TEMPLATE"]}'
+    }), 404
+
+
+def parse_fill_request():
+    """
+    Form data of an /api/fill request: a JSON body, or a multipart body with a
+    `form_data` JSON part and optionally the signature as a binary `signature` part
+
+    Raises:
+        ValueError: if the form data or signature is malformed
+    """
+    if request.mimetype != 'multipart/form-data':
+        return request.get_json()
+    form_data_json = request.form.get('form_data')
+    if not form_data_json:
+        return None
+    try:
+        form_data = json.loads(form_data_json)
+    except json.JSONDecodeError:
+        raise ValueError('Invalid form data format') from None
+    return with_signature_part(form_data)
+
+
+def with_signature_part(form_data):
+    """Add a binary `signature` part of the request to the form data"""
+    signature = read_signature_part(request.files)
+    if signature is not None and isinstance(form_data, dict):
+        form_data['signature_image'] = signature
+    return form_data
+
+
+def payload_error(form_data, form):
+    """400 response if the form data is over the admission limits of the form (or,
+    in strict mode, has keys that are not its fields), or None"""
+    with stage('admit'):
+        admission = check_payload(form_data, form.schema.fields)
+    if not admission['valid']:
+        for limit in admission['limits']:
+            metrics.inc('payload_rejections_total', {'limit': limit})
+        return jsonify({
+            'error': 'Form data rejected',
+            'details': admission['errors']
+        }), 400
+
+    strict = request.args.get('strict', '1' if app.config['STRICT_FIELDS'] else '0') == '1'
+    if strict:
+        unknown = form.extractor.unknown_keys(form_data)
+        if unknown:
+            return jsonify({'error': 'Unknown fields', 'details': unknown}), 400
+    return None
+
+
+def prescreen_upload(pdf_file, pdf_bytes, page_count=EXPECTED_PAGE_COUNT):
+    """Cheap header/trailer check, reusing any rejection made during the upload"""
+    rejection = getattr(pdf_file.stream, 'rejection', None)
+    if rejection:
+        return {'valid': False, 'errors': [rejection], 'info': {'page_count': None}}
+    return prescreen_pdf(pdf_bytes, page_count)
 
 
 @app.route('/')
 def index():
-    """Render the main form page"""
-    return render_template('form.html')
-
-
-@app.route('/api/fields', methods=['GET'])
-def get_fields():
-    """Return list of all form fields"""
-    fields_info = {}
-    for field_name, field_config in FORM_FIELDS.items():
-        fields_info[field_name] = {
-            'type': 'checkbox' if field_config.get('checkbox') else 'text',
-            'multiline': field_config.get('multiline', False),
-            'max_length': field_config.get('max_length'),
-            'page': field_config.get('page')
-        }
-    return jsonify(fields_info)
-
-
-@app.route('/api/fill', methods=['POST'])
-def fill_form():
+    """Serve the main form page (rendered once; re-rendered in debug mode)"""
+    global _index_page
+    if _index_page is None or app.debug:
+        _index_page = PrecompressedBody(render_template('form.html').encode('utf-8'))
+
+    # The page names the current asset hashes, so it is always revalidated
+    body, encoding, etag = _index_page.select(request.accept_encodings)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if _index_page.matches(request.if_none_match):
+        return Response(status=304, headers=headers)
+
+    response = Response(body, mimetype='text/html', headers=headers)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    """Serve a hashed static build, precompressed when the client accepts it"""
+    path, encoding = assets.encoded_file(filename, request.accept_encodings)
+    if path is None:
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if filename.endswith('.json'):
+        mimetype = 'application/manifest+json'  # manifest.json is the only JSON asset
+    response = send_file(path, mimetype=mimetype, conditional=False, etag=False)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.route('/sw.js')
+def service_worker():
+    """The service worker, listing the app shell it caches for offline use"""
+    shell_urls = ['/'] + [asset_url(name) for name in SHELL_ASSETS] + ['/api/fields']
+    # Changed assets change the worker's cache name, so stale copies are dropped
+    version = hashlib.sha256(' '.join(
+        file_digest(os.path.join(STATIC_DIR, name)) for name in SHELL_ASSETS
+    ).encode('ascii')).hexdigest()[:12]
+    script = render_template('sw.js', shell_urls=shell_urls, version=version)
+    return Response(script, mimetype='application/javascript',
+                    headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/api/templates', methods=['GET'])
+def list_templates():
+    """List the forms that can be filled (see form_registry.py)"""
+    return jsonify({
+        'templates': [form.describe() for form in template_registry.templates()],
+        'default': app.config['DEFAULT_TEMPLATE']
+    })
+
+
+@app.route('/api/fields', methods=['GET'], defaults={'template_id': None})
+@app.route('/api/templates/<template_id>/fields', methods=['GET'])
+def get_fields(template_id):
+    """Return a form's field schema (precompiled; see field_schema.py)"""
+    form = requested_form(template_id)
+    if form is None:
+        return unknown_template(template_id)
+    schema = form.schema
+    gzipped = request.accept_encodings['gzip'] > 0
+    headers = {
+        'ETag': f'"{schema.gzip_etag if gzipped else schema.etag}"',
+        'Cache-Control': f'public, max-age={SCHEMA_MAX_AGE}',
+        'Vary': 'Accept-Encoding',
+    }
+    # Either encoding's ETag means the client has the current schema
+    if request.if_none_match.contains_weak(schema.etag) or \
+            request.if_none_match.contains_weak(schema.gzip_etag):
+        return Response(status=304, headers=headers)
+
+    response = Response(schema.gzipped if gzipped else schema.body,
+                        mimetype='application/json', headers=headers)
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@app.route('/api/fill', methods=['POST'], defaults={'template_id': None})
+@app.route('/api/templates/<template_id>/fill', methods=['POST'])
+@profilable
+def fill_form(template_id):
     """Fill the PDF form with submitted data"""
     try:
+        form = requested_form(template_id)
+        if form is None:
+            return unknown_template(template_id)
+
         # Get form data from request
-        form_data = request.get_json()
+        try:
+            with stage('parse'):
+                form_data = parse_fill_request()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         if not form_data:
             return jsonify({'error': 'No form data provided'}), 400
+        # Bound the rendering cost before any of it is spent
+        error = payload_error(form_data, form)
+        if error:
+            return error
+
+        output_mode = requested_output_mode()
+        error = output_mode_error(output_mode)
+        if error:
+            return error
+        try:
+            pages = requested_pages(form.page_count)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # ?overlay=1 returns just the field layer, for clients holding the template
+        overlay_only = request.args.get('overlay') == '1'
 
         # Validate template exists
-        if not os.path.exists(app.config['TEMPLATE_PDF']):
+        if not os.path.exists(form.pdf_path):
             return jsonify({'error': 'Template PDF not found'}), 500
-
-        # Fill the PDF
-        pdf_bytes = fill_pdf_form(
-            app.config['TEMPLATE_PDF'],
-            form_data,
-            output_path=None
-        )
+        # Tenant constants and AcroForm templates exist for the built-in form only
+        builtin = form is template_registry.builtin
+
+        tenant_id = request.args.get('tenant') or request.headers.get('X-Tenant')
+        constants = None
+        if tenant_id and not builtin:
+            return jsonify({'error': f'Tenants are not supported by template {form.template_id}'}), 400
+        if tenant_id:
+            constants = tenant_constants.get(tenant_id)
+            if constants is None:
+                return jsonify({'error': f'Unknown tenant: {tenant_id}'}), 400
+
+        # Fill the PDF. Page subsets and overlay-only responses are always
+        # drawn by the overlay pipeline, whatever the fill mode.
+        from backend.pdf_filler import fill_pdf_form
+        from backend.acroform import fill_pdf_acroform
+        from backend.specialization import fill_pdf_specialized
+        acroform = (app.config['FILL_MODE'] == 'acroform' and builtin
+                    and pages is None and not overlay_only)
+        if constants is not None and acroform:
+            # Widgets are filled by value, so constants are just merged in
+            pdf_bytes = fill_pdf_acroform(
+                app.config['TEMPLATE_PDF'],
+                {**form_data, **constants},
+                flatten=app.config['ACROFORM_FLATTEN'],
+                output_mode=output_mode
+            )
+        elif constants is not None and not overlay_only:
+            pdf_bytes = fill_pdf_specialized(
+                app.config['TEMPLATE_PDF'],
+                tenant_id,
+                constants,
+                form_data,
+                output_mode=output_mode,
+                pages=pages
+            )
+        elif acroform:
+            pdf_bytes = fill_pdf_acroform(
+                app.config['TEMPLATE_PDF'],
+                form_data,
+                flatten=app.config['ACROFORM_FLATTEN'],
+                output_mode=output_mode
+            )
+        else:
+            # An overlay-only response carries the tenant's constants itself
+            pdf_bytes = fill_pdf_form(
+                form.pdf_path,
+                {**form_data, **(constants or {})},
+                output_path=None,
+                output_mode=output_mode,
+                pages=pages,
+                overlay_only=overlay_only,
+                form=form
+            )
 
         # Create response
         pdf_file = BytesIO(pdf_bytes)
@@ -69,7 +523,7 @@ def fill_form():
 
         # Generate filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'visit_report_{timestamp}.pdf'
+        filename = f'{form.template_id}_{"overlay_" if overlay_only else ""}{timestamp}.pdf'
 
         return send_file(
             pdf_file,
@@ -85,10 +539,16 @@ def fill_form():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/fill-uploaded', methods=['POST'])
-def fill_uploaded_form():
+@app.route('/api/fill-uploaded', methods=['POST'], defaults={'template_id': None})
+@app.route('/api/templates/<template_id>/fill-uploaded', methods=['POST'])
+@profilable
+def fill_uploaded_form(template_id):
     """Fill an uploaded PDF form with submitted data"""
     try:
+        form = requested_form(template_id)
+        if form is None:
+            return unknown_template(template_id)
+
         # Check if file was uploaded
         if 'pdf_file' not in request.files:
             return jsonify({'error': 'No PDF file uploaded'}), 400
@@ -107,27 +567,52 @@ def fill_uploaded_form():
             return jsonify({'error': 'No form data provided'}), 400
 
         try:
-            form_data = json.loads(form_data_json)
+            with stage('parse'):
+                form_data = json.loads(form_data_json)
         except json.JSONDecodeError:
             return jsonify({'error': 'Invalid form data format'}), 400
-
-        # Read the uploaded PDF
-        pdf_bytes = pdf_file.read()
-
-        # Validate the uploaded PDF structure
-        validation_result = validate_uploaded_pdf(
-            pdf_bytes,
-            app.config['TEMPLATE_PDF']
-        )
-
-        if not validation_result['valid']:
-            return jsonify({
-                'error': 'PDF validation failed',
-                'details': validation_result['errors']
-            }), 400
-
-        # Fill the uploaded PDF with form data
-        filled_pdf_bytes = fill_pdf_from_bytes(pdf_bytes, form_data)
+        try:
+            form_data = with_signature_part(form_data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        error = payload_error(form_data, form)
+        if error:
+            return error
+
+        output_mode = requested_output_mode()
+        error = output_mode_error(output_mode)
+        if error:
+            return error
+        try:
+            pages = requested_pages(form.page_count)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Open the uploaded PDF (large uploads are memory-mapped from disk)
+        with open_upload(pdf_file, app.config['UPLOAD_SPOOL_THRESHOLD']) as pdf_bytes:
+            # Reject obvious non-PDFs and page count mismatches before parsing
+            with stage('prescreen'):
+                prescreen_result = prescreen_upload(pdf_file, pdf_bytes, form.page_count)
+            if not prescreen_result['valid']:
+                return jsonify({
+                    'error': 'PDF validation failed',
+                    'details': prescreen_result['errors']
+                }), 400
+
+            # Validate the uploaded PDF structure
+            with stage('validate'):
+                validation_result = validate_uploaded_pdf(pdf_bytes, form.pdf_path)
+
+            if not validation_result['valid']:
+                return jsonify({
+                    'error': 'PDF validation failed',
+                    'details': validation_result['errors']
+                }), 400
+
+            # Fill the uploaded PDF with form data
+            from backend.pdf_filler import fill_pdf_from_bytes
+            filled_pdf_bytes = fill_pdf_from_bytes(pdf_bytes, form_data, output_mode=output_mode,
+                                                   pages=pages, form=form)
 
         # Create response
         pdf_output = BytesIO(filled_pdf_bytes)
@@ -135,7 +620,7 @@ def fill_uploaded_form():
 
         # Generate filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'visit_report_{timestamp}.pdf'
+        filename = f'{form.template_id}_{timestamp}.pdf'
 
         return send_file(
             pdf_output,
@@ -151,10 +636,15 @@ def fill_uploaded_form():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/validate-pdf', methods=['POST'])
-def validate_pdf():
+@app.route('/api/validate-pdf', methods=['POST'], defaults={'template_id': None})
+@app.route('/api/templates/<template_id>/validate-pdf', methods=['POST'])
+def validate_pdf(template_id):
     """Validate an uploaded PDF without filling it"""
     try:
+        form = requested_form(template_id)
+        if form is None:
+            return unknown_template(template_id)
+
         if 'pdf_file' not in request.files:
             return jsonify({'error': 'No PDF file uploaded'}), 400
 
@@ -166,12 +656,14 @@ def validate_pdf():
         if not pdf_file.filename.lower().endswith('.pdf'):
             return jsonify({'error': 'File must be a PDF'}), 400
 
-        pdf_bytes = pdf_file.read()
+        with open_upload(pdf_file, app.config['UPLOAD_SPOOL_THRESHOLD']) as pdf_bytes:
+            with stage('prescreen'):
+                prescreen_result = prescreen_upload(pdf_file, pdf_bytes, form.page_count)
+            if not prescreen_result['valid']:
+                return jsonify(prescreen_result)
 
-        validation_result = validate_uploaded_pdf(
-            pdf_bytes,
-            app.config['TEMPLATE_PDF']
-        )
+            with stage('validate'):
+                validation_result = validate_uploaded_pdf(pdf_bytes, form.pdf_path)
 
         return jsonify(validation_result)
 
@@ -189,6 +681,12 @@ def health():
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request counts, stage latency histograms and cache statistics (all workers)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     # Check template exists
     if not os.path.exists(app.config['TEMPLATE_PDF']):
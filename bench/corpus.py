@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Synthetic form-data corpus - seeded, realistic payloads as NDJSON
+
+Every payload has a value for every key in FORM_FIELDS (empty strings where
+a social worker would leave a field blank), drawn from weighted Hebrew name,
+city and street lists, with valid Israeli ID check digits, mixed Hebrew and
+digit dates, free text sized towards each field's max_length, consistent
+checkbox groups and optional signature images.
+
+Usage:
+    python bench/corpus.py -n 1000 --seed 42 -o corpus.ndjson
+    python bench/corpus.py -n 50 --signature-rate 1.0 > with_signatures.ndjson
+
+The same seed always produces the same corpus.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import struct
+import sys
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from backend.field_mapping import CHECKBOX_GROUPS, FORM_FIELDS
+
+# (value, weight) - weights roughly follow how common each one is
+HEBREW_FIRST_NAMES = [
+    ("דוד", 8), ("משה", 7), ("יוסף", 6), ("אברהם", 5), ("יעקב", 5), ("שמואל", 3),
+    ("חיים", 4), ("יצחק", 4), ("מרים", 5), ("שרה", 6), ("רחל", 5), ("אסתר", 5),
+    ("לאה", 4), ("חנה", 5), ("רבקה", 4), ("שושנה", 3), ("צביה", 2), ("מזל", 2),
+    ("נורית", 2), ("אליהו", 3), ("זהבה", 2), ("פנינה", 2),
+]
+HEBREW_LAST_NAMES = [
+    ("כהן", 10), ("לוי", 8), ("מזרחי", 5), ("פרץ", 4), ("ביטון", 4), ("דהן", 3),
+    ("אברהם", 3), ("פרידמן", 3), ("אגבאריה", 2), ("מלכה", 2), ("אזולאי", 2),
+    ("כץ", 3), ("יוסף", 2), ("דוד", 2), ("עמר", 2), ("אוחיון", 2), ("חדד", 2),
+    ("גבאי", 2), ("בן דוד", 2), ("שפירא", 2), ("רוזנברג", 2),
+]
+WORKER_FIRST_NAMES = [
+    ("מריה", 6), ("אנה", 4), ("רוזה", 3), ("ג'וי", 3), ("לוז", 2), ("קומארי", 3),
+    ("פריה", 2), ("נטליה", 3), ("אולגה", 3), ("ג'ניפר", 2), ("Maria", 2), ("Joy", 1),
+]
+WORKER_LAST_NAMES = [
+    ("גרסיה", 4), ("סנטוס", 4), ("רייס", 3), ("פרננדו", 3), ("שרמה", 3),
+    ("בונדרנקו", 2), ("צ'רנוב", 2), ("דלה קרוז", 2), ("Santos", 1), ("Reyes", 1),
+]
+ORIGIN_COUNTRIES = [
+    ("הפיליפינים", 10), ("הודו", 6), ("סרי לנקה", 4), ("מולדובה", 4),
+    ("אוקראינה", 3), ("אוזבקיסטן", 3), ("נפאל", 2), ("גאורגיה", 1),
+]
+CITIES = [
+    ("ירושלים", 10), ("תל אביב", 9), ("חיפה", 6), ("ראשון לציון", 5), ("פתח תקווה", 5),
+    ("אשדוד", 4), ("נתניה", 4), ("באר שבע", 4), ("חולון", 3), ("בני ברק", 3),
+    ("רמת גן", 3), ("רחובות", 2), ("בת ים", 2), ("אשקלון", 2), ("כפר סבא", 2),
+    ("הרצליה", 2), ("חדרה", 1), ("מודיעין", 1), ("נצרת", 1), ("קריית שמונה", 1),
+]
+STREETS = [
+    ("הרצל", 6), ("ויצמן", 4), ("ז'בוטינסקי", 4), ("בן גוריון", 4), ("רוטשילד", 3),
+    ("הנביאים", 2), ("העצמאות", 3), ("יפו", 2), ("אלנבי", 2), ("בגין", 2),
+    ("הגפן", 2), ("האלון", 2), ("שדרות ירושלים", 2), ("רבי עקיבא", 2), ("סוקולוב", 2),
+]
+AGENCIES = [("כח אדם בע\"מ", 4), ("עמית סיעוד", 3), ("ש.ל. סיעוד והשמה", 2),
+            ("מטב", 3), ("דנאל", 3), ("נתן סיעוד", 2)]
+INSURANCE_COMPANIES = [("הראל", 5), ("מגדל", 4), ("כלל", 4), ("הפניקס", 4), ("מנורה", 3), ("איילון", 2)]
+HOSPITALS = [("איכילוב", 4), ("שיבא", 4), ("הדסה עין כרם", 3), ("רמב\"ם", 3), ("סורוקה", 2),
+             ("בילינסון", 3), ("שערי צדק", 2), ("מאיר", 2)]
+DURATIONS = [("שבוע", 4), ("3 ימים", 4), ("חודש", 2), ("יומיים", 3), ("10 ימים", 2), ("שבועיים", 2)]
+DAYS_OFF = [("שבת", 8), ("יום ראשון", 3), ("שישי-שבת", 3), ("יום שישי", 2), ("חצי יום שבת", 1)]
+HEBREW_MONTHS = ["ינואר", "פברואר", "מרץ", "אפריל", "מאי", "יוני", "יולי",
+                 "אוגוסט", "ספטמבר", "אוקטובר", "נובמבר", "דצמבר"]
+
+# Sentences for free-text and multiline fields (assessments, summaries, notes)
+PHRASES = [
+    "המטופל מרוצה מהעובדת", "העובדת מסורה ואכפתית", "הבית נקי ומסודר",
+    "יש צורך בהדרכה נוספת בנושא תזונה", "המשפחה מעורבת ומבקרת פעמיים בשבוע",
+    "אין קשיים מיוחדים בתקשורת", "מצב בריאותי יציב", "הולך עם הליכון",
+    "זקוק לעזרה ברחצה ובלבוש", "נוטל תרופות באופן קבוע", "העובדת דוברת עברית בסיסית",
+    "יש לעקוב אחר שתיית מים", "המטופלת ישנה היטב בלילה", "חלה ירידה בזיכרון לטווח קצר",
+    "המקרר מלא ויש מזון מגוון", "העובדת מבשלת ארוחות חמות", "לעובדת יש חברים מאותה מדינה",
+    "הוסבר לעובדת על זכויותיה", "נקבע ביקור מעקב בעוד חודש", "הומלץ על פיזיותרפיה",
+    "התקבל דיווח מהבת", "המטופל מתנייד בכיסא גלגלים", "יש צורך בהתאמות בחדר הרחצה",
+    "לא נמצאו סימני הזנחה", "העובדת מבקשת יום חופש נוסף", "שולם שכר מלא לחודש האחרון",
+]
+
+EMPTY_RATE = 0.1           # Chance an optional text field is left blank
+SIGNATURE_RATE = 0.5       # Default chance a payload carries a signature
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def israeli_id(rng):
+    """Return a 9-digit ID number with a valid check digit"""
+    digits = [rng.randrange(10) for _ in range(8)]
+    total = 0
+    for i, digit in enumerate(digits):
+        product = digit * (1 if i % 2 == 0 else 2)
+        total += product // 10 + product % 10
+    return ''.join(map(str, digits)) + str((10 - total % 10) % 10)
+
+
+def phone(rng, mobile=True):
+    if mobile:
+        return f"05{rng.choice('0234578')}-{rng.randrange(10 ** 7):07d}"
+    return f"0{rng.choice('23489')}-{rng.randrange(10 ** 7):07d}"
+
+
+def date_text(rng, max_length):
+    """A date the way people type it - mostly dd/mm/yyyy, sometimes in Hebrew"""
+    day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(2019, 2025)
+    formats = [
+        (f"{day:02d}/{month:02d}/{year}", 14), (f"{day}/{month}/{year}", 3),
+        (f"{day:02d}.{month:02d}.{year % 100:02d}", 2), (f"{HEBREW_MONTHS[month - 1]} {year}", 2),
+        (f"{day} ב{HEBREW_MONTHS[month - 1]}", 1), (f"{month:02d}/{year}", 1),
+    ]
+    fitting = [(text, weight) for text, weight in formats if len(text) <= max_length]
+    return weighted(rng, fitting) if fitting else f"{day:02d}"[:max_length]
+
+
+def free_text(rng, max_length, fill=None):
+    """Join phrases until close to a target length drawn near max_length"""
+    if fill is None:
+        fill = rng.triangular(0.3, 1.0, 0.85)
+    target = max(1, int(max_length * fill))
+    text = ''
+    while True:
+        phrase = rng.choice(PHRASES)
+        candidate = f"{text}. {phrase}" if text else phrase
+        if len(candidate) > target:
+            break
+        text = candidate
+    return text or rng.choice(PHRASES)[:max_length]
+
+
+def text_value(rng, name, config):
+    """Pick a realistic value for a text field based on its name"""
+    max_length = config.get('max_length', 100)
+    if config.get('multiline', False):
+        return free_text(rng, max_length)
+    if name.endswith('_date') or name in ('insurance_from', 'insurance_to'):
+        if name == 'payment_date':
+            return f"{rng.randint(1, 10):02d}"
+        return date_text(rng, max_length)
+    if name.endswith('_id'):
+        return israeli_id(rng)[:max_length]
+    if name.endswith('_mobile') or name.endswith('_landline'):
+        return phone(rng, mobile=name.endswith('_mobile'))
+    if name.endswith('_email'):
+        user = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10)))
+        return f"{user}{rng.randrange(100)}@{rng.choice(['gmail.com', 'walla.co.il', 'hotmail.com'])}"
+    if name.endswith('_passport'):
+        return rng.choice('PNEU') + ''.join(rng.choice('0123456789') for _ in range(8))
+    if name.endswith('_zipcode'):
+        return f"{rng.randrange(10 ** 7):07d}"
+    if name.endswith('_house_number'):
+        return str(rng.choice([rng.randint(1, 40), rng.randint(1, 200)]))
+    if name.endswith('_apartment'):
+        return str(rng.randint(1, 30))
+    if name.endswith('_entrance'):
+        return rng.choice(['א', 'ב', 'ג', '1', '2'])
+    if name.endswith('_street'):
+        return weighted(rng, STREETS)
+    if name.endswith('_city'):
+        return weighted(rng, CITIES)
+    if name == 'worker_first_name':
+        return weighted(rng, WORKER_FIRST_NAMES)
+    if name == 'worker_last_name':
+        return weighted(rng, WORKER_LAST_NAMES)
+    if name.endswith('_first_name'):
+        return weighted(rng, HEBREW_FIRST_NAMES)
+    if name.endswith('_last_name'):
+        return weighted(rng, HEBREW_LAST_NAMES)
+    if 'social_worker' in name or name == 'responsible_worker_name':
+        return f"{weighted(rng, HEBREW_FIRST_NAMES)} {weighted(rng, HEBREW_LAST_NAMES)}"[:max_length]
+    if name == 'worker_origin_country':
+        return weighted(rng, ORIGIN_COUNTRIES)
+    if name == 'placement_agency':
+        return weighted(rng, AGENCIES)
+    if name == 'insurance_company':
+        return weighted(rng, INSURANCE_COMPANIES)
+    if name == 'hospitalization_where':
+        return weighted(rng, HOSPITALS)
+    if name == 'hospitalization_duration':
+        return weighted(rng, DURATIONS)
+    if 'day_off' in name:
+        return weighted(rng, DAYS_OFF)
+    if name in ('monthly_salary', 'total_payment', 'last_insurance_payment'):
+        return f"{rng.randrange(55, 90) * 100:,}"
+    return free_text(rng, max_length)
+
+
+def checkbox_values(rng):
+    """Check boxes per CHECKBOX_GROUPS group: one in exclusive groups, any subset in the others"""
+    groups = [(group['fields'], group['exclusive']) for group in CHECKBOX_GROUPS.values()]
+    grouped = {name for names, _ in groups for name in names}
+    ungrouped = [name for name, config in FORM_FIELDS.items()
+                 if config.get('checkbox', False) and name not in grouped]
+    groups += [([name], False) for name in ungrouped]
+
+    values = {}
+    for names, exclusive in groups:
+        if exclusive:
+            checked = {rng.choice(names)} if rng.random() > EMPTY_RATE else set()
+        else:
+            checked = {name for name in names if rng.random() < 0.35}
+        values.update({name: name in checked for name in names})
+    return values
+
+
+def signature_png(rng, width=None, height=None):
+    """Rasterize a few random pen strokes into an RGBA PNG"""
+    width = width or rng.randint(400, 700)
+    height = height or rng.randint(120, 220)
+    row_size = 1 + width * 4
+    pixels = bytearray(row_size * height)  # Transparent; filter byte 0 per row
+    ink = bytes((0, 0, rng.randint(40, 120), 255))
+    radius = rng.randint(1, 3)
+
+    def stamp(cx, cy):
+        for y in range(max(0, cy - radius), min(height, cy + radius + 1)):
+            for x in range(max(0, cx - radius), min(width, cx + radius + 1)):
+                offset = y * row_size + 1 + x * 4
+                pixels[offset:offset + 4] = ink
+
+    for _ in range(rng.randint(1, 4)):
+        points = [(rng.randint(0, width - 1), rng.randint(0, height - 1))
+                  for _ in range(rng.randint(3, 8))]
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            steps = max(abs(x1 - x0), abs(y1 - y0), 1)
+            for step in range(steps + 1):
+                stamp(x0 + (x1 - x0) * step // steps, y0 + (y1 - y0) * step // steps)
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(bytes(pixels), 6)) +
+            chunk(b'IEND', b''))
+
+
+def generate_payload(rng, signature_rate=SIGNATURE_RATE):
+    """Generate one payload with a value for every field"""
+    year, month, day = rng.randint(2023, 2025), rng.randint(1, 12), rng.randint(1, 28)
+    payload = {}
+    for name, config in FORM_FIELDS.items():
+        if config.get('checkbox', False):
+            continue
+        if name == 'visit_date_day':
+            payload[name] = f"{day:02d}"
+        elif name == 'visit_date_month':
+            payload[name] = f"{month:02d}"
+        elif name == 'visit_date_year':
+            payload[name] = str(year)
+        elif not name.startswith('employer_') and rng.random() < EMPTY_RATE:
+            payload[name] = ''
+        else:
+            payload[name] = text_value(rng, name, config)[:config.get('max_length', 100)]
+    payload.update(checkbox_values(rng))
+    if rng.random() < signature_rate:
+        payload['signature_image'] = ('data:image/png;base64,' +
+                                      base64.b64encode(signature_png(rng)).decode('ascii'))
+    return payload
+
+
+def iter_corpus(count, seed=0, signature_rate=SIGNATURE_RATE):
+    """Yield `count` payloads; the same seed always yields the same payloads"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield generate_payload(rng, signature_rate)
+
+
+def read_corpus(path):
+    """Stream payloads from an NDJSON corpus file"""
+    with open(path, encoding='utf-8') as corpus_file:
+        for line in corpus_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic form-data corpus (NDJSON)')
+    parser.add_argument('-n', '--count', type=int, default=100, help='number of payloads')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--signature-rate', type=float, default=SIGNATURE_RATE,
+                        help='fraction of payloads with a signature image')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args()
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for payload in iter_corpus(args.count, args.seed, args.signature_rate):
+            output.write(json.dumps(payload, ensure_ascii=False) + '\n')
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark payload profiles - deterministic form data shaped like real submissions
+
+Values are derived from FORM_FIELDS so every profile stays valid when fields
+are added or moved: left-aligned fields get ASCII (dates, IDs, phone numbers,
+email), right-aligned fields get Hebrew text and checkboxes get booleans.
+"""
+import base64
+import random
+from backend.field_mapping import FORM_FIELDS
+from corpus import signature_png
+
+HEBREW_WORDS = [
+    "העובד", "המטופל", "מרוצה", "מאוד", "מהטיפול", "בבית", "נקי", "ומסודר",
+    "יש", "צורך", "בהדרכה", "נוספת", "לגבי", "תזונה", "ותרופות", "המשפחה",
+    "מעורבת", "ומבקרת", "פעמיים", "בשבוע", "אין", "קשיים", "מיוחדים", "בתקשורת",
+    "מצב", "בריאותי", "יציב", "הולך", "עם", "הליכון", "זקוק", "לעזרה",
+    "ברחצה", "ובלבוש", "תל", "אביב", "ירושלים", "חיפה", "כהן", "לוי",
+]
+
+PROFILES = ('minimal', 'typical', 'maxed', 'signature', 'long_multiline')
+
+MINIMAL_FIELDS = ('visit_date_day', 'visit_date_month', 'visit_date_year',
+                  'employer_last_name', 'employer_first_name', 'worker_last_name')
+
+
+def hebrew_text(rng, length):
+    """Return Hebrew words joined by spaces, at most `length` characters long"""
+    words = []
+    size = -1
+    while True:
+        word = rng.choice(HEBREW_WORDS)
+        if size + 1 + len(word) > length:
+            break
+        words.append(word)
+        size += 1 + len(word)
+    return ' '.join(words) or rng.choice(HEBREW_WORDS)[:length]
+
+
+def ascii_value(rng, field_name, length):
+    """Return an ASCII value (digits, or an address for email fields)"""
+    if 'email' in field_name:
+        user = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(max(1, length - 12)))
+        return f'{user}@example.com'[:length]
+    return ''.join(rng.choice('0123456789') for _ in range(length))
+
+
+def field_value(rng, field_name, field_config, fill=0.5):
+    """
+    Generate a value for one field.
+
+    Args:
+        fill: Fraction of the field's max_length to use (1.0 = maxed out)
+    """
+    if field_config.get('checkbox', False):
+        return fill >= 1.0 or rng.random() < 0.3
+    max_length = field_config.get('max_length', 100)
+    length = max(1, int(max_length * fill))
+    if field_config.get('align', 'left') == 'left':
+        return ascii_value(rng, field_name, length)
+    return hebrew_text(rng, length)
+
+
+def signature_data_url(seed=0):
+    """Return a PNG data URL with pen strokes, like the signature pad produces"""
+    png = signature_png(random.Random(seed), width=600, height=200)
+    return 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+
+
+def build_payload(profile, seed=0):
+    """Return the form data for a named profile"""
+    rng = random.Random(seed)
+    if profile == 'minimal':
+        return {name: field_value(rng, name, FORM_FIELDS[name]) for name in MINIMAL_FIELDS}
+    if profile == 'maxed':
+        return {name: field_value(rng, name, config, fill=1.0)
+                for name, config in FORM_FIELDS.items()}
+
+    payload = {name: field_value(rng, name, config, fill=0.3)
+               for name, config in FORM_FIELDS.items()}
+    if profile == 'typical':
+        return payload
+    if profile == 'signature':
+        payload['signature_image'] = signature_data_url()
+        return payload
+    if profile == 'long_multiline':
+        for name, config in FORM_FIELDS.items():
+            if config.get('multiline', False):
+                payload[name] = hebrew_text(rng, config.get('max_length', 300))
+        payload['notes'] = hebrew_text(rng, 2000)  # Longer than the 10 lines drawn
+        return payload
+    raise ValueError(f'Unknown profile: {profile}')
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark the fill pipeline and gate on regressions against a stored baseline
+
+Times fill_pdf_form, fill_pdf_from_bytes, validate_uploaded_pdf,
+prepare_hebrew_text and _wrap_text for every payload profile (see payloads.py),
+recording throughput, p50/p95/p99 latency and peak traced memory. Fills run in
+every output mode (the "fast" cases keep their plain names, the others are
+suffixed, e.g. fill_pdf_form_small/typical) and also record the output size.
+With --corpus it also times batch vs per-value layout over the whole corpus.
+
+Usage:
+    python bench/run_bench.py                          # run, compare with bench/baseline.json
+    python bench/run_bench.py --save-baseline          # run and store as the new baseline
+    python bench/run_bench.py --threshold 0.1 -o out.json
+
+Exits with status 1 if any case's p50 latency, peak memory or output size is more than
+--threshold (a fraction, default 0.25) worse than the baseline. Baselines are
+machine specific - record one on the same host before comparing.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from backend.field_mapping import FORM_FIELDS
+from backend.field_extraction import field_extractor
+from backend.pdf_filler import PDFFiller, register_fonts, fill_pdf_form, fill_pdf_from_bytes
+from backend.pdf_validator import validate_uploaded_pdf
+from backend.batch_layout import layout_prepared
+from backend.pdf_output import DEFAULT_OUTPUT_MODE, OUTPUT_MODES
+from payloads import PROFILES, build_payload
+from corpus import read_corpus
+
+TEMPLATE_PATH = os.path.join(PROJECT_ROOT, 'templates', 'template.pdf')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+GATED_METRICS = ('p50_ms', 'peak_memory_kb', 'output_kb')
+
+
+def build_cases(profiles, template_bytes, corpus=None):
+    """Return {case name: (callable, iteration multiplier)}"""
+    filler = PDFFiller(TEMPLATE_PATH)
+    hebrew_font = register_fonts()
+    cases = {
+        'validate_uploaded_pdf': (lambda: validate_uploaded_pdf(template_bytes, TEMPLATE_PATH), 1),
+    }
+    if corpus:
+        # Each timed run fills the next payload from the corpus
+        payloads = itertools.cycle(corpus)
+        cases['fill_pdf_form/corpus'] = (
+            lambda: fill_pdf_form(TEMPLATE_PATH, next(payloads)), 1)
+        # Measurement and layout of every prepared text in the corpus, field by
+        # field: the batch engine (NumPy when installed) vs one call per value
+        columns = [(config, [filler._prepare_field_text(flat[name]) for flat in
+                             map(field_extractor.extract, corpus) if flat.get(name)])
+                   for name, config in FORM_FIELDS.items() if not config.get('checkbox')]
+        cases['layout_batch/corpus'] = (
+            lambda: [layout_prepared(filler, prepared, config) for config, prepared in columns], 1)
+        cases['layout_scalar/corpus'] = (
+            lambda: [[filler._layout_text(text, font, config) for text, font in prepared]
+                     for config, prepared in columns], 1)
+    for profile in profiles:
+        payload = build_payload(profile)
+        texts = [str(v) for k, v in payload.items()
+                 if k in FORM_FIELDS and isinstance(v, str) and filler._contains_hebrew(v)]
+        wraps = [(filler.prepare_hebrew_text(payload[k]), c.get('width', 450))
+                 for k, c in FORM_FIELDS.items() if c.get('multiline') and payload.get(k)]
+
+        for mode in OUTPUT_MODES:
+            suffix = '' if mode == DEFAULT_OUTPUT_MODE else f'_{mode}'
+            cases[f'fill_pdf_form{suffix}/{profile}'] = (
+                lambda payload=payload, mode=mode: fill_pdf_form(TEMPLATE_PATH, payload, output_mode=mode), 1)
+            cases[f'fill_pdf_from_bytes{suffix}/{profile}'] = (
+                lambda payload=payload, mode=mode: fill_pdf_from_bytes(template_bytes, payload, output_mode=mode), 1)
+        # The text cases are fast, so they run more iterations per sample set
+        if texts:
+            cases[f'prepare_hebrew_text/{profile}'] = (
+                lambda texts=texts: [filler.prepare_hebrew_text(t) for t in texts], 10)
+        if wraps:
+            cases[f'_wrap_text/{profile}'] = (
+                lambda wraps=wraps: [filler._wrap_text(t, w, hebrew_font) for t, w in wraps], 10)
+    return cases
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_case(func, iterations, warmup):
+    """Time `func` and measure its peak traced memory (and output size, for fills)"""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+
+    # Separate pass - tracemalloc slows everything down
+    tracemalloc.start()
+    output = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    samples.sort()
+    result = {
+        'iterations': iterations,
+        'throughput_per_s': round(iterations / total, 2),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 4),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 4),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+    if isinstance(output, bytes):
+        result['output_kb'] = round(len(output) / 1024, 1)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Return a list of regression messages (empty if within the threshold)"""
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get('results', {}).get(case)
+        if previous is None:
+            continue
+        for metric in GATED_METRICS:
+            if not previous.get(metric):
+                continue
+            change = current[metric] / previous[metric] - 1
+            if change > threshold:
+                regressions.append(
+                    f'{case}: {metric} {previous[metric]} -> {current[metric]} (+{change:.0%})'
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the PDF fill pipeline')
+    parser.add_argument('--iterations', type=int, default=20, help='timed runs per case')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed runs per case')
+    parser.add_argument('--profile', action='append', choices=PROFILES,
+                        help='payload profile to run (repeatable, default: all)')
+    parser.add_argument('--corpus', help='NDJSON corpus (bench/corpus.py) to add a fill_pdf_form/corpus case')
+    parser.add_argument('--filter', default='', help='only run cases containing this text')
+    parser.add_argument('-o', '--output', help='write results JSON here')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed regression as a fraction (default 0.25 = 25%%)')
+    args = parser.parse_args()
+
+    with open(TEMPLATE_PATH, 'rb') as template_file:
+        template_bytes = template_file.read()
+
+    corpus = list(read_corpus(args.corpus)) if args.corpus else None
+    cases = build_cases(args.profile or PROFILES, template_bytes, corpus)
+    results = {}
+    for name, (func, multiplier) in cases.items():
+        if args.filter not in name:
+            continue
+        results[name] = run_case(func, args.iterations * multiplier, args.warmup)
+        r = results[name]
+        print(f"{name:40} p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms  "
+              f"p99 {r['p99_ms']:9.3f} ms  {r['throughput_per_s']:9.1f}/s  "
+              f"peak {r['peak_memory_kb']:9.1f} KB"
+              + (f"  output {r['output_kb']:7.1f} KB" if 'output_kb' in r else ''))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline} - run with --save-baseline to create one')
+        return
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f'\nRegressions beyond {args.threshold:.0%}:')
+        for message in regressions:
+            print(f'  {message}')
+        sys.exit(1)
+    print(f'\nNo regressions beyond {args.threshold:.0%} against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
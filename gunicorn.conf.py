@@ -0,0 +1,34 @@
+"""
+Gunicorn settings - picked up automatically by `gunicorn app:app`
+
+Workers write their metrics to a shared directory that /metrics sums up
+(see src/backend/metrics.py). Its files are cumulative per worker process, so
+it has to start empty.
+
+Each worker warms up the PDF stack in a background thread once it has booted,
+so /health answers immediately and the first fill doesn't pay for imports,
+font registration and template compilation. Set FORM_WARM_UP=0 to skip it.
+"""
+import glob
+import os
+import tempfile
+import threading
+
+
+def on_starting(server):
+    """Create (or clear) the shared metrics directory before workers fork"""
+    metrics_dir = os.environ.get('METRICS_DIR')
+    if not metrics_dir:
+        metrics_dir = tempfile.mkdtemp(prefix='formfiller-metrics-')
+        os.environ['METRICS_DIR'] = metrics_dir
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        os.remove(path)
+
+
+def post_worker_init(worker):
+    """Warm up the PDF stack without delaying the worker's readiness"""
+    if os.environ.get('FORM_WARM_UP', '1') != '1':
+        return
+    from app import warm_up
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
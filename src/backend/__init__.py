@@ -1,5 +1,13 @@
 """Backend package for PDF form filling"""
-from .pdf_filler import PDFFiller, fill_pdf_form
 from .field_mapping import FORM_FIELDS
 
 __all__ = ['PDFFiller', 'fill_pdf_form', 'FORM_FIELDS']
+
+
+def __getattr__(name):
+    # The PDF stack (reportlab, pypdf, BiDi) is only imported when first used,
+    # so `from backend.field_mapping import FORM_FIELDS` stays cheap
+    if name in ('PDFFiller', 'fill_pdf_form'):
+        from . import pdf_filler
+        return getattr(pdf_filler, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
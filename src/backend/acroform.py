@@ -0,0 +1,419 @@
+"""
+AcroForm mode - fill real form widgets on a derived template instead of merging an overlay
+
+build_acroform_template() is a one-time build step that turns the coordinates in
+FORM_FIELDS into text and checkbox widgets on a copy of the template, embedding
+the same font subsets reportlab would use. A fill then only sets /V and a small
+appearance stream per field, laid out by the same code as the overlay path.
+"""
+from io import BytesIO
+import math
+import os
+import re
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.lib.rl_accel import fp_str
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject, BooleanObject, DictionaryObject, FloatObject, NameObject,
+    NumberObject, StreamObject, TextStringObject,
+)
+from .field_mapping import FORM_FIELDS, PAGE_WIDTH, HEBREW_FONT_SIZE, CHECKBOX_SIZE, SIGNATURE_CONFIGS
+from . import field_mapping, pdf_filler
+from .pdf_filler import PDFFiller
+from .field_extraction import field_extractor
+from .form_registry import BUILTIN_FORM
+from .incremental import IncrementalWriter, page_as_form_xobject, stamp_page
+from .metrics import stage
+from .pdf_output import DEFAULT_OUTPUT_MODE, check_output_mode, write_output
+
+ACROFORM_SUFFIX = "_acroform.pdf"
+
+# Resource names for fonts in the AcroForm default resources (/DR)
+STANDARD_FONT_RESOURCES = {
+    "Helvetica": "/Helv",
+    "Symbol": "/Symb",
+    "ZapfDingbats": "/ZaDb",
+}
+HEBREW_RESOURCE_PREFIX = "/Heb"
+FALLBACK_RESOURCE_PREFIX = "/Fb"
+# Fallback fonts are large, so only the blocks worker names and notes use are
+# embedded: Latin Extended-A/B, Greek, Cyrillic and general punctuation.
+# Other characters that only a fallback font covers render as .notdef here.
+FALLBACK_EMBED_RANGES = ((0x0100, 0x024F), (0x0370, 0x04FF), (0x2010, 0x205E))
+
+# Field flags (PDF 32000-1, 12.7.4)
+FLAG_PRINT = 4
+FLAG_MULTILINE = 1 << 12
+QUADDING = {"left": 0, "right": 2}
+
+_BFCHAR_RE = re.compile(rb'<([0-9A-Fa-f]{2})>\s*<([0-9A-Fa-f]{4})>')
+
+
+def derived_template_path(template_path):
+    """Path of the AcroForm template built from a base template"""
+    return os.path.splitext(template_path)[0] + ACROFORM_SUFFIX
+
+
+def build_acroform_template(template_path, output_path=None):
+    """
+    Build the AcroForm variant of a template.
+
+    Args:
+        template_path: Path to the base template PDF
+        output_path: Where to write the derived template (defaults to
+            derived_template_path(template_path))
+
+    Returns:
+        The output path
+    """
+    output_path = output_path or derived_template_path(template_path)
+    writer = PdfWriter(clone_from=template_path)
+    fonts = _build_font_resources(writer)
+    layout = PDFFiller.__new__(PDFFiller)
+
+    field_refs = ArrayObject()
+    for field_name, field_config in FORM_FIELDS.items():
+        page = writer.pages[field_config["page"]]
+        rect = _widget_rect(field_config)
+
+        widget = DictionaryObject({
+            NameObject("/Type"): NameObject("/Annot"),
+            NameObject("/Subtype"): NameObject("/Widget"),
+            NameObject("/T"): TextStringObject(field_name),
+            NameObject("/Rect"): ArrayObject(NumberObject(v) for v in rect),
+            NameObject("/F"): NumberObject(FLAG_PRINT),
+            NameObject("/P"): page.indirect_reference,
+        })
+
+        if field_config.get("checkbox", False):
+            runs = layout._layout_field(True, field_config)
+            on_stream = _appearance_stream(writer._add_object, rect, runs, fonts, _encode_standard)
+            widget.update({
+                NameObject("/FT"): NameObject("/Btn"),
+                NameObject("/V"): NameObject("/Off"),
+                NameObject("/AS"): NameObject("/Off"),
+                NameObject("/DA"): TextStringObject(f"/Helv {CHECKBOX_SIZE} Tf 0 g"),
+                NameObject("/AP"): DictionaryObject({
+                    NameObject("/N"): DictionaryObject({
+                        NameObject("/Yes"): on_stream,
+                        NameObject("/Off"): _appearance_stream(writer._add_object, rect, [], fonts, None),
+                    }),
+                }),
+            })
+        else:
+            flags = FLAG_MULTILINE if field_config.get("multiline", False) else 0
+            widget.update({
+                NameObject("/FT"): NameObject("/Tx"),
+                NameObject("/Ff"): NumberObject(flags),
+                NameObject("/Q"): NumberObject(QUADDING.get(field_config.get("align", "left"), 0)),
+                NameObject("/MaxLen"): NumberObject(field_config.get("max_length", 100)),
+                NameObject("/DA"): TextStringObject(f"/Helv {HEBREW_FONT_SIZE} Tf 0 g"),
+                NameObject("/AP"): DictionaryObject({
+                    NameObject("/N"): _appearance_stream(writer._add_object, rect, [], fonts, None),
+                }),
+            })
+
+        widget_ref = writer._add_object(widget)
+        if "/Annots" not in page:
+            page[NameObject("/Annots")] = ArrayObject()
+        page["/Annots"].get_object().append(widget_ref)
+        field_refs.append(widget_ref)
+
+    writer._root_object[NameObject("/AcroForm")] = writer._add_object(DictionaryObject({
+        NameObject("/Fields"): field_refs,
+        NameObject("/DR"): DictionaryObject({NameObject("/Font"): fonts}),
+        NameObject("/DA"): TextStringObject(f"/Helv {HEBREW_FONT_SIZE} Tf 0 g"),
+        NameObject("/NeedAppearances"): BooleanObject(False),
+    }))
+
+    with open(output_path, 'wb') as output_file:
+        writer.write(output_file)
+    return output_path
+
+
+def _ttf_resource_prefix(font_name):
+    """Prefix of the /DR resource names holding a TrueType font's subsets"""
+    if font_name == pdf_filler.HEBREW_FONT_NAME:
+        return HEBREW_RESOURCE_PREFIX
+    return f"{FALLBACK_RESOURCE_PREFIX}{font_name}_"
+
+
+def _build_font_resources(writer):
+    """Create /DR fonts: the standard fonts plus every subset of the Hebrew and fallback fonts"""
+    fonts = DictionaryObject()
+    for font_name, resource_name in STANDARD_FONT_RESOURCES.items():
+        font = DictionaryObject({
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject(f"/{font_name}"),
+        })
+        if font_name == "Helvetica":
+            font[NameObject("/Encoding")] = NameObject("/WinAnsiEncoding")
+        fonts[NameObject(resource_name)] = writer._add_object(font)
+
+    pdf_filler.register_fonts()
+    for ttf_name in pdf_filler.FONT_CHAIN:
+        if ttf_name in STANDARD_FONT_RESOURCES:
+            continue
+
+        # Let reportlab subset the whole font once, exactly as it does for overlays,
+        # by drawing every character it covers on a throwaway page
+        font = pdfmetrics.getFont(ttf_name)
+        codes = [code for code in sorted(font.face.charToGlyph) if 32 <= code < 0xFFFF]
+        if ttf_name != pdf_filler.HEBREW_FONT_NAME:
+            codes = [code for code in codes
+                     if any(low <= code <= high for low, high in FALLBACK_EMBED_RANGES)]
+        chars = ''.join(map(chr, codes))
+        packet = BytesIO()
+        can = canvas.Canvas(packet)
+        can.setFont(ttf_name, HEBREW_FONT_SIZE)
+        can.drawString(0, 0, chars)
+        can.save()
+        packet.seek(0)
+
+        carrier_fonts = PdfReader(packet).pages[0]["/Resources"]["/Font"]
+        for internal_name, font_ref in carrier_fonts.items():
+            if "+" not in internal_name:
+                continue  # reportlab's Helvetica default, already covered
+            subset = internal_name.split("+", 1)[1]
+            cloned = font_ref.get_object().clone(writer)
+            fonts[NameObject(f"{_ttf_resource_prefix(ttf_name)}{subset}")] = cloned.indirect_reference
+    return fonts
+
+
+def _widget_rect(field_config):
+    """Integer widget rectangle generous enough to hold anything the overlay would draw"""
+    x = field_config["x"]
+    y = field_config["y"]
+
+    if field_config.get("checkbox", False):
+        return [x - 1, y - 2, x + CHECKBOX_SIZE, y + CHECKBOX_SIZE]
+
+    # Single-line values are truncated by character count, not width,
+    # so allow a full em per character and clamp to the page
+    width = max(field_config.get("width", 0),
+                field_config.get("max_length", 100) * HEBREW_FONT_SIZE)
+    if field_config.get("align", "left") == "right":
+        left, right = max(0, x - width), x
+    else:
+        left, right = x, min(PAGE_WIDTH, x + width)
+
+    lines = 10 if field_config.get("multiline", False) else 1
+    line_height = field_config.get("line_height", HEBREW_FONT_SIZE + 3)
+    bottom = y - (lines - 1) * line_height - HEBREW_FONT_SIZE * 0.5
+    top = y + HEBREW_FONT_SIZE * 1.2
+    return [math.floor(left), math.floor(bottom), math.ceil(right), math.ceil(top)]
+
+
+def _appearance_stream(add_object, rect, runs, fonts, encode):
+    """Form XObject drawing `runs` relative to the widget rectangle"""
+    ops = []
+    used_fonts = DictionaryObject()
+    for font_name, font_size, x, y, text in runs:
+        ops.append(f"BT 1 0 0 1 {fp_str(x - rect[0])} {fp_str(y - rect[1])} Tm")
+        for resource_name, data in encode(font_name, text):
+            used_fonts[NameObject(resource_name)] = fonts.raw_get(resource_name)
+            ops.append(f"{resource_name} {fp_str(font_size)} Tf <{data.hex()}> Tj")
+        ops.append("ET")
+
+    stream = StreamObject()
+    stream.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): ArrayObject(
+            FloatObject(v) for v in (0, 0, rect[2] - rect[0], rect[3] - rect[1])
+        ),
+        NameObject("/Resources"): DictionaryObject({NameObject("/Font"): used_fonts}),
+    })
+    content = "/Tx BMC\n" + "\n".join(ops) + "\nEMC" if ops else ""
+    stream.set_data(content.encode("latin-1"))
+    return add_object(stream)
+
+
+def _encode_standard(font_name, text):
+    """Encode text for a standard Type1 font the way reportlab does"""
+    font = pdfmetrics.getFont(font_name)
+    return [
+        (STANDARD_FONT_RESOURCES[sub_font.fontName], data)
+        for sub_font, data in pdfmetrics.unicode2T1(text, [font] + font.substitutionFonts)
+    ]
+
+
+class AcroFormFiller(PDFFiller):
+    """Fills a template built by build_acroform_template() by setting field values"""
+
+    def __init__(self, template_path):
+        """Initialize filler with a derived AcroForm template (built-in form only)"""
+        pdf_filler.register_fonts()
+        self.form = BUILTIN_FORM
+        self.template_path = template_path
+        with open(template_path, 'rb') as template_file:
+            self.template_bytes = template_file.read()
+        self.reader = PdfReader(BytesIO(self.template_bytes))
+
+        acroform = self.reader.trailer["/Root"]["/AcroForm"]
+        self.fonts = acroform["/DR"]["/Font"]
+        # TrueType font name -> ({char: (resource, code)}, .notdef (resource, code))
+        self._ttf_codes = {}
+        for ttf_name in pdf_filler.FONT_CHAIN:
+            if ttf_name in STANDARD_FONT_RESOURCES:
+                continue
+            prefix = _ttf_resource_prefix(ttf_name)
+            codes = {}
+            default = None
+            # Subset 0 keeps ASCII codes readable even where the font has no glyph,
+            # so only trust entries for characters the font really covers
+            covered = pdfmetrics.getFont(ttf_name).face.charToGlyph
+            for resource_name, font_ref in sorted(self.fonts.items()):
+                if not resource_name.startswith(prefix):
+                    continue
+                if default is None:
+                    default = (resource_name, b"\x00")
+                cmap = font_ref.get_object()["/ToUnicode"].get_object().get_data()
+                for code, unicode_hex in _BFCHAR_RE.findall(cmap):
+                    char = chr(int(unicode_hex, 16))
+                    if ord(char) in covered and char != "\x00":
+                        codes.setdefault(char, (resource_name, bytes.fromhex(code.decode())))
+            if default is not None:  # Templates built before a fallback font was installed lack it
+                self._ttf_codes[ttf_name] = (codes, default)
+
+        # Resolve everything a fill touches now, so requests never hit the stream
+        self._widgets = {}
+        for widget_ref in acroform["/Fields"]:
+            widget = widget_ref.get_object()
+            self._widgets[widget["/T"]] = (widget_ref, widget)
+        for page in self.reader.pages:
+            for key in ("/Resources", "/Annots"):
+                if key in page:
+                    page[key].get_object()
+
+    def _encode(self, font_name, text):
+        """Split text into (font resource, encoded bytes) segments"""
+        if font_name in STANDARD_FONT_RESOURCES:
+            return _encode_standard(font_name, text)
+        if font_name not in self._ttf_codes:
+            # A font the derived template doesn't embed - rebuild it to pick the font up
+            if not self._ttf_codes:
+                return _encode_standard("Helvetica", text)
+            font_name = next(iter(self._ttf_codes))
+
+        codes, default = self._ttf_codes[font_name]
+        segments = []
+        for char in text.replace("\xa0", " "):
+            # Characters outside the font fall back to .notdef, like reportlab
+            resource_name, code = codes.get(char, default)
+            if segments and segments[-1][0] == resource_name:
+                segments[-1][1].extend(code)
+            else:
+                segments.append((resource_name, bytearray(code)))
+        return [(name, bytes(data)) for name, data in segments]
+
+    def fill_form(self, form_data, output_path=None, flatten=False, output_mode=DEFAULT_OUTPUT_MODE):
+        """Fill the form fields with provided data, optionally flattening them"""
+        check_output_mode(output_mode)
+        writer = IncrementalWriter(self.template_bytes, self.reader)
+
+        # Appearance stream shown by each filled widget, keyed by object number
+        appearances = {}
+        with stage('extract'):
+            field_values = field_extractor.extract(form_data)
+        with stage('widgets'):
+            for field_name, field_value in field_values.items():
+                if field_name not in self._widgets:
+                    continue
+                field_config = FORM_FIELDS[field_name]
+                runs = self._layout_field(field_value, field_config)
+                if not runs:
+                    continue
+
+                widget_ref, widget = self._widgets[field_name]
+                updated = DictionaryObject(widget)
+                if field_config.get("checkbox", False):
+                    updated[NameObject("/V")] = NameObject("/Yes")
+                    updated[NameObject("/AS")] = NameObject("/Yes")
+                    appearance = widget["/AP"]["/N"].raw_get("/Yes")
+                else:
+                    rect = [int(v) for v in widget["/Rect"]]
+                    appearance = _appearance_stream(writer.add_object, rect, runs, self.fonts, self._encode)
+                    updated[NameObject("/V")] = TextStringObject(str(field_value))
+                    updated[NameObject("/AP")] = DictionaryObject({NameObject("/N"): appearance})
+                writer.update_object(widget_ref, updated)
+                appearances[widget_ref.idnum] = appearance
+
+        # Stamps (resource name, XObject, origin) to paint on top of each page
+        stamps = {}
+
+        # Signatures stay on the overlay path - only their page is stamped
+        signature_data = form_data.get('signature_image', None)
+        if signature_data:
+            overlay_reader = PdfReader(self.create_overlay({'signature_image': signature_data}))
+            for page_num in sorted({cfg["page"] for cfg in SIGNATURE_CONFIGS}):
+                signature = page_as_form_xobject(writer, overlay_reader.pages[page_num])
+                stamps.setdefault(page_num, []).append(("/FFSig", signature, (0, 0)))
+
+        if flatten:
+            annots = self._flatten_widgets(appearances, stamps)
+            catalog = DictionaryObject(self.reader.trailer["/Root"])
+            del catalog["/AcroForm"]
+            writer.update_object(self.reader.trailer.raw_get("/Root"), catalog)
+        else:
+            annots = {}
+
+        for page_num in sorted(set(stamps) | set(annots)):
+            stamp_page(writer, self.reader.pages[page_num], stamps.get(page_num, []),
+                       annots.get(page_num))
+
+        def write(output_file):
+            with stage('write'):
+                writer.write(output_file)
+
+        return write_output(write, output_path, output_mode)
+
+    def _flatten_widgets(self, appearances, stamps):
+        """Turn filled widgets into page stamps; returns the remaining annotations per page"""
+        annots = {}
+        for page_num, page in enumerate(self.reader.pages):
+            if "/Annots" not in page:
+                continue
+            kept = ArrayObject()
+            for annot_ref in page["/Annots"]:
+                annot = annot_ref.get_object()
+                if annot.get("/Subtype") != "/Widget" or "/FT" not in annot:
+                    kept.append(annot_ref)
+                    continue
+                appearance = appearances.get(annot_ref.idnum)
+                if appearance is None:
+                    continue  # Empty field - nothing to paint
+                page_stamps = stamps.setdefault(page_num, [])
+                rect = annot["/Rect"]
+                page_stamps.append((f"/FFAp{len(page_stamps)}", appearance, (rect[0], rect[1])))
+            annots[page_num] = kept
+        return annots
+
+
+# Derived templates are parsed once per process and rebuilt when the base changes
+_fillers = {}
+
+
+def get_acroform_filler(template_path):
+    """Return a cached AcroFormFiller, building the derived template if stale"""
+    derived_path = derived_template_path(template_path)
+    sources_mtime = max(os.path.getmtime(template_path), os.path.getmtime(field_mapping.__file__))
+    if not os.path.exists(derived_path) or os.path.getmtime(derived_path) < sources_mtime:
+        build_acroform_template(template_path, derived_path)
+        _fillers.pop(derived_path, None)
+
+    mtime = os.path.getmtime(derived_path)
+    cached = _fillers.get(derived_path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, AcroFormFiller(derived_path))
+        _fillers[derived_path] = cached
+    return cached[1]
+
+
+def fill_pdf_acroform(template_path, form_data, output_path=None, flatten=False,
+                      output_mode=DEFAULT_OUTPUT_MODE):
+    """Convenience function to fill the AcroForm variant of a template"""
+    filler = get_acroform_filler(template_path)
+    return filler.fill_form(form_data, output_path, flatten=flatten, output_mode=output_mode)
@@ -0,0 +1,160 @@
+"""
+Payload admission - reject form data that would be expensive to render
+
+The renderer trusts its input: nested dictionaries are flattened however deep
+they go, every key is flattened before unknown ones are dropped, and the
+signature image is decoded whatever its size. check_payload() runs before any
+rendering and holds a submission to the field schema (see field_schema.py):
+
+- nesting depth and total key count are capped
+- text is no longer than its field's `max_length`, checkbox values are short,
+  and values are strings, numbers, booleans or nested dictionaries
+- the signature is a PNG or JPEG within MAX_SIGNATURE_BYTES, whose pixel count
+  (read from the image header, without decoding it) is within
+  MAX_SIGNATURE_PIXELS
+
+Within these limits the worst case render time is bounded; see
+tools/check_render_bound.py.
+"""
+import base64
+import binascii
+import struct
+from .field_schema import get_schema
+
+# Nested dictionaries are flattened to "parent.child" names; the form is flat
+MAX_NESTING_DEPTH = 4
+# Keys at all levels; the form has under 100 fields
+MAX_KEYS = 256
+# Checkbox values are booleans or short strings such as "on"
+MAX_CHECKBOX_CHARS = 16
+
+MAX_SIGNATURE_BYTES = 512 * 1024
+MAX_SIGNATURE_PIXELS = 2 * 1024 * 1024  # A 4K-wide signature pad is 1.7M
+
+SIGNATURE_KEY = 'signature_image'
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+JPEG_MAGIC = b'\xff\xd8\xff'
+# JPEG start-of-frame markers, which carry the image size
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def check_payload(form_data, schema=None):
+    """
+    Check form data against the admission limits.
+
+    Args:
+        form_data: Parsed form data
+        schema: {field_name: schema entry} (see field_schema.build_schema);
+            defaults to the compiled schema of the field mapping
+
+    Returns:
+        {'valid': bool, 'errors': [message], 'limits': [names of limits exceeded]}
+    """
+    if schema is None:
+        schema = get_schema().fields
+    errors = []
+    limits = set()
+
+    def reject(limit, message):
+        if message not in errors:
+            errors.append(message)
+        limits.add(limit)
+
+    if not isinstance(form_data, dict):
+        reject('type', 'Form data must be a JSON object')
+        return {'valid': False, 'errors': errors, 'limits': sorted(limits)}
+
+    key_count = 0
+    # Walk iteratively, so depth is checked before it can cost any recursion
+    pending = [(form_data, '', 1)]
+    while pending:
+        values, parent_key, depth = pending.pop()
+        if depth > MAX_NESTING_DEPTH:
+            reject('depth', f'Form data is nested deeper than {MAX_NESTING_DEPTH} levels')
+            continue
+        key_count += len(values)
+        if key_count > MAX_KEYS:
+            reject('keys', f'Form data has more than {MAX_KEYS} keys')
+            break
+        for key, value in values.items():
+            name = f'{parent_key}.{key}' if parent_key else key
+            if isinstance(value, dict):
+                pending.append((value, name, depth + 1))
+            elif name == SIGNATURE_KEY:
+                error = check_signature(value)
+                if error:
+                    reject('signature', error)
+            elif not isinstance(value, (str, int, float, bool)) and value is not None:
+                reject('type', f'{name}: unsupported value type {type(value).__name__}')
+            elif name in schema:
+                error = check_value(name, value, schema[name])
+                if error:
+                    reject('length', error)
+
+    return {'valid': not errors, 'errors': errors, 'limits': sorted(limits)}
+
+
+def check_value(name, value, field):
+    """Error message if a field's value is too long, else None"""
+    if field['type'] == 'checkbox':
+        limit = MAX_CHECKBOX_CHARS
+    else:
+        limit = field.get('max_length')
+    if limit is None or isinstance(value, bool):
+        return None
+    length = len(value) if isinstance(value, str) else len(str(value))
+    if length > limit:
+        return f'{name}: {length} characters (limit {limit})'
+    return None
+
+
+def check_signature(signature_data):
+    """Error message if the signature is too large or not an image, else None"""
+    if not signature_data:
+        return None
+    if isinstance(signature_data, str):
+        encoded = signature_data.split(',', 1)[1] if signature_data.startswith('data:') else signature_data
+        # Check the size from the base64 length before decoding anything
+        if len(encoded) * 3 // 4 > MAX_SIGNATURE_BYTES:
+            return f'Signature is larger than {MAX_SIGNATURE_BYTES} bytes'
+        try:
+            signature_data = base64.b64decode(encoded)
+        except (binascii.Error, ValueError):
+            return 'Signature is not valid base64'
+    elif not isinstance(signature_data, bytes):
+        return 'Signature must be a data URL or image'
+    if len(signature_data) > MAX_SIGNATURE_BYTES:
+        return f'Signature is larger than {MAX_SIGNATURE_BYTES} bytes'
+
+    size = image_size(signature_data)
+    if size is None:
+        return 'Signature must be a PNG or JPEG image'
+    width, height = size
+    if width * height > MAX_SIGNATURE_PIXELS:
+        return f'Signature is {width}x{height} pixels (limit {MAX_SIGNATURE_PIXELS} pixels)'
+    return None
+
+
+def image_size(data):
+    """(width, height) from a PNG or JPEG header, or None if it has none"""
+    if data.startswith(PNG_MAGIC):
+        # The IHDR chunk always comes first
+        if len(data) < 24 or data[12:16] != b'IHDR':
+            return None
+        return struct.unpack('>II', data[16:24])
+    if data.startswith(JPEG_MAGIC):
+        offset = 2
+        while offset + 9 <= len(data):
+            if data[offset] != 0xFF:
+                return None
+            marker = data[offset + 1]
+            if marker == 0xFF:
+                offset += 1  # Fill byte
+                continue
+            if marker in JPEG_SOF_MARKERS:
+                height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+                return width, height
+            segment_length, = struct.unpack('>H', data[offset + 2:offset + 4])
+            offset += 2 + segment_length
+    return None
@@ -0,0 +1,243 @@
+"""
+Batch layout - lay out the same fields across many documents at once
+
+Bulk fills draw the same ~120 fields for thousands of payloads. Instead of
+measuring every string separately, layout_documents() takes one column of
+values per field and measures the whole column with NumPy:
+
+1. Each value is prepared as usual (BiDi/reshaping, font choice), then the
+   column is concatenated into one array of codepoints.
+2. Advance widths come from the precomputed font metrics table (see
+   font_metrics.py) by fancy indexing; a cumulative sum gives the width of
+   any slice, so truncated single lines are measured without copying.
+3. Multiline values are split into words with a whitespace lookup table and
+   wrapped greedily for all documents in lock step - one vectorized pass per
+   word position rather than one Python loop per document.
+
+The per-document render step then only draws the precomputed runs
+(PDFFiller.create_overlay(form_data, layout=...)). Widths are sums of whole
+font units converted with reportlab's arithmetic, so every run is identical
+to what _layout_field() produces. Values the table can't measure (missing
+table, characters outside the BMP or outside the font's coverage, which need
+font fallback runs) are laid out by _layout_field()'s scalar code, as is
+everything when NumPy is not installed.
+"""
+from .field_mapping import HEBREW_FONT_SIZE
+from .font_metrics import BMP_SIZE, get_metrics
+
+try:
+    import numpy as np
+except ImportError:  # Optional - batch layout falls back to the scalar code
+    np = None
+
+# Documents laid out together by PDFFiller.fill_forms()
+BATCH_SIZE = 500
+
+_tables = {}
+
+
+def _font_table(font_name):
+    """Return (metrics, widths, measurable) NumPy views for a font, or None"""
+    if font_name not in _tables:
+        metrics = get_metrics(font_name)
+        if metrics is None:
+            _tables[font_name] = None
+        else:
+            widths = np.frombuffer(metrics.widths, dtype=np.uint16).astype(np.int64)
+            # Only characters the font covers are measured here: any other
+            # character splits the text into font fallback runs (font_fallback.py)
+            measurable = np.zeros(BMP_SIZE, dtype=bool)
+            measurable[list(metrics.coverage)] = True
+            _tables[font_name] = (metrics, widths, measurable)
+    return _tables[font_name]
+
+
+_whitespace = None
+
+
+def _whitespace_table():
+    """Boolean table of the BMP characters str.split() breaks words on"""
+    global _whitespace
+    if _whitespace is None:
+        _whitespace = np.array([chr(cp).isspace() for cp in range(BMP_SIZE)], dtype=bool)
+    return _whitespace
+
+
+def layout_documents(filler, documents):
+    """
+    Lay out the form fields of many documents.
+
+    Args:
+        filler: PDFFiller whose form, text preparation and fonts are used
+        documents: list of form data dicts
+
+    Returns:
+        list with one {field_name: runs} per document, for every field of
+        the filler's form present in that document (see PDFFiller._layout_field)
+    """
+    extractor = filler.form.extractor
+    flat_documents = [extractor.extract(form_data) for form_data in documents]
+    layouts = [{} for _ in flat_documents]
+    for field_name, field_config in filler.form.fields.items():
+        indices = [i for i, flat in enumerate(flat_documents) if field_name in flat]
+        if not indices:
+            continue
+        values = [flat_documents[i][field_name] for i in indices]
+        for i, runs in zip(indices, layout_column(filler, values, field_config)):
+            layouts[i][field_name] = runs
+    return layouts
+
+
+def layout_column(filler, values, field_config):
+    """Lay out one field's values across documents; returns a list of runs per value"""
+    if field_config.get("checkbox", False):
+        return [filler._layout_field(value, field_config) for value in values]
+
+    runs = [[] for _ in values]
+    prepared = [(i, filler._prepare_field_text(value)) for i, value in enumerate(values) if value]
+    for i, column_runs in zip(
+        [i for i, _ in prepared],
+        layout_prepared(filler, [text_font for _, text_font in prepared], field_config)
+    ):
+        runs[i] = column_runs
+    return runs
+
+
+def layout_prepared(filler, prepared, field_config):
+    """
+    Lay out prepared (text, font_name) pairs of one field.
+
+    Returns:
+        list of runs, one per pair, as PDFFiller._layout_text would
+    """
+    runs = [None] * len(prepared)
+    by_font = {}
+    for i, (text, font_name) in enumerate(prepared):
+        by_font.setdefault(font_name, []).append(i)
+
+    for font_name, indices in by_font.items():
+        table = _font_table(font_name) if np is not None else None
+        if table is not None:
+            texts = [prepared[i][0] for i in indices]
+            for i, column_runs in zip(indices, _layout_texts(texts, font_name, table, field_config)):
+                runs[i] = column_runs
+
+    # Anything the vectorized pass couldn't measure goes through the scalar code
+    for i, column_runs in enumerate(runs):
+        if column_runs is None:
+            text, font_name = prepared[i]
+            runs[i] = filler._layout_text(text, font_name, field_config)
+    return runs
+
+
+def _layout_texts(texts, font_name, table, field_config):
+    """Vectorized layout of texts in one font; None for texts it can't measure"""
+    metrics, widths, measurable = table
+
+    # One array of codepoints; a space between texts keeps words apart
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    codepoints = np.frombuffer(" ".join(texts).encode("utf-32-le"), dtype="<u4").astype(np.int64)
+    in_bmp = codepoints < BMP_SIZE
+    bmp_codepoints = np.where(in_bmp, codepoints, 0)
+
+    # Prefix sums: units[a:b] = unit_sums[b] - unit_sums[a]
+    unit_sums = np.concatenate(([0], np.cumsum(widths[bmp_codepoints])))
+    bad_sums = np.concatenate(([0], np.cumsum(~(in_bmp & measurable[bmp_codepoints]))))
+    measurable_texts = bad_sums[starts + lengths] == bad_sums[starts]
+
+    if field_config.get("multiline", False):
+        lines = _wrap_texts(texts, starts, lengths, bmp_codepoints, unit_sums,
+                            measurable_texts, metrics, field_config)
+    else:
+        # Single line: truncated to max_length characters
+        cut = np.minimum(lengths, field_config.get("max_length", 100))
+        line_units = unit_sums[starts + cut] - unit_sums[starts]
+        lines = [[(texts[i][:cut[i]], line_units[i])] for i in range(len(texts))]
+
+    x = field_config["x"]
+    y = field_config["y"]
+    right = field_config.get("align", "left") == "right"
+    font_size = field_config.get("font_size", HEBREW_FONT_SIZE)
+    line_height = field_config.get("line_height", font_size + 3) if field_config.get("multiline", False) else 0
+    results = []
+    for i, text_lines in enumerate(lines):
+        if not measurable_texts[i]:
+            results.append(None)
+            continue
+        runs = []
+        current_y = y
+        for line, units in text_lines:
+            # Same arithmetic as _layout_text, so positions are bit-identical
+            line_x = x - metrics.width_from_units(int(units), font_size) if right else x
+            runs.append((font_name, font_size, line_x, current_y, line))
+            current_y -= line_height
+        results.append(runs)
+    return results
+
+
+def _wrap_texts(texts, starts, lengths, codepoints, unit_sums, measurable_texts,
+                metrics, field_config):
+    """Greedy word wrap of all texts at once; returns [(line, units)] per text"""
+    from .pdf_filler import MAX_MULTILINE_LINES
+
+    max_width = field_config.get("width", 450)
+    font_size = field_config.get("font_size", HEBREW_FONT_SIZE)
+    space_units = metrics.units(" ")
+
+    # Words are maximal runs of non-whitespace (what str.split() returns)
+    is_word = ~_whitespace_table()[codepoints]
+    edges = np.diff(np.concatenate(([False], is_word, [False])).astype(np.int8))
+    word_starts = np.flatnonzero(edges == 1)
+    word_ends = np.flatnonzero(edges == -1)
+    word_units = unit_sums[word_ends] - unit_sums[word_starts]
+    word_text = np.searchsorted(starts, word_starts, side="right") - 1
+
+    text_count = len(texts)
+    word_counts = np.bincount(word_text, minlength=text_count)
+    first_word = np.zeros(text_count, dtype=np.int64)
+    np.cumsum(word_counts[:-1], out=first_word[1:])
+
+    # Lock-step greedy wrap: step k places the k-th word of every text that
+    # still has one. A text drops out once a line past the last visible one
+    # starts, since nothing after that is drawn.
+    line_units = np.zeros(text_count, dtype=np.int64)
+    line_count = np.zeros(text_count, dtype=np.int64)
+    starts_line = np.zeros(len(word_starts), dtype=bool)
+    for k in range(int(word_counts.max(initial=0))):
+        active = np.flatnonzero((word_counts > k) & (line_count <= MAX_MULTILINE_LINES) & measurable_texts)
+        if not len(active):
+            break
+        word = first_word[active] + k
+        units = word_units[word]
+        has_line = line_count[active] > 0
+        test_units = np.where(has_line, line_units[active] + space_units + units, units)
+        fits = metrics.width_from_units(test_units, font_size) <= max_width
+        new_line = ~has_line | ~fits
+        line_units[active] = np.where(fits, test_units, units)
+        line_count[active] += new_line
+        starts_line[word[new_line]] = True
+
+    # A line ends where the next line of its text starts, or at the text's last word
+    line_starts = np.flatnonzero(starts_line)
+    line_text = word_text[line_starts]
+    next_in_text = np.append(line_text[1:] == line_text[:-1], False)
+    line_ends = np.where(next_in_text, np.append(line_starts[1:], 0),
+                         first_word[line_text] + word_counts[line_text])
+    line_index = np.arange(len(line_starts)) - np.searchsorted(line_text, line_text)
+    visible = line_index < MAX_MULTILINE_LINES
+    line_starts, line_ends, line_text = line_starts[visible], line_ends[visible], line_text[visible]
+
+    word_unit_sums = np.concatenate(([0], np.cumsum(word_units)))
+    line_widths = (word_unit_sums[line_ends] - word_unit_sums[line_starts]
+                   + (line_ends - line_starts - 1) * space_units)
+
+    lines = [[] for _ in texts]
+    for line, start_word, end_word, units in zip(line_text.tolist(), line_starts.tolist(),
+                                                 line_ends.tolist(), line_widths.tolist()):
+        offset = starts[line]
+        text = texts[line]
+        words = [text[word_starts[w] - offset:word_ends[w] - offset] for w in range(start_word, end_word)]
+        lines[line].append((" ".join(words), units))
+    return lines
@@ -0,0 +1,157 @@
+"""
+Bulk filling - fill many payloads in resident worker processes
+
+Filling one document in a fresh interpreter mostly pays for startup: imports,
+font registration and parsing the template. BulkFiller starts its workers
+once. Each one loads the PDF stack, registers the fonts and compiles the
+template in its initializer, then fills chunks of records for as long as the
+run lasts. Chunks are laid out in one batch pass (see batch_layout.py), like
+PDFFiller.fill_forms().
+
+Records are submitted as they are read, with at most a few chunks per worker
+in flight, so memory stays flat however long the input is, and results come
+back in input order. Every record passes the same admission check as the API
+(see admission.py); a record that is rejected or fails to render is reported
+in its result and the run continues.
+"""
+import collections
+import multiprocessing
+import os
+import signal
+import time
+from .admission import check_payload
+from .form_registry import BUILTIN_FORM
+from .pdf_output import DEFAULT_OUTPUT_MODE
+
+# Records per task sent to a worker
+CHUNK_SIZE = 16
+# Chunks in flight per worker, so workers never wait for the reader
+CHUNKS_PER_WORKER = 2
+
+# Result of one record: `pdf` is the filled PDF, or None with `error` set
+FillResult = collections.namedtuple('FillResult', 'key pdf error seconds')
+
+# Worker process state, set once by _init_worker
+_filler = None
+_output_mode = DEFAULT_OUTPUT_MODE
+
+
+def _init_worker(template_path, form, output_mode, ignore_interrupts=True):
+    """Load the PDF stack, fonts and template once per worker process"""
+    global _filler, _output_mode
+    if ignore_interrupts:
+        # Ctrl-C is handled by the parent, which stops the pool
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from .pdf_filler import PDFFiller
+    _filler = PDFFiller(template_path, form)
+    _output_mode = output_mode
+
+
+def _fill_chunk(chunk):
+    """Fill a chunk of (key, form_data) records; returns a FillResult per record"""
+    from .batch_layout import layout_documents
+
+    results = [None] * len(chunk)
+    admitted = []
+    for index, (key, form_data) in enumerate(chunk):
+        admission = check_payload(form_data, _filler.form.schema.fields)
+        if admission['valid']:
+            admitted.append(index)
+        else:
+            results[index] = FillResult(key, None, '; '.join(admission['errors']), 0.0)
+
+    try:
+        layouts = layout_documents(_filler, [chunk[index][1] for index in admitted])
+    except Exception:
+        layouts = [None] * len(admitted)  # Each record is laid out (and fails) on its own
+    for index, layout in zip(admitted, layouts):
+        key, form_data = chunk[index]
+        start = time.perf_counter()
+        try:
+            pdf = _filler.fill_form(form_data, layout=layout, output_mode=_output_mode)
+        except Exception as e:
+            results[index] = FillResult(key, None, f'{type(e).__name__}: {e}',
+                                        time.perf_counter() - start)
+        else:
+            results[index] = FillResult(key, pdf, None, time.perf_counter() - start)
+    return results
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BulkFiller:
+    """Fills records in a pool of worker processes that keep the template loaded"""
+
+    def __init__(self, template_path, form=None, jobs=None, chunk_size=CHUNK_SIZE,
+                 output_mode=DEFAULT_OUTPUT_MODE):
+        """
+        Args:
+            template_path: Template PDF
+            form: FormTemplate to fill (see form_registry.py); the built-in form by default
+            jobs: Worker processes (default: one per CPU); 1 fills in this process
+            chunk_size: Records per task
+            output_mode: 'fast' or 'small' (see pdf_output.py)
+        """
+        self.jobs = jobs or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        init_args = (template_path, form or BUILTIN_FORM, output_mode)
+        if self.jobs == 1:
+            _init_worker(*init_args, ignore_interrupts=False)
+            self._pool = None
+        else:
+            self._pool = multiprocessing.Pool(self.jobs, _init_worker, init_args)
+
+    def fill(self, records):
+        """
+        Fill records as they are read.
+
+        Args:
+            records: iterable of (key, form_data); keys are returned as given
+
+        Yields:
+            FillResult per record, in input order
+        """
+        if self._pool is None:
+            for chunk in _chunks(records, self.chunk_size):
+                yield from _fill_chunk(chunk)
+            return
+
+        pending = collections.deque()
+        for chunk in _chunks(records, self.chunk_size):
+            pending.append(self._pool.apply_async(_fill_chunk, (chunk,)))
+            if len(pending) >= self.jobs * CHUNKS_PER_WORKER:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+    def close(self):
+        """Stop the workers (waiting for them after a complete run)"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def terminate(self):
+        """Stop the workers at once, discarding work in flight"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,92 @@
+"""
+Field extraction - pull the form's fields out of a submission
+
+Submissions may nest values in dictionaries, which address the field of
+their dotted name ({"employer": {"city": ...}} fills "employer.city").
+Instead of flattening the whole payload and then dropping the keys that
+are not fields, FieldExtractor walks the field mapping: each field's access
+path is split once, and its value is looked up directly. Unknown keys are
+never visited, so the work is proportional to the number of fields however
+much else a client sends. Strict mode lists the unknown keys instead of
+ignoring them.
+"""
+from .field_mapping import FORM_FIELDS
+
+# Keys a submission may carry besides the fields themselves
+EXTRA_KEYS = frozenset({'signature_image'})
+
+_MISSING = object()
+
+
+class UnknownFields(ValueError):
+    """A strict extraction found keys that are not fields"""
+
+    def __init__(self, keys):
+        super().__init__(f'Unknown fields: {", ".join(keys)}')
+        self.keys = keys
+
+
+class FieldExtractor:
+    """Looks up the fields of a field mapping in submissions"""
+
+    def __init__(self, fields, extra_keys=EXTRA_KEYS):
+        """
+        Args:
+            fields: {field_name: config} (see field_mapping.FORM_FIELDS)
+            extra_keys: Top-level keys that are accepted but not fields
+        """
+        self.paths = [(field_name, tuple(field_name.split('.'))) for field_name in fields]
+        self.extra_keys = frozenset(extra_keys)
+        # Dictionaries on the way to a nested field, for strict mode
+        self.prefixes = frozenset(
+            path[:depth] for _, path in self.paths for depth in range(1, len(path))
+        )
+        self.known = frozenset(path for _, path in self.paths)
+
+    def extract(self, form_data, strict=False):
+        """
+        Return {field_name: value} of the fields present in form_data.
+
+        A field may be given by its dotted name or nested; dictionary values
+        are containers, never field values.
+
+        Raises:
+            UnknownFields: in strict mode, if form_data has keys that are
+                neither fields nor EXTRA_KEYS
+        """
+        if strict:
+            unknown = self.unknown_keys(form_data)
+            if unknown:
+                raise UnknownFields(unknown)
+
+        values = {}
+        for field_name, path in self.paths:
+            value = form_data.get(field_name, _MISSING)
+            if value is _MISSING and len(path) > 1:
+                value = form_data
+                for key in path:
+                    value = value.get(key, _MISSING) if isinstance(value, dict) else _MISSING
+                    if value is _MISSING:
+                        break
+            if value is not _MISSING and not isinstance(value, dict):
+                values[field_name] = value
+        return values
+
+    def unknown_keys(self, form_data):
+        """Dotted names of the keys in form_data that are not fields"""
+        unknown = []
+        pending = [(form_data, ())]
+        while pending:
+            values, parent = pending.pop()
+            for key, value in values.items():
+                path = parent + tuple(str(key).split('.'))
+                if isinstance(value, dict) and path in self.prefixes:
+                    pending.append((value, path))
+                elif isinstance(value, dict) or path not in self.known:
+                    if parent or key not in self.extra_keys:
+                        unknown.append('.'.join(path))
+        return unknown
+
+
+# Extractor of the form's field mapping
+field_extractor = FieldExtractor(FORM_FIELDS)
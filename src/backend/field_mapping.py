@@ -19,6 +19,11 @@ HEBREW_FONT_SIZE = 9
 CHECKBOX_SIZE = 10
 HEBREW_FONT_NAME = "NotoSansHebrew"
 
+# Multiline fields are cut off after this many lines
+MAX_MULTILINE_LINES = 10
+# Narrowest glyph advance of the fonts used, in ems (DejaVu Sans; Helvetica's is 0.191)
+MIN_CHAR_WIDTH = 0.166
+
 # Field definitions with alignment support
 # Based on actual PDF label positions:
 # - Labels at y_top=N means label is at y_bottom = PAGE_HEIGHT - N - font_height
@@ -303,3 +308,45 @@ FORM_FIELDS = {
     # תאריך הביקור at y≈356
     "signature_date": {"x": 526, "y": 348, "page": 3, "max_length": 12, "align": "right"},
 }
+
+# Signature field configurations - dual placement on page 4
+SIGNATURE_CONFIGS = [
+    {
+        "page": 3,      # Page 4 (0-indexed)
+        "x": 55,        # X position (left side)
+        "y": 420,       # Y position - social worker signature area
+        "width": 150,   # Max width
+        "height": 40,   # Max height
+    },
+    {
+        "page": 3,      # Page 4 (0-indexed)
+        "x": 55,        # X position (left side)
+        "y": 335,       # Y position - bottom signature area (near visit date)
+        "width": 150,   # Max width
+        "height": 40,   # Max height
+    },
+]
+
+# Checkboxes that answer one question together. In an exclusive group at most
+# one box may be checked (yes/no answers); the others allow any combination.
+CHECKBOX_GROUPS = {
+    "placement_agency_location": {"fields": ["placement_israel", "placement_abroad"], "exclusive": True},
+    "was_hospitalized": {"fields": ["was_hospitalized_yes", "was_hospitalized_no"], "exclusive": True},
+    "contract_holder": {"fields": ["contract_employer", "contract_worker", "contract_other"], "exclusive": False},
+    "contract_translated": {"fields": ["contract_translated_yes", "contract_translated_no"], "exclusive": True},
+    "payment_method": {"fields": ["payment_check", "payment_bank", "payment_cash", "payment_other"], "exclusive": False},
+    "treatment_type": {
+        "fields": [
+            "treatment_employer_issues", "treatment_worker_issues", "treatment_mediation",
+            "treatment_followup", "treatment_referral", "treatment_family_report",
+        ],
+        "exclusive": False,
+    },
+    "attendees": {
+        "fields": [
+            "attendee_employer", "attendee_family", "attendee_worker",
+            "attendee_office_rep", "attendee_other",
+        ],
+        "exclusive": False,
+    },
+}
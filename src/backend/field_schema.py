@@ -0,0 +1,103 @@
+"""
+Field schema - the /api/fields response, compiled once per field mapping
+
+The schema only changes with the field mapping, so it is built and serialized
+once into ready-to-send bytes: plain JSON, a gzipped copy and a content-hash
+ETag. Serving it is a dictionary lookup; clients that already have it get a
+304 back from the ETag.
+
+Besides each field's type, page and `max_length`, the schema names the
+checkbox group of every checkbox (see CHECKBOX_GROUPS), so clients can
+validate lengths and exclusive answers before submitting.
+
+Multiline fields are wrapped to their width and cut off after
+MAX_MULTILINE_LINES lines rather than truncated by character count, so their
+`max_length` is what those lines can hold (see multiline_capacity()).
+"""
+import gzip
+import hashlib
+import json
+import math
+import threading
+from .field_mapping import (
+    CHECKBOX_GROUPS, FORM_FIELDS, HEBREW_FONT_SIZE, MAX_MULTILINE_LINES, MIN_CHAR_WIDTH
+)
+
+# Seconds clients may use a cached schema before revalidating it with the ETag
+SCHEMA_MAX_AGE = 24 * 3600
+
+
+class CompiledSchema:
+    """Schema, serialized schema, gzipped copy and ETags"""
+
+    __slots__ = ("fields", "body", "gzipped", "etag", "gzip_etag")
+
+    def __init__(self, schema):
+        """
+        Args:
+            schema: JSON-serializable schema dict
+        """
+        self.fields = schema
+        self.body = json.dumps(schema, ensure_ascii=False, sort_keys=True,
+                               separators=(",", ":")).encode("utf-8")
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        # Each encoding is a different representation, so it has its own ETag
+        self.etag = digest
+        self.gzip_etag = f"{digest}-gz"
+
+
+def multiline_capacity(field_config):
+    """Most characters the lines of a multiline field can show, at the narrowest glyph width"""
+    line_width = field_config.get("width", 450)
+    char_width = MIN_CHAR_WIDTH * field_config.get("font_size", HEBREW_FONT_SIZE)
+    return MAX_MULTILINE_LINES * math.ceil(line_width / char_width)
+
+
+def build_schema(fields=FORM_FIELDS, groups=CHECKBOX_GROUPS):
+    """
+    Describe the form fields for clients.
+
+    Returns:
+        {field_name: {type, multiline, max_length, page[, group, exclusive]}}
+    """
+    group_of = {
+        field_name: (group_name, group["exclusive"])
+        for group_name, group in groups.items()
+        for field_name in group["fields"]
+    }
+    schema = {}
+    for field_name, field_config in fields.items():
+        entry = {
+            "type": "checkbox" if field_config.get("checkbox") else "text",
+            "multiline": field_config.get("multiline", False),
+            "max_length": (multiline_capacity(field_config) if field_config.get("multiline")
+                           else field_config.get("max_length")),
+            "page": field_config.get("page"),
+        }
+        if field_name in group_of:
+            entry["group"], entry["exclusive"] = group_of[field_name]
+        schema[field_name] = entry
+    return schema
+
+
+_compiled = None
+_compiled_lock = threading.Lock()
+
+
+def get_schema():
+    """Return the CompiledSchema of the field mapping, compiling it on first use"""
+    global _compiled
+    if _compiled is None:
+        with _compiled_lock:
+            if _compiled is None:
+                _compiled = CompiledSchema(build_schema())
+    return _compiled
+
+
+def reload_schema():
+    """Recompile the schema, e.g. after the field mapping changed"""
+    global _compiled
+    with _compiled_lock:
+        _compiled = CompiledSchema(build_schema())
+    return _compiled
@@ -0,0 +1,152 @@
+"""
+Font fallback - split text into runs of fonts that have its glyphs
+
+A value has a primary font: the Hebrew font if it contains Hebrew, Helvetica
+otherwise. A character the current font has no glyph for switches to the
+first font in the chain that has one. The chain is the primary font, then the
+rest of pdf_filler.FONT_CHAIN (Hebrew font, Helvetica, fallback fonts).
+Characters the current font covers - spaces, digits after Latin letters - stay
+in the current run, so "רחוב Herzl 12" becomes two runs, not one per word.
+Characters no font covers stay in the current font and render as .notdef, as
+they did before.
+
+Coverage comes from the bitsets in the font metrics table (font_metrics.py),
+or from the font's cmap for fonts without a table. Splits are cached per
+distinct string and chain. LineWidth measures a line as it grows, word by word,
+with the same splitting.
+"""
+from functools import lru_cache
+from .font_metrics import BMP_SIZE, get_metrics, string_width
+
+RUN_CACHE_SIZE = 8192
+
+_coverage = {}
+
+
+def font_coverage(font_name):
+    """Frozenset of the characters a registered font has glyphs for"""
+    coverage = _coverage.get(font_name)
+    if coverage is None:
+        metrics = get_metrics(font_name)
+        if metrics is not None:
+            coverage = metrics.covered_chars
+        else:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+            font = pdfmetrics.getFont(font_name)
+            if isinstance(font, TTFont):
+                coverage = frozenset(map(chr, font.face.charToGlyph))
+            else:
+                # Type 1: what its encoding can represent, as pdfmetrics.unicode2T1 sees it
+                coverage = frozenset(
+                    char for char in map(chr, range(BMP_SIZE)) if _encodes(char, font.encName)
+                )
+        _coverage[font_name] = coverage
+    return coverage
+
+
+def _encodes(char, encoding):
+    try:
+        return len(char.encode(encoding)) == 1
+    except UnicodeError:
+        return False
+
+
+@lru_cache(maxsize=RUN_CACHE_SIZE)
+def split_runs(text, chain):
+    """
+    Split text into runs by font coverage.
+
+    Args:
+        text: Text in visual order
+        chain: tuple of font names to try, starting with the primary font
+
+    Returns:
+        tuple of (font_name, segment) in text order; a single run when the
+        primary font covers the whole text
+    """
+    coverages, _ = _chain_fonts(chain)
+    if coverages[0].issuperset(text):
+        return ((chain[0], text),)
+
+    runs = []
+    current = 0
+    start = 0
+    for index, char in enumerate(text):
+        if char in coverages[current]:
+            continue
+        font = next((i for i, coverage in enumerate(coverages) if char in coverage), current)
+        if font != current:
+            if index > start:
+                runs.append((chain[current], text[start:index]))
+            current = font
+            start = index
+    runs.append((chain[current], text[start:]))
+    return tuple(runs)
+
+
+@lru_cache(maxsize=64)
+def _chain_fonts(chain):
+    """Coverage and metrics table (or None) of each font in a chain"""
+    return (tuple(font_coverage(font_name) for font_name in chain),
+            tuple(get_metrics(font_name) for font_name in chain))
+
+
+class LineWidth:
+    """
+    Width of a line drawn with a font chain, built up one piece at a time.
+
+    extended() continues split_runs()'s left-to-right scan, so width() always
+    equals summing string_width() over split_runs() of the whole line, without
+    re-measuring the line for every word that is tried.
+    """
+
+    __slots__ = ("chain", "size", "closed", "current", "text", "units")
+
+    def __init__(self, chain, size):
+        self.chain = chain
+        self.size = size
+        self.closed = 0     # Sum of the widths of the finished runs, in order
+        self.current = 0    # Index in chain of the current run's font
+        self.text = ""      # Text of the current run
+        self.units = 0      # Its width in font units (None: not measurable from a table)
+
+    def extended(self, piece):
+        """Return a new LineWidth for this line followed by piece"""
+        line = LineWidth(self.chain, self.size)
+        line.closed, line.current, line.text, line.units = self.closed, self.current, self.text, self.units
+        coverages, _ = _chain_fonts(self.chain)
+        if coverages[line.current].issuperset(piece):
+            line._append(piece)
+            return line
+
+        start = 0
+        for index, char in enumerate(piece):
+            if char in coverages[line.current]:
+                continue
+            font = next((i for i, coverage in enumerate(coverages) if char in coverage), line.current)
+            if font != line.current:
+                line._append(piece[start:index])
+                if line.text:
+                    line.closed += line._run_width()
+                line.current, line.text, line.units = font, "", 0
+                start = index
+        line._append(piece[start:])
+        return line
+
+    def width(self):
+        """Width of the line in points"""
+        return self.closed + self._run_width() if self.text else self.closed
+
+    def _append(self, piece):
+        self.text += piece
+        if self.units is not None:
+            metrics = _chain_fonts(self.chain)[1][self.current]
+            units = metrics.units(piece) if metrics is not None else None
+            self.units = None if units is None else self.units + units
+
+    def _run_width(self):
+        metrics = _chain_fonts(self.chain)[1][self.current]
+        if metrics is not None and self.units is not None:
+            return metrics.width_from_units(self.units, self.size)
+        return string_width(self.text, self.chain[self.current], self.size)
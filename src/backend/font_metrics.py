@@ -0,0 +1,252 @@
+"""
+Precomputed font metrics - string widths from array lookups instead of TTFont objects
+
+tools/build_font_metrics.py extracts the advance widths and character coverage
+of the embedded Hebrew font and of Helvetica into fonts/font_metrics.bin:
+
+    header    b"FFMETRC1", uint32 font count
+    per font  name[32], kind (0 = TrueType, 1 = Type 1), default width,
+              page count, source digest[32], offsets of the three arrays below
+    pages     uint8 high byte of each covered 256-codepoint BMP page
+    widths    uint16[256] per page, in 1/1000 em (what reportlab uses)
+    coverage  32-byte bitset per page, one bit per codepoint
+
+All integers are little-endian. The file is memory-mapped and each font's pages
+are copied into one flat array('H') covering the BMP, so measuring a string is
+a sum of array lookups and needs neither reportlab nor the TTF file.
+
+Widths are only stored when they are whole units, which keeps sums exact:
+string_width() returns the same float as pdfmetrics.stringWidth. Fonts
+without a table (or with a stale one) are measured by reportlab as before.
+"""
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from .fonts import PROJECT_ROOT, font_files
+
+METRICS_PATH = os.path.join(PROJECT_ROOT, "fonts", "font_metrics.bin")
+
+MAGIC = b"FFMETRC1"
+HEADER = struct.Struct("<8sI")
+FONT_ENTRY = struct.Struct("<32sBxHH32sIII2x")
+KIND_TRUETYPE = 0
+KIND_TYPE1 = 1
+BMP_SIZE = 0x10000
+PAGE_SIZE = 256
+
+
+class FontMetrics:
+    """Advance widths and coverage of one font over the Basic Multilingual Plane"""
+
+    def __init__(self, name, kind, default_width, widths, coverage):
+        """
+        Args:
+            name: reportlab font name
+            kind: KIND_TRUETYPE or KIND_TYPE1
+            default_width: Width of characters the font doesn't cover (TrueType)
+            widths: array('H') of BMP_SIZE widths in 1/1000 em
+            coverage: frozenset of covered codepoints
+        """
+        self.name = name
+        self.kind = kind
+        self.default_width = default_width
+        self.widths = widths
+        self.coverage = coverage
+        # The same coverage as characters, for set operations on strings
+        self.covered_chars = frozenset(map(chr, coverage))
+
+    def covers(self, text):
+        """True if the font has a glyph for every character of text"""
+        return self.covered_chars.issuperset(text)
+
+    def units(self, text):
+        """
+        Sum of the advance widths of text in 1/1000 em, or None if it can't be
+        measured from the table (characters outside the BMP, or a Type 1
+        font's characters outside its encoding).
+        """
+        if text and max(text) > "\uffff":
+            return None
+        if self.kind == KIND_TYPE1 and not self.covered_chars.issuperset(text):
+            return None  # reportlab substitutes Symbol/ZapfDingbats glyphs
+        return sum(map(self.widths.__getitem__, map(ord, text)))
+
+    def width_from_units(self, units, size):
+        """Convert a unit sum to points with reportlab's exact arithmetic"""
+        if self.kind == KIND_TYPE1:
+            return units * 0.001 * size
+        return 0.001 * size * units
+
+    def string_width(self, text, size):
+        """Width of text in points, or None if it can't be measured from the table"""
+        units = self.units(text)
+        return None if units is None else self.width_from_units(units, size)
+
+
+def font_digest(font_path):
+    """Digest identifying the font file a table was built from"""
+    with open(font_path, "rb") as font_file:
+        return hashlib.sha256(font_file.read()).digest()
+
+
+def _type1_digest():
+    # Built-in AFM metrics only change with reportlab itself
+    import reportlab
+    return hashlib.sha256(f"reportlab {reportlab.Version}".encode("ascii")).digest()
+
+
+def build_metrics_file(output_path=METRICS_PATH, fonts=None):
+    """
+    Extract metrics from reportlab fonts and write the metrics file.
+
+    Args:
+        output_path: Where to write the file
+        fonts: list of (font name, TTF path or None for a Type 1 standard font);
+            defaults to the Hebrew and fallback fonts that are installed, and Helvetica
+
+    Returns:
+        list of font names written (fonts with fractional widths are skipped)
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if fonts is None:
+        fonts = list(font_files().items()) + [("Helvetica", None)]
+
+    tables = []
+    for name, font_path in fonts:
+        if font_path is not None:
+            face = TTFont(name, font_path).face
+            kind, default, digest = KIND_TRUETYPE, face.defaultWidth, font_digest(font_path)
+            char_widths = {cp: w for cp, w in face.charWidths.items() if cp < BMP_SIZE}
+        else:
+            font = pdfmetrics.getFont(name)
+            kind, default, digest = KIND_TYPE1, 0, _type1_digest()
+            char_widths = {}
+            for cp in range(BMP_SIZE):
+                try:
+                    encoded = chr(cp).encode(font.encName)  # As pdfmetrics.unicode2T1 does
+                except UnicodeError:
+                    continue
+                if len(encoded) == 1:
+                    char_widths[cp] = font.widths[encoded[0]]
+
+        if not float(default).is_integer() or not all(float(w).is_integer() for w in char_widths.values()):
+            print(f"Skipping {name}: fractional widths can't be summed exactly")
+            continue
+        pages = sorted({cp >> 8 for cp in char_widths})
+        widths = array("H", [int(default)]) * (len(pages) * PAGE_SIZE)
+        coverage = bytearray(len(pages) * PAGE_SIZE // 8)
+        for index, page in enumerate(pages):
+            for low in range(PAGE_SIZE):
+                width = char_widths.get((page << 8) | low)
+                if width is not None:
+                    widths[index * PAGE_SIZE + low] = int(width)
+                    bit = index * PAGE_SIZE + low
+                    coverage[bit >> 3] |= 1 << (bit & 7)
+        if sys.byteorder != "little":
+            widths.byteswap()
+        tables.append((name, kind, int(default), digest, bytes(pages), widths.tobytes(), bytes(coverage)))
+
+    offset = HEADER.size + FONT_ENTRY.size * len(tables)
+    entries, blobs = [], []
+    for name, kind, default, digest, pages, widths, coverage in tables:
+        pages_padded = pages + b"\x00" * (-len(pages) % 2)  # Keep uint16 data aligned
+        entries.append(FONT_ENTRY.pack(
+            name.encode("ascii"), kind, default, len(pages), digest,
+            offset, offset + len(pages_padded), offset + len(pages_padded) + len(widths)
+        ))
+        blobs.append(pages_padded + widths + coverage)
+        offset += len(blobs[-1])
+
+    with open(output_path, "wb") as output_file:
+        output_file.write(HEADER.pack(MAGIC, len(tables)))
+        output_file.write(b"".join(entries))
+        output_file.write(b"".join(blobs))
+    return [table[0] for table in tables]
+
+
+def load_metrics_file(path=METRICS_PATH, font_paths=None):
+    """
+    Load all font tables from a metrics file.
+
+    Args:
+        font_paths: {font name: TTF path} used to reject tables built from a
+            different font file
+
+    Returns:
+        dict of font name -> FontMetrics (empty if the file is missing or invalid)
+    """
+    font_paths = font_paths or {}
+    try:
+        with open(path, "rb") as metrics_file:
+            data = mmap.mmap(metrics_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return {}
+
+    metrics = {}
+    try:
+        magic, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            return {}
+        for index in range(count):
+            (raw_name, kind, default, page_count, digest,
+             pages_at, widths_at, coverage_at) = FONT_ENTRY.unpack_from(data, HEADER.size + index * FONT_ENTRY.size)
+            name = raw_name.rstrip(b"\x00").decode("ascii")
+            if kind == KIND_TYPE1:
+                expected = _type1_digest()
+            elif name in font_paths and os.path.exists(font_paths[name]):
+                expected = font_digest(font_paths[name])
+            else:
+                continue
+            if digest != expected:
+                print(f"Ignoring stale metrics for {name}; run tools/build_font_metrics.py")
+                continue
+
+            widths = array("H", [default]) * BMP_SIZE
+            coverage = set()
+            for page_index, page in enumerate(data[pages_at:pages_at + page_count]):
+                start = widths_at + page_index * PAGE_SIZE * 2
+                page_widths = array("H")
+                page_widths.frombytes(data[start:start + PAGE_SIZE * 2])
+                if sys.byteorder != "little":
+                    page_widths.byteswap()
+                widths[page << 8:(page + 1) << 8] = page_widths
+
+                bits = data[coverage_at + page_index * 32:coverage_at + (page_index + 1) * 32]
+                coverage.update((page << 8) | low for low in range(PAGE_SIZE)
+                                if bits[low >> 3] & (1 << (low & 7)))
+            metrics[name] = FontMetrics(name, kind, default, widths, frozenset(coverage))
+    finally:
+        data.close()
+    return metrics
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics(font_name):
+    """Return the FontMetrics for a font, or None if there is no valid table"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = load_metrics_file(METRICS_PATH, font_files())
+    return _metrics.get(font_name)
+
+
+def string_width(text, font_name, size):
+    """Width of text in points; same result as pdfmetrics.stringWidth"""
+    metrics = get_metrics(font_name)
+    if metrics is not None:
+        width = metrics.string_width(text, size)
+        if width is not None:
+            return width
+    from reportlab.pdfbase import pdfmetrics
+    return pdfmetrics.stringWidth(text, font_name, size)
@@ -0,0 +1,38 @@
+"""
+Font files - where the TrueType fonts are found
+
+Kept apart from pdf_filler.py so that font_metrics.py can find the fonts its
+table was built from without importing reportlab and pypdf.
+"""
+import os
+from .field_mapping import HEBREW_FONT_NAME
+
+# Get the project root directory (where fonts/ is located)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Try embedded font first (for deployment), then fall back to system font (for local dev)
+EMBEDDED_FONT_PATH = os.path.join(PROJECT_ROOT, "fonts", "NotoSansHebrew-Regular.ttf")
+SYSTEM_FONT_PATH = "/Library/Fonts/Arial Unicode.ttf"
+
+# Fonts tried after the Hebrew font and Helvetica for characters neither has a
+# glyph for (e.g. Cyrillic names). The first existing file of each is used.
+FALLBACK_FONT_PATHS = {
+    "DejaVuSans": [
+        os.path.join(PROJECT_ROOT, "fonts", "DejaVuSans.ttf"),
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    ],
+}
+
+
+def font_files():
+    """Return {font name: TTF path} of the TrueType fonts register_fonts() uses"""
+    files = {}
+    for path in (EMBEDDED_FONT_PATH, SYSTEM_FONT_PATH):
+        if os.path.exists(path):
+            files[HEBREW_FONT_NAME] = path
+            break
+    for font_name, paths in FALLBACK_FONT_PATHS.items():
+        path = next((path for path in paths if os.path.exists(path)), None)
+        if path:
+            files[font_name] = path
+    return files
@@ -0,0 +1,369 @@
+"""
+Template registry - forms defined by data files, reloaded while running
+
+Besides the built-in visit report (field_mapping.py and templates/template.pdf),
+forms are defined by files in the registry directory (templates/forms/ by
+default), one per form, named after its template ID:
+
+    templates/forms/visit_report_2026.json   (or .yaml / .yml with PyYAML)
+
+    {
+      "name": "Visit report (2026 revision)",
+      "pdf": "visit_report_2026.pdf",
+      "page_count": 4,
+      "page_size": [595.3, 841.9],
+      "fonts": {"text_size": 9, "checkbox_size": 10},
+      "fields": {
+        "employer_last_name": {"x": 547, "y": 593, "page": 0, "max_length": 20, "align": "right"},
+        "placement_israel": {"x": 408, "y": 424, "page": 0, "checkbox": true}
+      },
+      "checkbox_groups": {
+        "placement_agency_location": {"fields": ["placement_israel", "placement_abroad"], "exclusive": true}
+      },
+      "signatures": [{"page": 3, "x": 55, "y": 420, "width": 150, "height": 40}]
+    }
+
+`pdf` is relative to the definition file. `page_size` (the overlay's page
+size, A4 by default), `fonts`, `checkbox_groups` and `signatures` are
+optional. Fields take the keys of FORM_FIELDS entries, plus `font_size`.
+`tools/export_template.py` writes the built-in form in this format, as a
+starting point for the next revision.
+
+Each definition is compiled once into a FormTemplate. Compiling validates it
+and builds its field extractor and /api/fields schema. A watcher thread polls
+the definitions and their PDFs and recompiles changed ones off the request
+path. It also compiles their PDFs when the PDF stack is loaded. The new set of
+templates replaces the old one in a single assignment, so a request sees one
+version of a form, never a mix. A definition that fails to compile is reported
+and its previous version is kept.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from .field_extraction import FieldExtractor
+from .field_mapping import CHECKBOX_GROUPS, FORM_FIELDS, SIGNATURE_CONFIGS
+from .field_schema import CompiledSchema, build_schema, get_schema
+from .pdf_validator import EXPECTED_PAGE_COUNT
+
+try:
+    import yaml
+except ImportError:  # Optional - only JSON definitions are read without it
+    yaml = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BUILTIN_PDF = os.path.join(PROJECT_ROOT, "templates", "template.pdf")
+REGISTRY_DIR = os.path.join(PROJECT_ROOT, "templates", "forms")
+
+BUILTIN_TEMPLATE_ID = "visit_report"
+TEMPLATE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+DEFINITION_EXTENSIONS = (".json", ".yaml", ".yml")
+
+# Seconds between checks for changed definitions
+RELOAD_INTERVAL = 2.0
+
+FIELD_KEYS = frozenset({"x", "y", "page", "checkbox", "max_length", "multiline", "width",
+                        "line_height", "align", "font_size"})
+SIGNATURE_KEYS = ("page", "x", "y", "width", "height")
+
+
+class FormTemplate:
+    """A compiled form: its PDF, field mapping and what is derived from them"""
+
+    def __init__(self, template_id, pdf_path, fields, checkbox_groups=None, signature_configs=(),
+                 page_count=EXPECTED_PAGE_COUNT, page_size=None, name=None, source=None,
+                 schema=None):
+        """
+        Args:
+            template_id: ID used in routes
+            pdf_path: Template PDF
+            fields: {field_name: config} as in FORM_FIELDS
+            checkbox_groups: As CHECKBOX_GROUPS
+            signature_configs: Signature boxes as SIGNATURE_CONFIGS
+            page_count: Pages of the template PDF (checked on uploads)
+            page_size: (width, height) of overlay pages, or None for A4
+            name: Display name
+            source: Definition file, or None for the built-in form
+            schema: CompiledSchema, if already compiled
+        """
+        self.template_id = template_id
+        self.pdf_path = pdf_path
+        self.fields = fields
+        self.checkbox_groups = checkbox_groups or {}
+        self.signature_configs = list(signature_configs)
+        self.page_count = page_count
+        self.page_size = tuple(page_size) if page_size else None
+        self.name = name or template_id
+        self.source = source
+        self.extractor = FieldExtractor(fields)
+        self.schema = schema or CompiledSchema(build_schema(fields, self.checkbox_groups))
+        # Changes whenever what is drawn could change, for cached renderings
+        self.digest = hashlib.sha256(json.dumps(
+            [fields, self.signature_configs, self.page_size], sort_keys=True
+        ).encode('utf-8')).hexdigest()
+
+    def describe(self):
+        """Summary for the template list"""
+        return {
+            'id': self.template_id,
+            'name': self.name,
+            'page_count': self.page_count,
+            'field_count': len(self.fields),
+            'builtin': self.source is None,
+        }
+
+
+def builtin_template(pdf_path=BUILTIN_PDF):
+    """The visit report of field_mapping.py"""
+    return FormTemplate(BUILTIN_TEMPLATE_ID, pdf_path, FORM_FIELDS, CHECKBOX_GROUPS,
+                        SIGNATURE_CONFIGS, EXPECTED_PAGE_COUNT, name="Visit report",
+                        schema=get_schema())
+
+
+# Form drawn by fillers created without one
+BUILTIN_FORM = builtin_template()
+
+
+def load_definition(path):
+    """Parse a JSON or YAML definition file"""
+    with open(path, encoding='utf-8') as definition_file:
+        if path.endswith('.json'):
+            return json.load(definition_file)
+        if yaml is None:
+            raise ValueError('YAML definitions need PyYAML (pip install pyyaml)')
+        return yaml.safe_load(definition_file)
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def compile_definition(template_id, definition, base_dir, source=None):
+    """
+    Validate a parsed definition and compile it.
+
+    Returns:
+        FormTemplate
+
+    Raises:
+        ValueError: describing the first problem found
+    """
+    if not TEMPLATE_ID_RE.match(template_id):
+        raise ValueError(f'Invalid template ID {template_id!r} (use letters, digits, _ and -)')
+    if template_id == BUILTIN_TEMPLATE_ID:
+        raise ValueError(f'{BUILTIN_TEMPLATE_ID!r} is the built-in form; use another ID')
+    if not isinstance(definition, dict):
+        raise ValueError('Definition must be a mapping')
+
+    pdf = definition.get('pdf')
+    if not isinstance(pdf, str):
+        raise ValueError('"pdf" must name the template PDF')
+    pdf_path = os.path.normpath(os.path.join(base_dir, pdf))
+    if not os.path.isfile(pdf_path):
+        raise ValueError(f'Template PDF not found: {pdf_path}')
+
+    page_count = definition.get('page_count')
+    if not isinstance(page_count, int) or page_count < 1:
+        raise ValueError('"page_count" must be a positive integer')
+
+    page_size = definition.get('page_size')
+    if page_size is not None and not (isinstance(page_size, list) and len(page_size) == 2
+                                      and all(_number(v) and v > 0 for v in page_size)):
+        raise ValueError('"page_size" must be [width, height] in points')
+
+    fonts = definition.get('fonts') or {}
+    default_sizes = {}
+    for key, kind in (('text_size', 'text'), ('checkbox_size', 'checkbox')):
+        if key in fonts:
+            if not _number(fonts[key]) or fonts[key] <= 0:
+                raise ValueError(f'"fonts.{key}" must be a positive number')
+            default_sizes[kind] = fonts[key]
+
+    fields = definition.get('fields')
+    if not isinstance(fields, dict) or not fields:
+        raise ValueError('"fields" must map field names to their placement')
+    compiled_fields = {}
+    for field_name, config in fields.items():
+        if not isinstance(field_name, str) or not field_name:
+            raise ValueError(f'Field names must be non-empty strings, not {field_name!r}')
+        if not isinstance(config, dict):
+            raise ValueError(f'Field {field_name}: must be a mapping')
+        unknown = set(config) - FIELD_KEYS
+        if unknown:
+            raise ValueError(f'Field {field_name}: unknown keys {sorted(unknown)}')
+        if not (_number(config.get('x')) and _number(config.get('y'))):
+            raise ValueError(f'Field {field_name}: "x" and "y" must be numbers')
+        if not isinstance(config.get('page'), int) or not 0 <= config['page'] < page_count:
+            raise ValueError(f'Field {field_name}: "page" must be between 0 and {page_count - 1}')
+        if config.get('align', 'left') not in ('left', 'right'):
+            raise ValueError(f'Field {field_name}: "align" must be "left" or "right"')
+        for key in ('width', 'line_height', 'font_size'):
+            if key in config and not (_number(config[key]) and config[key] > 0):
+                raise ValueError(f'Field {field_name}: "{key}" must be a positive number')
+        kind = 'checkbox' if config.get('checkbox') else 'text'
+        max_length = config.get('max_length')
+        # Admission relies on it to bound the rendering cost; multiline fields
+        # are bounded by their width instead (see field_schema.multiline_capacity)
+        if (kind == 'text' and not config.get('multiline')
+                and (not isinstance(max_length, int) or max_length < 1)):
+            raise ValueError(f'Field {field_name}: single-line text fields need a positive "max_length"')
+        compiled = dict(config)
+        if kind in default_sizes:
+            compiled.setdefault('font_size', default_sizes[kind])
+        compiled_fields[field_name] = compiled
+
+    groups = definition.get('checkbox_groups') or {}
+    if not isinstance(groups, dict):
+        raise ValueError('"checkbox_groups" must map group names to groups')
+    for group_name, group in groups.items():
+        members = group.get('fields') if isinstance(group, dict) else None
+        if not isinstance(members, list) or not all(
+                isinstance(member, str) and compiled_fields.get(member, {}).get('checkbox')
+                for member in members):
+            raise ValueError(f'Checkbox group {group_name}: "fields" must list checkbox fields')
+        group.setdefault('exclusive', False)
+
+    signatures = definition.get('signatures') or []
+    if not isinstance(signatures, list):
+        raise ValueError('"signatures" must be a list of signature boxes')
+    for index, box in enumerate(signatures):
+        if not isinstance(box, dict) or not all(_number(box.get(key)) for key in SIGNATURE_KEYS):
+            raise ValueError(f'Signature {index + 1}: needs numeric {", ".join(SIGNATURE_KEYS)}')
+        if not isinstance(box['page'], int) or not 0 <= box['page'] < page_count:
+            raise ValueError(f'Signature {index + 1}: "page" must be between 0 and {page_count - 1}')
+
+    return FormTemplate(template_id, pdf_path, compiled_fields, groups, signatures, page_count,
+                        page_size, definition.get('name'), source)
+
+
+def _file_signature(path):
+    """(mtime_ns, size) of a file, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class TemplateRegistry:
+    """The built-in form plus the forms defined in a directory, kept current"""
+
+    def __init__(self, directory=REGISTRY_DIR, builtin=BUILTIN_FORM):
+        self.directory = directory
+        self.builtin = builtin
+        self._templates = {builtin.template_id: builtin}
+        # Definition path -> ((definition, PDF signatures), template)
+        self._compiled = {}
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+        self.reloads = 0
+        self.errors = {}  # Definition path -> last compile error
+
+    def get(self, template_id):
+        """The current FormTemplate of an ID, or None"""
+        return self._templates.get(template_id)
+
+    def templates(self):
+        """All current templates, the built-in one first"""
+        return list(self._templates.values())
+
+    def _definition_paths(self):
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return []  # No directory - only the built-in form
+        return [os.path.join(self.directory, name) for name in names
+                if name.endswith(DEFINITION_EXTENSIONS) and not name.startswith('.')]
+
+    def refresh(self):
+        """
+        Recompile added and changed definitions and swap in the new set.
+
+        Returns:
+            list of template IDs compiled in this pass
+        """
+        with self._refresh_lock:
+            compiled = {}
+            changed = []
+            for path in self._definition_paths():
+                previous = self._compiled.get(path)
+                pdf_path = previous[1].pdf_path if previous else None
+                signature = (_file_signature(path), pdf_path and _file_signature(pdf_path))
+                if previous is not None and previous[0] == signature:
+                    compiled[path] = previous
+                    continue
+
+                template_id = os.path.splitext(os.path.basename(path))[0]
+                try:
+                    template = compile_definition(template_id, load_definition(path),
+                                                  os.path.dirname(path), source=path)
+                except Exception as e:
+                    # Any broken definition (YAML syntax included) only affects
+                    # itself: keep serving its last good version, if there is one
+                    message = str(e) if isinstance(e, ValueError) else f'{type(e).__name__}: {e}'
+                    if self.errors.get(path) != message:
+                        print(f"Template {path}: {message}")
+                    self.errors[path] = message
+                    if previous is not None:
+                        compiled[path] = previous
+                    continue
+                self.errors.pop(path, None)
+                self._warm(template)
+                signature = (signature[0], _file_signature(template.pdf_path))
+                compiled[path] = (signature, template)
+                changed.append(template_id)
+
+            templates = {self.builtin.template_id: self.builtin}
+            for path, (_, template) in compiled.items():
+                if template.template_id in templates:
+                    continue  # Same ID in .json and .yaml - the first one wins
+                templates[template.template_id] = template
+            removed = len(self._compiled) - len(compiled)
+            self.errors = {path: message for path, message in self.errors.items()
+                           if os.path.exists(path)}
+
+            # One assignment: requests see the old set or the new one
+            self._compiled = compiled
+            self._templates = templates
+            if changed or removed:
+                self.reloads += 1
+            return changed
+
+    def _warm(self, template):
+        """Compile a template's PDF now if fills have already loaded the PDF stack"""
+        merge_plan = sys.modules.get('backend.merge_plan')
+        if merge_plan is None:
+            return
+        try:
+            merge_plan.compiled_templates.get(template.pdf_path)
+        except Exception as e:
+            print(f"Template {template.template_id}: could not compile {template.pdf_path}: {e}")
+
+    def warm_up(self):
+        """Compile every template's PDF (call after loading the PDF stack)"""
+        for template in self.templates():
+            self._warm(template)
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """Refresh every interval seconds in a daemon thread (0 disables reloading)"""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Template registry refresh failed: {e}")
+
+        self._watcher = threading.Thread(target=run, name='template-registry', daemon=True)
+        self._watcher.start()
+
+    def stats(self):
+        """Return registry statistics"""
+        return {'templates': len(self._templates), 'reloads': self.reloads,
+                'errors': len(self.errors)}
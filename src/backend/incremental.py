@@ -0,0 +1,242 @@
+"""
+Incremental PDF updates - append changed objects after an unmodified base file
+
+Cloning a template into a PdfWriter re-serializes every object on each request.
+When a fill only touches a few objects, appending them as an incremental update
+(PDF 32000-1, 7.5.6) is far cheaper and never mutates the cached reader.
+
+DocumentWriter uses the same object model to write a new document instead,
+importing only the objects it needs (e.g. a few pages of a template).
+"""
+from io import BytesIO
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject,
+    NumberObject, StreamObject,
+)
+
+
+class IncrementalWriter:
+    """Collects new and replaced objects and writes them as an update section"""
+
+    def __init__(self, base_bytes, reader):
+        """
+        Args:
+            base_bytes: The original PDF file contents
+            reader: A PdfReader over base_bytes (its objects are never modified)
+        """
+        self.base_bytes = base_bytes
+        self.reader = reader
+        self._next_num = int(reader.trailer["/Size"])
+        self._objects = {}
+        self._imported = {}
+        tail = base_bytes[-1024:]
+        self._prev_xref = int(tail[tail.rfind(b"startxref") + 9:].split()[0])
+
+    def add_object(self, obj):
+        """Add a new object and return a reference to it"""
+        ref = IndirectObject(self._next_num, 0, self.reader)
+        self._next_num += 1
+        self._objects[ref.idnum] = (0, obj)
+        return ref
+
+    def update_object(self, ref, obj):
+        """Replace an existing object of the base file"""
+        self._objects[ref.idnum] = (ref.generation, obj)
+
+    def add_stream(self, data, **entries):
+        """Add a stream object with the given (unencoded) data"""
+        stream = StreamObject()
+        stream.update({NameObject(key): value for key, value in entries.items()})
+        stream.set_data(data)
+        return self.add_object(stream)
+
+    def import_as(self, source_ref, ref):
+        """Make references to source_ref (in another document) import as ref"""
+        self._imported[(id(source_ref.pdf), source_ref.idnum, source_ref.generation)] = ref
+
+    def import_object(self, obj):
+        """Copy an object graph from another document, renumbering indirect objects"""
+        if isinstance(obj, IndirectObject):
+            key = (id(obj.pdf), obj.idnum, obj.generation)
+            if key not in self._imported:
+                ref = IndirectObject(self._next_num, 0, self.reader)
+                self._next_num += 1
+                self._imported[key] = ref
+                self._objects[ref.idnum] = (0, self.import_object(obj.get_object()))
+            return self._imported[key]
+        if obj is None:
+            return NullObject()  # Reference to an object the source doesn't define
+        if isinstance(obj, StreamObject):
+            copy = obj.__class__()
+            copy._data = obj._data  # Keep the encoded bytes, no re-compression
+            copy.update({key: self.import_object(value) for key, value in obj.items()})
+            return copy
+        if isinstance(obj, DictionaryObject):
+            return DictionaryObject(
+                {key: self.import_object(value) for key, value in obj.items()}
+            )
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self.import_object(value) for value in obj)
+        return obj
+
+    def write(self, stream):
+        """Write the base file followed by the update section"""
+        stream.write(self.base_bytes)
+        if not self.base_bytes.endswith(b"\n"):
+            stream.write(b"\n")
+
+        offsets = {}
+        for num in sorted(self._objects):
+            generation, obj = self._objects[num]
+            offsets[num] = (stream.tell(), generation)
+            stream.write(b"%d %d obj\n" % (num, generation))
+            obj.write_to_stream(stream)
+            stream.write(b"\nendobj\n")
+
+        xref_offset = stream.tell()
+        stream.write(b"xref\n")
+        nums = sorted(offsets)
+        start = 0
+        while start < len(nums):
+            end = start
+            while end + 1 < len(nums) and nums[end + 1] == nums[end] + 1:
+                end += 1
+            stream.write(b"%d %d\n" % (nums[start], end - start + 1))
+            for num in nums[start:end + 1]:
+                offset, generation = offsets[num]
+                stream.write(b"%010d %05d n\r\n" % (offset, generation))
+            start = end + 1
+
+        trailer = DictionaryObject({
+            NameObject("/Size"): NumberObject(self._next_num),
+            NameObject("/Prev"): NumberObject(self._prev_xref),
+        })
+        for key in ("/Root", "/Info", "/ID"):
+            if key in self.reader.trailer:
+                trailer[NameObject(key)] = self.reader.trailer.raw_get(key)
+        stream.write(b"trailer\n")
+        trailer.write_to_stream(stream)
+        stream.write(b"\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
+
+    def getvalue(self):
+        """Return the updated document as bytes"""
+        output = BytesIO()
+        self.write(output)
+        return output.getvalue()
+
+
+class DocumentWriter(IncrementalWriter):
+    """Writes a new document made of added and imported objects"""
+
+    def __init__(self):
+        self.base_bytes = b""
+        self.reader = None
+        self._next_num = 1
+        self._objects = {}
+        self._imported = {}
+
+    def write(self, stream, root, info=None):
+        """
+        Write the document.
+
+        Args:
+            stream: Binary file object to write to
+            root: Reference to the document catalog
+            info: Reference to the document information dictionary, if any
+        """
+        stream.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = {}
+        for num in sorted(self._objects):
+            offsets[num] = stream.tell()
+            stream.write(b"%d 0 obj\n" % num)
+            self._objects[num][1].write_to_stream(stream)
+            stream.write(b"\nendobj\n")
+
+        xref_offset = stream.tell()
+        stream.write(b"xref\n0 %d\n0000000000 65535 f\r\n" % self._next_num)
+        for num in range(1, self._next_num):
+            if num in offsets:
+                stream.write(b"%010d 00000 n\r\n" % offsets[num])
+            else:
+                stream.write(b"0000000000 00000 f\r\n")
+
+        trailer = DictionaryObject({
+            NameObject("/Size"): NumberObject(self._next_num),
+            NameObject("/Root"): root,
+        })
+        if info is not None:
+            trailer[NameObject("/Info")] = info
+        stream.write(b"trailer\n")
+        trailer.write_to_stream(stream)
+        stream.write(b"\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
+
+    def getvalue(self, root, info=None):
+        """Return the document as bytes"""
+        output = BytesIO()
+        self.write(output, root, info)
+        return output.getvalue()
+
+
+def page_as_form_xobject(writer, page):
+    """Import a page from another document as a form XObject (for stamping)"""
+    contents = page["/Contents"] if "/Contents" in page else None
+    xobject = StreamObject()
+    if isinstance(contents, StreamObject):
+        # Single content stream - reuse its encoded bytes as they are
+        xobject._data = contents._data
+        if "/Filter" in contents:
+            xobject[NameObject("/Filter")] = writer.import_object(contents.raw_get("/Filter"))
+        if "/DecodeParms" in contents:
+            xobject[NameObject("/DecodeParms")] = writer.import_object(contents.raw_get("/DecodeParms"))
+    elif contents is not None:
+        xobject.set_data(page.get_contents().get_data())
+    xobject.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): ArrayObject(page.mediabox),
+        NameObject("/Resources"): writer.import_object(page.raw_get("/Resources")),
+    })
+    return writer.add_object(xobject)
+
+
+def stamp_page(writer, page, stamps, annots=None):
+    """
+    Replace a base page so it also paints the given form XObjects on top.
+
+    Args:
+        writer: The IncrementalWriter
+        page: The base document's PageObject (left unmodified)
+        stamps: list of (resource_name, xobject_ref, (tx, ty)) to paint
+        annots: Replacement /Annots array, or None to keep the page's own
+    """
+    new_page = DictionaryObject(page)
+    if annots is not None:
+        if annots:
+            new_page[NameObject("/Annots")] = annots
+        else:
+            new_page.pop("/Annots", None)
+    if not stamps:
+        writer.update_object(page.indirect_reference, new_page)
+        return new_page
+
+    resources = DictionaryObject(page["/Resources"]) if "/Resources" in page else DictionaryObject()
+    xobjects = DictionaryObject(resources["/XObject"]) if "/XObject" in resources else DictionaryObject()
+    invocations = []
+    for resource_name, xobject_ref, (tx, ty) in stamps:
+        xobjects[NameObject(resource_name)] = xobject_ref
+        invocations.append(f"q 1 0 0 1 {tx} {ty} cm {resource_name} Do Q")
+    resources[NameObject("/XObject")] = xobjects
+    new_page[NameObject("/Resources")] = resources
+
+    # Isolate the original content's graphics state from the stamps
+    contents = page.raw_get("/Contents") if "/Contents" in page else ArrayObject()
+    if isinstance(contents.get_object(), ArrayObject):
+        contents = contents.get_object()
+    else:
+        contents = ArrayObject([contents])
+    new_page[NameObject("/Contents")] = ArrayObject(
+        [writer.add_stream(b"q")] + list(contents) +
+        [writer.add_stream(("Q\n" + "\n".join(invocations)).encode("latin-1"))]
+    )
+    writer.update_object(page.indirect_reference, new_page)
+    return new_page
@@ -0,0 +1,201 @@
+"""
+Precompiled merge plan - stamp overlays onto template pages without PageObject.merge_page
+
+merge_page reconciles the overlay's resources against the template page on every
+call, rewrites the content streams and forces the whole template to be written
+out again. Instead, each template page is compiled once at load time:
+
+- the constant `q` / `Q q /FFOverlay Do Q` content streams are appended to the
+  template as an incremental update, and the page's content array is laid out
+  around them
+- a resource name for the overlay XObject is chosen that cannot clash with the
+  page's own resources
+
+A fill then imports the overlay page as a single form XObject and replaces each
+page dictionary with a copy that points at it, appended as another incremental
+update. The template bytes are written out unchanged.
+
+A fill of only some pages is written as a new document instead, holding just
+those pages and the template objects they use.
+"""
+from io import BytesIO
+import os
+import threading
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject, NumberObject,
+)
+from .incremental import DocumentWriter, IncrementalWriter, page_as_form_xobject
+from .metrics import stage
+
+OVERLAY_XOBJECT_NAME = "/FFOverlay"
+
+
+class PageMergePlan:
+    """What a template page looks like once an overlay XObject is painted on it"""
+
+    __slots__ = ("page_ref", "page", "resources", "xobjects", "xobject_name")
+
+    def __init__(self, page_ref, page, resources, xobjects, xobject_name):
+        self.page_ref = page_ref
+        self.page = page
+        self.resources = resources
+        self.xobjects = xobjects
+        self.xobject_name = xobject_name
+
+
+class CompiledTemplate:
+    """A template PDF with a merge plan for every page"""
+
+    def __init__(self, template_bytes):
+        """Compile merge plans for all pages of a template"""
+        base_reader = PdfReader(BytesIO(template_bytes))
+
+        # Pick an overlay name per page that the page doesn't already use
+        names = []
+        for page in base_reader.pages:
+            resources = page["/Resources"] if "/Resources" in page else {}
+            existing = resources["/XObject"] if "/XObject" in resources else {}
+            name, suffix = OVERLAY_XOBJECT_NAME, 0
+            while name in existing:
+                suffix += 1
+                name = f"{OVERLAY_XOBJECT_NAME}{suffix}"
+            names.append(name)
+
+        # The wrapping streams never change, so they become part of the base file
+        prepared = IncrementalWriter(template_bytes, base_reader)
+        push_ref = prepared.add_stream(b"q")
+        paint_refs = {
+            name: prepared.add_stream(f"Q\nq {name} Do Q".encode("latin-1"))
+            for name in set(names)
+        }
+        self.template_bytes = prepared.getvalue()
+        self.reader = PdfReader(BytesIO(self.template_bytes))
+        # Resolve the new streams through the reader of the prepared file
+        push_ref = IndirectObject(push_ref.idnum, 0, self.reader)
+        paint_refs = {name: IndirectObject(ref.idnum, 0, self.reader) for name, ref in paint_refs.items()}
+
+        self.plans = []
+        for page, name in zip(self.reader.pages, names):
+            contents = page.raw_get("/Contents") if "/Contents" in page else ArrayObject()
+            if isinstance(contents.get_object(), ArrayObject):
+                contents = list(contents.get_object())
+            else:
+                contents = [contents]
+
+            planned_page = DictionaryObject(page)
+            planned_page[NameObject("/Contents")] = ArrayObject(
+                [push_ref] + contents + [paint_refs[name]]
+            )
+            resources = DictionaryObject(page["/Resources"]) if "/Resources" in page else DictionaryObject()
+            xobjects = DictionaryObject(resources["/XObject"]) if "/XObject" in resources else DictionaryObject()
+            self.plans.append(PageMergePlan(
+                page.indirect_reference, planned_page, resources, xobjects, name
+            ))
+
+    def merge(self, overlay_reader, output, pages=None):
+        """
+        Write the template with overlay pages painted on top to `output`.
+
+        Overlay page N is painted on template page N; template pages without
+        a matching overlay page are left untouched. With `pages` (template
+        page indices), only those pages are written and overlay page N is
+        painted on pages[N].
+        """
+        if pages is not None:
+            return self._merge_subset(overlay_reader, output, pages)
+
+        with stage('merge'):
+            writer = IncrementalWriter(self.template_bytes, self.reader)
+            for plan, overlay_page in zip(self.plans, overlay_reader.pages):
+                overlay_ref = page_as_form_xobject(writer, overlay_page)
+                writer.update_object(plan.page_ref, self._planned_page(plan, overlay_ref))
+        with stage('write'):
+            writer.write(output)
+
+    def _merge_subset(self, overlay_reader, output, pages):
+        """Write a new document of the selected template pages with overlays"""
+        with stage('merge'):
+            writer = DocumentWriter()
+            pages_ref = writer.add_object(NullObject())
+            page_refs = [writer.add_object(NullObject()) for _ in pages]
+            for page_num, page_ref in zip(pages, page_refs):
+                # Back references (/Parent, an annotation's /P) land on the new pages
+                writer.import_as(self.plans[page_num].page_ref, page_ref)
+                writer.import_as(self.reader.pages[page_num].raw_get("/Parent"), pages_ref)
+
+            overlay_count = len(overlay_reader.pages)
+            for overlay_num, (page_num, page_ref) in enumerate(zip(pages, page_refs)):
+                if overlay_num >= overlay_count:
+                    # No overlay page: the template page as it is
+                    page = writer.import_object(DictionaryObject(self.reader.pages[page_num]))
+                    writer.update_object(page_ref, page)
+                    continue
+                plan = self.plans[page_num]
+                page = writer.import_object(self._planned_page(plan, NullObject()))
+                page[NameObject("/Resources")][NameObject("/XObject")][NameObject(plan.xobject_name)] = \
+                    page_as_form_xobject(writer, overlay_reader.pages[overlay_num])
+                writer.update_object(page_ref, page)
+
+            writer.update_object(pages_ref, DictionaryObject({
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): ArrayObject(page_refs),
+                NameObject("/Count"): NumberObject(len(page_refs)),
+            }))
+            root = writer.add_object(DictionaryObject({
+                NameObject("/Type"): NameObject("/Catalog"),
+                NameObject("/Pages"): pages_ref,
+            }))
+            info = None
+            if "/Info" in self.reader.trailer:
+                info = writer.import_object(self.reader.trailer.raw_get("/Info"))
+        with stage('write'):
+            writer.write(output, root, info)
+
+    @staticmethod
+    def _planned_page(plan, overlay_ref):
+        """The plan's page dictionary, painting overlay_ref"""
+        xobjects = DictionaryObject(plan.xobjects)
+        xobjects[NameObject(plan.xobject_name)] = overlay_ref
+        resources = DictionaryObject(plan.resources)
+        resources[NameObject("/XObject")] = xobjects
+        page = DictionaryObject(plan.page)
+        page[NameObject("/Resources")] = resources
+        return page
+
+
+class CompiledTemplateCache:
+    """Compiles each template file once, recompiling when the file changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template_path):
+        """Return the compiled template for a file path"""
+        stat = os.stat(template_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(template_path)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            entry = self._entries.get(template_path)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            with open(template_path, 'rb') as template_file:
+                compiled = CompiledTemplate(template_file.read())
+            self._entries[template_path] = (signature, compiled)
+            return compiled
+
+    def stats(self):
+        """Return cache statistics"""
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+compiled_templates = CompiledTemplateCache()
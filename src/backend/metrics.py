@@ -0,0 +1,290 @@
+"""
+Request metrics - per-stage timings, Server-Timing headers and a /metrics endpoint
+
+Pipeline code marks its stages with `stage()`:
+
+    with stage('overlay'):
+        overlay_pdf = self.create_overlay(form_data)
+
+Stages are only recorded while a request is being measured (see
+`start_request`), so the backend can be used from scripts at no cost. Each
+measured request contributes its stage durations to a Server-Timing header and
+to latency histograms.
+
+Gunicorn workers are separate processes, so every worker writes its totals to
+`<METRICS_DIR>/<pid>.json` and /metrics sums all the files. A worker writes at
+most once per FLUSH_INTERVAL; updates in between are written by a timer when
+the interval is up, so no request pays for more than one write a second.
+Without METRICS_DIR only the current process is reported. Counters and
+histograms are cumulative, so files left by restarted workers still add up
+correctly. Gauges describe a running process, so those of workers that have
+exited are left out. The directory is cleared when gunicorn starts
+(gunicorn.conf.py).
+"""
+import atexit
+from contextlib import contextmanager
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds (a +Inf bucket is always added)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 512 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+
+METRIC_PREFIX = 'formfiller'
+
+# Seconds between snapshot writes of a worker
+FLUSH_INTERVAL = 1.0
+
+_timings = contextvars.ContextVar('formfiller_timings', default=None)
+
+
+def start_request():
+    """Start recording stages for the current request; returns the timing list"""
+    timings = []
+    _timings.set(timings)
+    return timings
+
+
+def end_request():
+    """Stop recording stages for the current request"""
+    _timings.set(None)
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage if the current request is being measured"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((name, time.perf_counter() - start))
+
+
+def server_timing_header(timings):
+    """Format (stage, seconds) pairs as a Server-Timing header value"""
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings)
+
+
+class MetricsRegistry:
+    """Counters, histograms and gauges for one worker process"""
+
+    def __init__(self, metrics_dir=None):
+        self.metrics_dir = metrics_dir
+        self._counters = {}
+        self._histograms = {}
+        self._gauge_providers = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._flush_timer = None
+        if metrics_dir:
+            atexit.register(self.write_snapshot)  # Updates still waiting for the timer
+
+    def inc(self, name, labels=None, amount=1):
+        """Increment a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, labels=None):
+        """Record a value in a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {'buckets': list(buckets), 'counts': [0] * (len(buckets) + 1),
+                             'sum': 0.0, 'count': 0}
+                self._histograms[key] = histogram
+            index = len(buckets)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    index = i
+                    break
+            histogram['counts'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def register_gauges(self, name, provider):
+        """
+        Report the values returned by `provider()` as gauges.
+
+        Args:
+            name: Metric name prefix, e.g. 'compiled_templates'
+            provider: Callable returning a dict of numeric values (e.g. cache stats)
+        """
+        self._gauge_providers[name] = provider
+
+    def snapshot(self):
+        """Return this process's metrics as a JSON-serializable dict"""
+        with self._lock:
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, labels, dict(h, counts=list(h['counts']))]
+                          for (name, labels), h in self._histograms.items()]
+        gauges = []
+        for prefix, provider in self._gauge_providers.items():
+            for key, value in provider().items():
+                gauges.append([f'{prefix}_{key}', [], value])
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def flush(self):
+        """Write this worker's snapshot soon: now, or when FLUSH_INTERVAL is up"""
+        if not self.metrics_dir:
+            return
+        with self._flush_lock:
+            wait = self._last_flush + FLUSH_INTERVAL - time.monotonic()
+            if wait > 0:
+                # A timer inherited across a fork is not alive in the child
+                if self._flush_timer is None or not self._flush_timer.is_alive():
+                    self._flush_timer = threading.Timer(wait, self._deferred_flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+            self._last_flush = time.monotonic()
+        self.write_snapshot()
+
+    def _deferred_flush(self):
+        with self._flush_lock:
+            self._flush_timer = None
+            self._last_flush = time.monotonic()
+        self.write_snapshot()
+
+    def write_snapshot(self):
+        """Write this worker's snapshot to the metrics directory"""
+        if not self.metrics_dir:
+            return
+        path = os.path.join(self.metrics_dir, f'{os.getpid()}.json')
+        temp_path = f'{path}.tmp'
+        with self._write_lock:
+            with open(temp_path, 'w') as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            os.replace(temp_path, path)  # Readers never see a partial file
+
+    def collect(self):
+        """Return the metrics of all workers, summed"""
+        if not self.metrics_dir:
+            return _merge_snapshots([self.snapshot()])
+
+        # This worker's own totals are current in memory; its file may lag
+        own_path = os.path.join(self.metrics_dir, f'{os.getpid()}.json')
+        snapshots = [self.snapshot()]
+        for path in glob.glob(os.path.join(self.metrics_dir, '*.json')):
+            if path == own_path:
+                continue
+            try:
+                with open(path) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue  # Worker replaced it mid-read; skip this scrape
+            if not _worker_running(path):
+                snapshot['gauges'] = []  # Its caches are gone with it
+            snapshots.append(snapshot)
+        return _merge_snapshots(snapshots)
+
+    def render(self):
+        """Render all workers' metrics in the Prometheus text format"""
+        merged = self.collect()
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for name, labels, value in sorted(merged['counters'], key=_sort_key):
+            describe(f'{METRIC_PREFIX}_{name}', 'counter')
+            lines.append(f'{METRIC_PREFIX}_{name}{_format_labels(labels)} {_format_number(value)}')
+
+        for name, labels, histogram in sorted(merged['histograms'], key=_sort_key):
+            full_name = f'{METRIC_PREFIX}_{name}'
+            describe(full_name, 'histogram')
+            cumulative = 0
+            bounds = [_format_number(b) for b in histogram['buckets']] + ['+Inf']
+            for bound, count in zip(bounds, histogram['counts']):
+                cumulative += count
+                bucket_labels = _format_labels(labels + [['le', bound]])
+                lines.append(f'{full_name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{full_name}_sum{_format_labels(labels)} {_format_number(histogram["sum"])}')
+            lines.append(f'{full_name}_count{_format_labels(labels)} {histogram["count"]}')
+
+        for name, labels, value in sorted(merged['gauges'], key=_sort_key):
+            describe(f'{METRIC_PREFIX}_{name}', 'gauge')
+            lines.append(f'{METRIC_PREFIX}_{name}{_format_labels(labels)} {_format_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _worker_running(path):
+    """Whether the process that wrote a <pid>.json snapshot is still running"""
+    try:
+        os.kill(int(os.path.basename(path)[:-len('.json')]), 0)
+    except ValueError:
+        return True  # Not named by a pid; keep it
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, but belongs to another user
+    return True
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _merge_snapshots(snapshots):
+    """Sum counters, histograms and gauges with the same name and labels"""
+    counters, histograms, gauges = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = dict(histogram, counts=list(histogram['counts']))
+            elif merged['buckets'] == histogram['buckets']:
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], histogram['counts'])]
+                merged['sum'] += histogram['sum']
+                merged['count'] += histogram['count']
+
+    def as_list(entries):
+        return [[name, [list(label) for label in labels], value]
+                for (name, labels), value in entries.items()]
+    return {'counters': as_list(counters), 'histograms': as_list(histograms),
+            'gauges': as_list(gauges)}
+
+
+def _sort_key(entry):
+    return (entry[0], [tuple(label) for label in entry[1]])
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+metrics = MetricsRegistry(os.environ.get('METRICS_DIR') or None)
@@ -3,6 +3,8 @@ PDF Form Filler using coordinate-based overlay with RTL support
 """
 from io import BytesIO
 import base64
+import itertools
+import time
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
@@ -12,58 +14,112 @@ from pypdf import PdfReader, PdfWriter
 import arabic_reshaper
 from bidi.algorithm import get_display
 import os
-from .field_mapping import FORM_FIELDS, HEBREW_FONT_SIZE, CHECKBOX_SIZE
-
-# Signature field configurations - dual placement on page 4
-SIGNATURE_CONFIGS = [
-    {
-        "page": 3,      # Page 4 (0-indexed)
-        "x": 55,        # X position (left side)
-        "y": 420,       # Y position - social worker signature area
-        "width": 150,   # Max width
-        "height": 40,   # Max height
-    },
-    {
-        "page": 3,      # Page 4 (0-indexed)
-        "x": 55,        # X position (left side)
-        "y": 335,       # Y position - bottom signature area (near visit date)
-        "width": 150,   # Max width
-        "height": 40,   # Max height
-    },
-]
-
-# Register Hebrew font
+import re
+import threading
+from .field_mapping import HEBREW_FONT_SIZE, CHECKBOX_SIZE, MAX_MULTILINE_LINES
+from .upload_buffer import as_pdf_stream
+from .merge_plan import compiled_templates
+from .pdf_output import DEFAULT_OUTPUT_MODE, check_output_mode, check_pages, write_output
+from .metrics import stage
+from .profiling import field_timings
+from .font_metrics import string_width
+from .font_fallback import LineWidth, split_runs
+from .fonts import EMBEDDED_FONT_PATH, FALLBACK_FONT_PATHS, SYSTEM_FONT_PATH, font_files
+from .form_registry import BUILTIN_FORM
+
+# Hebrew font - registered on first use (or by warm_up), not at import time.
 # Try embedded font first (for deployment), then fall back to system font (for local dev)
 HEBREW_FONT_NAME = "NotoSansHebrew"
 FONT_REGISTERED = False
+_font_lock = threading.Lock()
+_fonts_ready = False
 
-# Get the project root directory (where fonts/ is located)
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-EMBEDDED_FONT_PATH = os.path.join(PROJECT_ROOT, "fonts", "NotoSansHebrew-Regular.ttf")
-SYSTEM_FONT_PATH = "/Library/Fonts/Arial Unicode.ttf"
-
-try:
-    if os.path.exists(EMBEDDED_FONT_PATH):
-        pdfmetrics.registerFont(TTFont(HEBREW_FONT_NAME, EMBEDDED_FONT_PATH))
-        FONT_REGISTERED = True
-        print(f"Using embedded Hebrew font: {EMBEDDED_FONT_PATH}")
-    elif os.path.exists(SYSTEM_FONT_PATH):
-        pdfmetrics.registerFont(TTFont(HEBREW_FONT_NAME, SYSTEM_FONT_PATH))
-        FONT_REGISTERED = True
-        print(f"Using system Hebrew font: {SYSTEM_FONT_PATH}")
-    else:
-        HEBREW_FONT_NAME = "Helvetica"
-        print(f"Warning: No Hebrew font found, using Helvetica")
-except Exception as e:
-    print(f"Error registering Hebrew font: {e}")
-    HEBREW_FONT_NAME = "Helvetica"
+# Registered fonts in fallback order - set by register_fonts()
+FONT_CHAIN = (HEBREW_FONT_NAME, "Helvetica")
+
+HEBREW_CHAR_RE = re.compile('[\u0590-\u05FF]')  # Hebrew Unicode range
+
+
+def register_fonts():
+    """Register the Hebrew and fallback fonts with reportlab once; returns the Hebrew font name"""
+    global HEBREW_FONT_NAME, FONT_REGISTERED, FONT_CHAIN, _fonts_ready
+    if _fonts_ready:
+        return HEBREW_FONT_NAME
+    with _font_lock:
+        if _fonts_ready:
+            return HEBREW_FONT_NAME
+        try:
+            if os.path.exists(EMBEDDED_FONT_PATH):
+                pdfmetrics.registerFont(TTFont(HEBREW_FONT_NAME, EMBEDDED_FONT_PATH))
+                FONT_REGISTERED = True
+                print(f"Using embedded Hebrew font: {EMBEDDED_FONT_PATH}")
+            elif os.path.exists(SYSTEM_FONT_PATH):
+                pdfmetrics.registerFont(TTFont(HEBREW_FONT_NAME, SYSTEM_FONT_PATH))
+                FONT_REGISTERED = True
+                print(f"Using system Hebrew font: {SYSTEM_FONT_PATH}")
+            else:
+                HEBREW_FONT_NAME = "Helvetica"
+                print(f"Warning: No Hebrew font found, using Helvetica")
+        except Exception as e:
+            print(f"Error registering Hebrew font: {e}")
+            HEBREW_FONT_NAME = "Helvetica"
+
+        chain = [HEBREW_FONT_NAME, "Helvetica"]
+        for font_name, path in font_files().items():
+            if font_name not in FALLBACK_FONT_PATHS:
+                continue
+            try:
+                pdfmetrics.registerFont(TTFont(font_name, path))
+                chain.append(font_name)
+                print(f"Using fallback font: {path}")
+            except Exception as e:
+                print(f"Error registering fallback font {font_name}: {e}")
+        FONT_CHAIN = tuple(dict.fromkeys(chain))
+        _fonts_ready = True
+    return HEBREW_FONT_NAME
+
+
+def font_chain(primary_font):
+    """Fonts to try for a value drawn in primary_font, in order (see font_fallback.py)"""
+    return (primary_font,) + tuple(font for font in FONT_CHAIN if font != primary_font)
+
+
+def warm_up(template_path):
+    """
+    Do the one-time work of the first fill ahead of traffic: register fonts,
+    compile the template and render a throwaway overlay so reportlab, pypdf and
+    the BiDi/reshaper tables are loaded.
+    """
+    filler = PDFFiller(template_path)
+    sample = {"employer_last_name": "כהן", "employer_id": "123456789"}
+    PdfReader(filler.create_overlay(sample))
 
 
 class PDFFiller:
-    def __init__(self, template_path):
-        """Initialize PDF filler with template"""
+    def __init__(self, template_path, form=None):
+        """
+        Initialize PDF filler with template (compiled once per process)
+
+        Args:
+            form: FormTemplate whose fields are drawn (see form_registry.py);
+                the built-in visit report by default
+        """
+        register_fonts()
+        self.form = form or BUILTIN_FORM
         self.template_path = template_path
-        self.reader = PdfReader(template_path)
+        self.compiled = compiled_templates.get(template_path)
+        self.reader = self.compiled.reader
+
+    @classmethod
+    def from_compiled(cls, compiled, form=None):
+        """Create a filler for an already compiled template"""
+        register_fonts()
+        filler = cls.__new__(cls)
+        filler.form = form or BUILTIN_FORM
+        filler.template_path = None
+        filler.compiled = compiled
+        filler.reader = compiled.reader
+        return filler
 
     def prepare_hebrew_text(self, text):
         """Prepare Hebrew text for proper RTL display"""
@@ -77,41 +133,35 @@ class PDFFiller:
 
     def _contains_hebrew(self, text):
         """Check if text contains Hebrew characters"""
-        for char in text:
-            if '\u0590' <= char <= '\u05FF':  # Hebrew Unicode range
-                return True
-        return False
-
-    def _flatten_form_data(self, form_data, parent_key=''):
-        """Flatten nested dictionaries in form data"""
-        items = {}
-        for key, value in form_data.items():
-            new_key = f"{parent_key}.{key}" if parent_key else key
-            if isinstance(value, dict):
-                # Recursively flatten nested dicts
-                items.update(self._flatten_form_data(value, new_key))
-            else:
-                items[new_key] = value
-        return items
-
-    def create_overlay(self, form_data):
-        """Create overlay PDF with form data"""
+        return HEBREW_CHAR_RE.search(text) is not None
+
+    def create_overlay(self, form_data, layout=None, pages=None):
+        """
+        Create overlay PDF with form data
+
+        Args:
+            form_data: Form values (see field_extraction.py)
+            layout: Optional {field_name: runs} precomputed by batch_layout for
+                this document; the fields are drawn from it instead of being
+                laid out one by one
+            pages: Optional list of template page indices; the overlay then has
+                one page per index, in order, and fields on other pages are
+                neither laid out nor drawn. By default overlay page N belongs
+                to template page N, up to the last page with a field.
+        """
         packet = BytesIO()
-        can = canvas.Canvas(packet, pagesize=A4)
+        can = canvas.Canvas(packet, pagesize=self.form.page_size or A4)
 
-        # Extract signature data before flattening (use get to not modify original)
         signature_data = form_data.get('signature_image', None)
 
-        # Flatten nested dictionaries first
-        flat_data = self._flatten_form_data(form_data)
+        # Look up the known fields; anything else in the payload is never visited
+        with stage('extract'):
+            field_values = self.form.extractor.extract(form_data)
 
         # Group fields by page
         pages_data = {}
-        for field_name, field_value in flat_data.items():
-            if field_name not in FORM_FIELDS:
-                continue
-
-            field_config = FORM_FIELDS[field_name]
+        for field_name, field_value in field_values.items():
+            field_config = self.form.fields[field_name]
             page_num = field_config["page"]
 
             if page_num not in pages_data:
@@ -121,46 +171,100 @@ class PDFFiller:
 
         # Determine the max page we need to draw on
         max_page = max(pages_data.keys()) if pages_data else 0
-        if signature_data:
-            max_page = max(max_page, max(cfg["page"] for cfg in SIGNATURE_CONFIGS))
+        signature_configs = self.form.signature_configs
+        if signature_data and signature_configs:
+            max_page = max(max_page, max(cfg["page"] for cfg in signature_configs))
 
-        # Draw on each page
-        for page_num in range(max_page + 1):
-            if page_num > 0:
-                can.showPage()
+        # Per-field timings are only collected while a request is being profiled
+        timings = field_timings()
 
-            # Draw form fields for this page
+        if layout is None:
+            layout_field = lambda field_name, field_value, field_config: \
+                self._layout_field(field_value, field_config)
+        else:
+            layout_field = lambda field_name, field_value, field_config: layout[field_name]
+
+        # Draw on each page
+        for page_num in (range(max_page + 1) if pages is None else pages):
+            # Lay out this page's fields, then draw them all at once
+            page_runs = []
             if page_num in pages_data:
                 for field_name, field_value, field_config in pages_data[page_num]:
-                    self._draw_field(can, field_name, field_value, field_config)
+                    if timings is None:
+                        page_runs.extend(layout_field(field_name, field_value, field_config))
+                        continue
+                    start = time.perf_counter()
+                    page_runs.extend(layout_field(field_name, field_value, field_config))
+                    timings.append((field_name, time.perf_counter() - start, len(str(field_value))))
+            self._draw_runs(can, page_runs)
 
             # Draw signatures at all designated locations on this page
             if signature_data:
-                for sig_config in SIGNATURE_CONFIGS:
+                for sig_config in signature_configs:
                     if page_num == sig_config["page"]:
+                        start = time.perf_counter()
                         self._draw_signature(can, signature_data, sig_config)
+                        if timings is not None:
+                            timings.append(('signature_image', time.perf_counter() - start,
+                                            len(signature_data)))
+
+            # Emit the page even if nothing was drawn on it: save() drops an
+            # empty last page, which would leave a requested page without one
+            can.showPage()
 
         can.save()
         packet.seek(0)
         return packet
 
-    def _draw_field(self, can, field_name, field_value, field_config):
-        """Draw a single field on the canvas with proper alignment"""
+    def _draw_runs(self, can, runs):
+        """
+        Draw text runs laid out by _layout_field (or batch_layout).
+
+        All runs go into one text object (a single BT/ET block), grouped by font
+        and size so each font is selected once - e.g. every checkbox "X" on the
+        page is drawn after a single Helvetica selection. Each run is placed
+        with an absolute text matrix, exactly where drawString would put it.
+        """
+        if not runs:
+            return
+        by_font = {}
+        for font_name, font_size, x, y, text in runs:
+            by_font.setdefault((font_name, font_size), []).append((x, y, text))
+
+        text_object = can.beginText()
+        for (font_name, font_size), placements in by_font.items():
+            text_object.setFont(font_name, font_size)
+            for x, y, text in placements:
+                # textLine, unlike textOut, doesn't measure the text to advance the cursor
+                text_object.setTextOrigin(x, y)
+                text_object.textLine(text)
+        can.drawText(text_object)
+
+    def _layout_field(self, field_value, field_config):
+        """
+        Lay out a field value as positioned text runs.
+
+        Returns a list of (font_name, font_size, x, y, text) tuples, where x is
+        the left edge of the run (right alignment is already resolved).
+        """
         x = field_config["x"]
         y = field_config["y"]
-        align = field_config.get("align", "left")
 
         # Handle checkboxes
         if field_config.get("checkbox", False):
             if field_value in [True, "true", "yes", "כן", "1", 1]:
-                can.setFont("Helvetica", CHECKBOX_SIZE)
-                can.drawString(x, y, "X")
-            return
+                return [("Helvetica", field_config.get("font_size", CHECKBOX_SIZE), x, y, "X")]
+            return []
 
         # Handle text fields
         if not field_value:
-            return
+            return []
+
+        text, font_name = self._prepare_field_text(field_value)
+        return self._layout_text(text, font_name, field_config)
 
+    def _prepare_field_text(self, field_value):
+        """Return (text in visual order, font name) for a non-empty text value"""
         value_str = str(field_value)
 
         # Choose font based on content - Hebrew font doesn't support ASCII well
@@ -172,50 +276,68 @@ class PDFFiller:
             # ASCII text - use Helvetica which renders numbers correctly
             text = value_str
             font_name = "Helvetica"
+        return text, font_name
 
-        can.setFont(font_name, HEBREW_FONT_SIZE)
+    def _layout_text(self, text, font_name, field_config):
+        """Lay out prepared text as runs (see _layout_field)"""
+        x = field_config["x"]
+        y = field_config["y"]
+        align = field_config.get("align", "left")
+        font_size = field_config.get("font_size", HEBREW_FONT_SIZE)
 
         # Handle multiline text
         if field_config.get("multiline", False):
             max_width = field_config.get("width", 450)
-            lines = self._wrap_text(text, max_width, can, font_name)
-
-            # Draw each line
-            line_height = field_config.get("line_height", HEBREW_FONT_SIZE + 3)
-            current_y = y
-            for line in lines[:10]:  # Limit to 10 lines
-                if align == "right":
-                    can.drawRightString(x, current_y, line)
-                else:
-                    can.drawString(x, current_y, line)
-                current_y -= line_height
+            lines = self._wrap_text(text, max_width, font_name, font_size)
+            line_height = field_config.get("line_height", font_size + 3)
+            lines = lines[:MAX_MULTILINE_LINES]
         else:
             # Single line text
             max_length = field_config.get("max_length", 100)
             if len(text) > max_length:
                 text = text[:max_length]
-
-            # Draw with proper alignment
+            lines = [text]
+            line_height = 0
+
+        chain = font_chain(font_name)
+        runs = []
+        current_y = y
+        for line in lines:
+            # One run per font segment, each starting where the previous ends
+            segments = split_runs(line, chain)
+            widths = [string_width(segment, segment_font, font_size)
+                      for segment_font, segment in segments]
+            # Same arithmetic as canvas.drawRightString, so single-font lines are unchanged
             if align == "right":
-                can.drawRightString(x, y, text)
+                run_x = x - sum(widths)
             else:
-                can.drawString(x, y, text)
-
-    def _wrap_text(self, text, max_width, can, font_name):
+                run_x = x
+            for (segment_font, segment), width in zip(segments, widths):
+                runs.append((segment_font, font_size, run_x, current_y, segment))
+                run_x += width
+            current_y -= line_height
+        return runs
+
+    def _wrap_text(self, text, max_width, font_name, font_size=HEBREW_FONT_SIZE):
         """Simple text wrapping with proper font width calculation"""
         words = text.split()
         lines = []
         current_line = []
 
+        # Measure with the actual fonts, extending the line's width word by
+        # word instead of re-measuring the joined line for every word
+        empty_line = LineWidth(font_chain(font_name), font_size)
+        line_width = empty_line
         for word in words:
-            test_line = ' '.join(current_line + [word])
-            # Use actual font for width calculation
-            if can.stringWidth(test_line, font_name, HEBREW_FONT_SIZE) <= max_width:
+            test_width = line_width.extended(' ' + word) if current_line else empty_line.extended(word)
+            if test_width.width() <= max_width:
                 current_line.append(word)
+                line_width = test_width
             else:
                 if current_line:
                     lines.append(' '.join(current_line))
                 current_line = [word]
+                line_width = empty_line.extended(word)
 
         if current_line:
             lines.append(' '.join(current_line))
@@ -228,13 +350,17 @@ class PDFFiller:
             return
 
         try:
-            # Remove data URL prefix if present
-            if signature_data.startswith('data:image'):
-                # Extract base64 data after the comma
-                signature_data = signature_data.split(',', 1)[1]
+            if isinstance(signature_data, bytes):
+                # Sent as a binary multipart part; nothing to decode
+                image_bytes = signature_data
+            else:
+                # Remove data URL prefix if present
+                if signature_data.startswith('data:image'):
+                    # Extract base64 data after the comma
+                    signature_data = signature_data.split(',', 1)[1]
 
-            # Decode base64 to bytes
-            image_bytes = base64.b64decode(signature_data)
+                # Decode base64 to bytes
+                image_bytes = base64.b64decode(signature_data)
             image_io = BytesIO(image_bytes)
 
             # Create ImageReader from bytes
@@ -263,59 +389,123 @@ class PDFFiller:
         except Exception as e:
             print(f"Error drawing signature: {e}")
 
-    def fill_form(self, form_data, output_path=None):
-        """Fill the form with provided data"""
+    def fill_form(self, form_data, output_path=None, layout=None, output_mode=DEFAULT_OUTPUT_MODE,
+                  pages=None, overlay_only=False):
+        """
+        Fill the form with provided data.
+
+        Args:
+            layout: See create_overlay
+            output_mode: "fast" or "small" (see pdf_output.py)
+            pages: Optional list of template page indices to return, in order;
+                by default all pages are returned
+            overlay_only: Return only the field layer, one page per returned
+                template page, to be stamped onto the template by the client.
+                Nothing is merged.
+        """
+        check_output_mode(output_mode)
+        page_count = len(self.reader.pages)
+        if pages is not None:
+            check_pages(pages, page_count)
+        elif overlay_only:
+            pages = list(range(page_count))  # Stampable page for page
+
         # Create overlay
-        overlay_pdf = self.create_overlay(form_data)
-        overlay_reader = PdfReader(overlay_pdf)
+        with stage('overlay'):
+            overlay_pdf = self.create_overlay(form_data, layout, pages)
+
+        if overlay_only:
+            write = lambda output_file: output_file.write(overlay_pdf.getvalue())
+            return write_output(write, output_path, output_mode)
 
+        with stage('overlay_read'):
+            overlay_reader = PdfReader(overlay_pdf)
+
+        if self.compiled is not None:
+            # Precompiled merge plan - the template is appended to, not rewritten
+            write = lambda output_file: self.compiled.merge(overlay_reader, output_file, pages)
+        else:
+            with stage('merge'):
+                writer = self._merge_pages(overlay_reader, pages)
+
+            def write(output_file):
+                with stage('write'):
+                    writer.write(output_file)
+
+        return write_output(write, output_path, output_mode)
+
+    def fill_forms(self, form_data_list):
+        """
+        Fill the form once per payload, laying out each chunk of payloads in one
+        batch pass (see batch_layout.py).
+
+        Yields:
+            Filled PDF bytes, in the order of form_data_list
+        """
+        from .batch_layout import BATCH_SIZE, layout_documents
+
+        form_data_iter = iter(form_data_list)
+        while True:
+            chunk = list(itertools.islice(form_data_iter, BATCH_SIZE))
+            if not chunk:
+                return
+            for form_data, layout in zip(chunk, layout_documents(self, chunk)):
+                yield self.fill_form(form_data, layout=layout)
+
+    def _merge_pages(self, overlay_reader, pages=None):
+        """Merge overlay pages into the template pages with PageObject.merge_page"""
         # Create output PDF
         writer = PdfWriter()
 
-        # Merge overlay with template
-        for page_num in range(len(self.reader.pages)):
+        # Merge overlay with template (overlay page N belongs to pages[N])
+        if pages is None:
+            pages = range(len(self.reader.pages))
+        for overlay_num, page_num in enumerate(pages):
             template_page = self.reader.pages[page_num]
 
             # If we have an overlay for this page, merge it
-            if page_num < len(overlay_reader.pages):
-                overlay_page = overlay_reader.pages[page_num]
+            if overlay_num < len(overlay_reader.pages):
+                overlay_page = overlay_reader.pages[overlay_num]
                 template_page.merge_page(overlay_page)
 
             writer.add_page(template_page)
 
-        # Write to output
-        if output_path:
-            with open(output_path, 'wb') as output_file:
-                writer.write(output_file)
-            return output_path
-        else:
-            # Return as bytes
-            output = BytesIO()
-            writer.write(output)
-            output.seek(0)
-            return output.read()
+        return writer
 
     def get_field_list(self):
         """Return list of all available fields"""
-        return list(FORM_FIELDS.keys())
+        return list(self.form.fields.keys())
 
 
-def fill_pdf_form(template_path, form_data, output_path=None):
+def fill_pdf_form(template_path, form_data, output_path=None, output_mode=DEFAULT_OUTPUT_MODE,
+                  pages=None, overlay_only=False, form=None):
     """Convenience function to fill PDF form from a template file path"""
-    filler = PDFFiller(template_path)
-    return filler.fill_form(form_data, output_path)
+    filler = PDFFiller(template_path, form)
+    return filler.fill_form(form_data, output_path, output_mode=output_mode,
+                            pages=pages, overlay_only=overlay_only)
+
+
+def fill_pdf_forms(template_path, form_data_list, form=None):
+    """Fill the template once per payload (bulk runs); yields PDF bytes"""
+    filler = PDFFiller(template_path, form)
+    return filler.fill_forms(form_data_list)
 
 
-def fill_pdf_from_bytes(pdf_bytes, form_data, output_path=None):
-    """Fill a PDF form from bytes (for uploaded files)"""
-    filler = PDFFillerFromBytes(pdf_bytes)
-    return filler.fill_form(form_data, output_path)
+def fill_pdf_from_bytes(pdf_bytes, form_data, output_path=None, output_mode=DEFAULT_OUTPUT_MODE,
+                        pages=None, form=None):
+    """Fill a PDF form from bytes or a read-only buffer (for uploaded files)"""
+    filler = PDFFillerFromBytes(pdf_bytes, form)
+    return filler.fill_form(form_data, output_path, output_mode=output_mode, pages=pages)
 
 
 class PDFFillerFromBytes(PDFFiller):
-    """PDF Filler that accepts PDF bytes instead of a file path"""
+    """PDF Filler that accepts PDF bytes (or an mmap'd upload) instead of a file path"""
 
-    def __init__(self, pdf_bytes):
-        """Initialize PDF filler with PDF bytes"""
+    def __init__(self, pdf_bytes, form=None):
+        """Initialize PDF filler with PDF bytes or a read-only buffer"""
+        # Uploads are used once, so they take the plain merge_page path
+        register_fonts()
+        self.form = form or BUILTIN_FORM
         self.pdf_bytes = pdf_bytes
-        self.reader = PdfReader(BytesIO(pdf_bytes))
+        self.compiled = None
+        self.reader = PdfReader(as_pdf_stream(pdf_bytes))
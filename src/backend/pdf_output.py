@@ -0,0 +1,321 @@
+"""
+Output modes - trade generation time for file size
+
+Fills are written in one of OUTPUT_MODES:
+
+- "fast" (the default): the template is appended to as an incremental update
+  (see merge_plan.py), so the cost is the overlay alone. The template's own
+  objects, and any it no longer uses, are written out unchanged.
+- "small": the filled document is rewritten by compact_pdf() as PDF 1.5 with
+  - unused page and form XObject resources dropped, along with every object
+    that is no longer reachable from the catalog (superseded incremental
+    revisions, the template's orphans)
+  - identical objects merged (pypdf's compress_identical_objects)
+  - every stream Flate-compressed at the highest level, where that is smaller
+  - all other objects packed into compressed object streams, indexed by a
+    compressed cross-reference stream instead of a plain xref table
+
+Both modes render identically; "small" costs a full parse and rewrite.
+
+Independently of the mode, a fill can return only some of the template's pages
+(parse_pages() reads the "4" or "1,3-4" page lists the API accepts), or only
+the overlay with the field values, for clients that keep the template locally.
+"""
+from functools import lru_cache
+from io import BytesIO
+import re
+import zlib
+from .metrics import stage
+
+# pypdf is imported by the functions that use it, so the app can validate an
+# output mode without loading the PDF stack
+
+OUTPUT_MODES = ('fast', 'small')
+DEFAULT_OUTPUT_MODE = 'fast'
+
+# Objects per object stream; larger streams compress better but must be
+# inflated whole to reach any object in them
+OBJECT_STREAM_SIZE = 200
+
+# Recompressing the template's fonts and images dominates compaction, and they
+# are the same in every fill, so mid-sized streams are cached. Small ones are
+# cheap anyway; the upper bound keeps uploads from pinning much memory.
+RECOMPRESS_CACHE_SIZE = 32
+RECOMPRESS_CACHE_RANGE = (4 * 1024, 256 * 1024)
+
+# Resource categories that content streams refer to by name
+NAMED_RESOURCES = ('/ExtGState', '/ColorSpace', '/Pattern', '/Shading', '/XObject', '/Font', '/Properties')
+
+NAME_TOKEN_RE = re.compile(rb'/([^\s/\[\]()<>{}%]*)')
+
+
+def check_output_mode(output_mode):
+    """Raise ValueError unless output_mode is one of OUTPUT_MODES"""
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f'Output mode must be one of: {", ".join(OUTPUT_MODES)}')
+    return output_mode
+
+
+def parse_pages(spec, page_count):
+    """
+    Parse a 1-based page list such as "4", "1,3" or "2-4".
+
+    Returns:
+        sorted list of distinct 0-based page indices
+
+    Raises:
+        ValueError: if the list is malformed or names a page outside 1..page_count
+    """
+    pages = set()
+    for part in spec.split(','):
+        first, _, last = part.strip().partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise ValueError(f'Invalid page list: {spec!r} (use e.g. "4", "1,3" or "2-4")') from None
+        if not 1 <= first <= last <= page_count:
+            raise ValueError(f'Pages must be between 1 and {page_count}: {part.strip()!r}')
+        pages.update(range(first - 1, last))
+    return sorted(pages)
+
+
+def check_pages(pages, page_count):
+    """Raise ValueError unless pages is a non-empty list of page indices"""
+    if not pages or not all(0 <= page < page_count for page in pages):
+        raise ValueError(f'Pages must be indices between 0 and {page_count - 1}')
+    return pages
+
+
+def write_output(write, output_path=None, output_mode=DEFAULT_OUTPUT_MODE):
+    """
+    Write a filled document in an output mode.
+
+    Args:
+        write: Callable that writes the document to a binary file object
+        output_path: File to write to, or None to return the bytes
+        output_mode: One of OUTPUT_MODES
+
+    Returns:
+        output_path, or the document bytes
+    """
+    if check_output_mode(output_mode) == 'small':
+        document = BytesIO()
+        write(document)
+        with stage('compact'):
+            compacted = compact_pdf(document.getvalue())
+        write = lambda output_file: output_file.write(compacted)
+
+    if output_path:
+        with open(output_path, 'wb') as output_file:
+            write(output_file)
+        return output_path
+    output = BytesIO()
+    write(output)
+    return output.getvalue()
+
+
+def compact_pdf(pdf_bytes):
+    """
+    Rewrite a PDF as small as possible without changing how it renders.
+
+    Args:
+        pdf_bytes: PDF file contents (an incremental update is fine)
+
+    Returns:
+        bytes of a PDF 1.5 file using object and cross-reference streams
+    """
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter(clone_from=PdfReader(BytesIO(pdf_bytes)))
+
+    visited = set()
+    for page in writer.pages:
+        _prune_resources(page, _content_bytes(page.get('/Contents')), visited)
+
+    writer.compress_identical_objects(remove_identicals=True, remove_orphans=False)
+
+    output = BytesIO()
+    _write_compact(writer, output)
+    return output.getvalue()
+
+
+def _content_bytes(contents):
+    """Decoded bytes of a content stream or array of content streams"""
+    from pypdf.generic import ArrayObject
+    if contents is None:
+        return b''
+    contents = contents.get_object()
+    if isinstance(contents, ArrayObject):
+        return b'\n'.join(part.get_object().get_data() for part in contents)
+    return contents.get_data()
+
+
+def _prune_resources(holder, content, visited):
+    """
+    Drop the resources of a page or form XObject that its content never names,
+    then do the same for the form XObjects it keeps.
+    """
+    from pypdf.generic import DictionaryObject, IndirectObject, NameObject
+    if '/Resources' not in holder:
+        return  # Inherited resources may be used by other pages
+    used = set(NAME_TOKEN_RE.findall(content))
+    if any(b'#' in name for name in used):
+        return  # Escaped names can't be compared by their bytes; keep everything
+
+    resources = DictionaryObject(holder['/Resources'])
+    for category in NAMED_RESOURCES:
+        if category not in resources:
+            continue
+        entries = resources[category]
+        kept = DictionaryObject({
+            name: value for name, value in entries.items()
+            if not name.isascii() or name[1:].encode('ascii') in used
+        })
+        if len(kept) == len(entries):
+            continue
+        if kept:
+            resources[NameObject(category)] = kept
+        else:
+            del resources[category]
+    # A fresh direct dictionary, so resources shared with other pages are untouched
+    holder[NameObject('/Resources')] = resources
+
+    for value in resources.get('/XObject', {}).values():
+        if not isinstance(value, IndirectObject) or value.idnum in visited:
+            continue
+        visited.add(value.idnum)
+        xobject = value.get_object()
+        if xobject.get('/Subtype') == '/Form':
+            _prune_resources(xobject, xobject.get_data(), visited)
+
+
+def _reachable(writer, roots):
+    """Object numbers reachable from the given trailer entries"""
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+    seen = set()
+    pending = [ref for ref in roots if isinstance(ref, IndirectObject)]
+    while pending:
+        ref = pending.pop()
+        if ref.idnum in seen:
+            continue
+        obj = writer._objects[ref.idnum - 1]
+        if obj is None:
+            continue
+        seen.add(ref.idnum)
+        stack = [obj]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, IndirectObject):
+                if item.idnum not in seen:
+                    pending.append(item)
+            elif isinstance(item, DictionaryObject):
+                stack.extend(item.values())
+            elif isinstance(item, ArrayObject):
+                stack.extend(item)
+    return seen
+
+
+def _flate(stream):
+    """Flate-compress a stream's data at the highest level if that makes it smaller"""
+    from pypdf.generic import NameObject
+    filters = stream.get('/Filter')
+    if filters is None:
+        encoded = stream.get_data()
+    elif filters == '/FlateDecode' and '/DecodeParms' not in stream:
+        encoded = stream._data  # Often written with a faster level
+    else:
+        return
+    low, high = RECOMPRESS_CACHE_RANGE
+    if low <= len(encoded) <= high:
+        compressed = _recompress(encoded, filters is not None)
+    else:
+        compressed = _recompress.__wrapped__(encoded, filters is not None)
+    if len(compressed) < len(stream._data):
+        stream._data = compressed
+        stream[NameObject('/Filter')] = NameObject('/FlateDecode')
+
+
+@lru_cache(maxsize=RECOMPRESS_CACHE_SIZE)
+def _recompress(data, is_flate):
+    """
+    Level 9 Flate encoding of stream data (inflating it first if is_flate)
+    """
+    return zlib.compress(zlib.decompress(data) if is_flate else data, 9)
+
+
+def _write_compact(writer, output):
+    """Serialize the writer's reachable objects with object and xref streams"""
+    from pypdf.generic import ArrayObject, NameObject, NumberObject, StreamObject
+    trailer = {NameObject('/Root'): writer.root_object.indirect_reference}
+    if writer._info is not None:
+        trailer[NameObject('/Info')] = writer._info.indirect_reference
+    keep = sorted(_reachable(writer, trailer.values()))
+
+    output.write(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+    entries = {}  # object number -> (type, field 2, field 3) of its xref entry
+
+    packed = []
+    for num in keep:
+        obj = writer._objects[num - 1]
+        if isinstance(obj, StreamObject):
+            _flate(obj)
+            entries[num] = (1, output.tell(), 0)
+            output.write(b'%d 0 obj\n' % num)
+            obj.write_to_stream(output)
+            output.write(b'\nendobj\n')
+        else:
+            packed.append(num)
+
+    next_num = len(writer._objects) + 1
+    for start in range(0, len(packed), OBJECT_STREAM_SIZE):
+        chunk = packed[start:start + OBJECT_STREAM_SIZE]
+        header, body = [], BytesIO()
+        for index, num in enumerate(chunk):
+            header.append(b'%d %d' % (num, body.tell()))
+            writer._objects[num - 1].write_to_stream(body)
+            body.write(b'\n')
+            entries[num] = (2, next_num, index)
+        header = b' '.join(header) + b'\n'
+        object_stream = StreamObject()
+        object_stream._data = zlib.compress(header + body.getvalue(), 9)
+        object_stream.update({
+            NameObject('/Type'): NameObject('/ObjStm'),
+            NameObject('/N'): NumberObject(len(chunk)),
+            NameObject('/First'): NumberObject(len(header)),
+            NameObject('/Filter'): NameObject('/FlateDecode'),
+        })
+        entries[next_num] = (1, output.tell(), 0)
+        output.write(b'%d 0 obj\n' % next_num)
+        object_stream.write_to_stream(output)
+        output.write(b'\nendobj\n')
+        next_num += 1
+
+    # The cross-reference stream indexes itself too
+    xref_num = next_num
+    xref_offset = output.tell()
+    entries[xref_num] = (1, xref_offset, 0)
+    # Object 0 heads the free list and always has generation 65535
+    entries[0] = (0, 0, 65535)
+    size = xref_num + 1
+    offset_width = max(1, (xref_offset.bit_length() + 7) // 8)
+    # Third fields are object stream indices and generations
+    index_width = max(1, (max(field3 for _, _, field3 in entries.values()).bit_length() + 7) // 8)
+    rows = []
+    for num in range(size):
+        kind, field2, field3 = entries.get(num, (0, 0, 0))
+        rows.append(bytes([kind]) + field2.to_bytes(offset_width, 'big')
+                    + field3.to_bytes(index_width, 'big'))
+    xref = StreamObject()
+    xref._data = zlib.compress(b''.join(rows), 9)
+    xref.update(trailer)
+    xref.update({
+        NameObject('/Type'): NameObject('/XRef'),
+        NameObject('/Size'): NumberObject(size),
+        NameObject('/W'): ArrayObject(NumberObject(width) for width in (1, offset_width, index_width)),
+        NameObject('/Filter'): NameObject('/FlateDecode'),
+    })
+    if writer._ID is not None:
+        xref[NameObject('/ID')] = writer._ID
+    output.write(b'%d 0 obj\n' % xref_num)
+    xref.write_to_stream(output)
+    output.write(b'\nendobj\nstartxref\n%d\n%%%%EOF\n' % xref_offset)
@@ -1,8 +1,8 @@
 """
 PDF Validator - Validates uploaded PDFs match expected template structure
 """
-from io import BytesIO
-from pypdf import PdfReader
+import re
+from .upload_buffer import as_pdf_stream
 
 
 # Expected template specifications
@@ -11,25 +11,202 @@ EXPECTED_PAGE_WIDTH = 612  # US Letter width in points
 EXPECTED_PAGE_HEIGHT = 792  # US Letter height in points
 SIZE_TOLERANCE = 5  # Allow small variations in page size
 
+# Pre-screen limits - the spec allows the header anywhere in the first 1024 bytes
+PDF_HEADER = b'%PDF-'
+HEADER_SCAN_SIZE = 1024
+TAIL_SCAN_SIZE = 2048
+MAX_XREF_SECTIONS = 8
+OBJECT_SCAN_SIZE = 4096
+
+_STARTXREF_RE = re.compile(rb'startxref\s+(\d+)\s+%%EOF')
+_XREF_SUBSECTION_RE = re.compile(rb'\s*(\d+)\s+(\d+)[ \t]*\r?\n?')
+_XREF_ENTRY_RE = re.compile(rb'(\d{10}) (\d{5}) ([nf])')
+_ROOT_RE = re.compile(rb'/Root\s+(\d+)\s+\d+\s+R')
+_PREV_RE = re.compile(rb'/Prev\s+(\d+)')
+_PAGES_REF_RE = re.compile(rb'/Pages\s+(\d+)\s+\d+\s+R')
+# Group 2 matches when the count is an indirect reference (`/Count 5 0 R`)
+_COUNT_RE = re.compile(rb'/Count\s+(\d+)(\s+\d+\s+R)?')
+
+
+def check_pdf_header(head):
+    """
+    Check the leading bytes of an upload for the %PDF- magic.
+
+    Args:
+        head: The first bytes of the file (up to HEADER_SCAN_SIZE)
+
+    Returns:
+        An error message, or None if the header looks like a PDF
+    """
+    if PDF_HEADER not in head[:HEADER_SCAN_SIZE]:
+        return 'File is not a PDF (missing %PDF- header)'
+    return None
+
+
+class PrescreenedUploadStream:
+    """
+    Upload stream wrapper that checks the PDF header while the body is received.
+
+    Werkzeug writes each multipart chunk through write(); once the first
+    HEADER_SCAN_SIZE bytes are in and no %PDF- header was seen, the rest of
+    the upload is discarded instead of being spooled, and `rejection` holds
+    the reason. All other file methods are passed through to the real stream.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._head = b''
+        self.rejection = None
+
+    def write(self, data):
+        if self.rejection:
+            return len(data)
+        if self._head is not None:
+            self._head += bytes(data[:HEADER_SCAN_SIZE - len(self._head)])
+            if PDF_HEADER in self._head:
+                self._head = None
+            elif len(self._head) >= HEADER_SCAN_SIZE:
+                self.rejection = check_pdf_header(self._head)
+                self._head = None
+                if self.rejection:
+                    return len(data)
+        return self._stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        return iter(self._stream)
+
+
+def prescreen_pdf(pdf_bytes, expected_page_count=EXPECTED_PAGE_COUNT):
+    """
+    Cheaply reject uploads that cannot be the expected template.
+
+    Only looks at the header, the trailer and the handful of objects needed
+    to read the page count, so it costs microseconds instead of a full parse.
+    A page count that cannot be read cheaply (e.g. cross-reference streams)
+    is left for validate_uploaded_pdf() to check.
+
+    Args:
+        pdf_bytes: The uploaded PDF file as bytes or a read-only buffer
+        expected_page_count: Page count of the reference template
+
+    Returns:
+        dict with 'valid' boolean, 'errors' list if invalid, and 'info'
+        with the page count when it could be determined
+    """
+    errors = []
+    page_count = None
+
+    header_error = check_pdf_header(pdf_bytes[:HEADER_SCAN_SIZE])
+    if header_error:
+        errors.append(header_error)
+    else:
+        tail_start = max(0, len(pdf_bytes) - TAIL_SCAN_SIZE)
+        matches = list(_STARTXREF_RE.finditer(pdf_bytes[tail_start:]))
+        if not matches:
+            errors.append('PDF is truncated or corrupt (missing startxref/%%EOF)')
+        else:
+            xref_offset = int(matches[-1].group(1))
+            page_count = _read_page_count(pdf_bytes, xref_offset)
+
+    if page_count is not None and page_count != expected_page_count:
+        errors.append(
+            f'Page count mismatch: uploaded PDF has {page_count} pages, '
+            f'expected {expected_page_count} pages'
+        )
+
+    result = {
+        'valid': len(errors) == 0,
+        'info': {'page_count': page_count}
+    }
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+def _read_page_count(pdf_bytes, xref_offset):
+    """Follow trailer /Root -> /Pages -> /Count through classic xref tables"""
+    sections = []
+    root_num = None
+    offset = xref_offset
+
+    # Walk the /Prev chain so incrementally updated files resolve too
+    while offset is not None and len(sections) < MAX_XREF_SECTIONS:
+        if not 0 <= offset < len(pdf_bytes) or pdf_bytes[offset:offset + 4] != b'xref':
+            return None  # Cross-reference stream or bad offset - leave it to pypdf
+        trailer_pos = pdf_bytes.find(b'trailer', offset)
+        if trailer_pos < 0:
+            return None
+        trailer = pdf_bytes[trailer_pos:trailer_pos + OBJECT_SCAN_SIZE]
+        sections.append((offset + 4, trailer_pos))
+        if root_num is None:
+            root_match = _ROOT_RE.search(trailer)
+            root_num = int(root_match.group(1)) if root_match else None
+        prev_match = _PREV_RE.search(trailer)
+        offset = int(prev_match.group(1)) if prev_match else None
+
+    if root_num is None:
+        return None
+
+    catalog = _read_object(pdf_bytes, sections, root_num)
+    pages_match = _PAGES_REF_RE.search(catalog) if catalog else None
+    if not pages_match:
+        return None
+
+    pages = _read_object(pdf_bytes, sections, int(pages_match.group(1)))
+    count_match = _COUNT_RE.search(pages) if pages else None
+    if not count_match or count_match.group(2):
+        return None  # An indirect count is left to the full validation
+    return int(count_match.group(1))
+
+
+def _read_object(pdf_bytes, sections, obj_num):
+    """Return the raw bytes of an object body, looking in the newest xref section first"""
+    for start, end in sections:
+        pos = start
+        while pos < end:
+            match = _XREF_SUBSECTION_RE.match(pdf_bytes, pos, end)
+            if not match:
+                break
+            first, count = int(match.group(1)), int(match.group(2))
+            entries_start = match.end()
+            if first <= obj_num < first + count:
+                entry_pos = entries_start + (obj_num - first) * 20
+                entry = _XREF_ENTRY_RE.match(pdf_bytes, entry_pos, entry_pos + 20)
+                if not entry or entry.group(3) != b'n':
+                    return None
+                obj_offset = int(entry.group(1))
+                body = pdf_bytes[obj_offset:obj_offset + OBJECT_SCAN_SIZE]
+                if not body.startswith(b'%d ' % obj_num):
+                    return None
+                end_pos = body.find(b'endobj')
+                return body[:end_pos] if end_pos >= 0 else body
+            pos = entries_start + count * 20
+    return None
+
 
 def validate_uploaded_pdf(pdf_bytes, template_path):
     """
     Validate that an uploaded PDF matches the expected template structure.
 
     Args:
-        pdf_bytes: The uploaded PDF file as bytes
+        pdf_bytes: The uploaded PDF file as bytes or a read-only buffer
         template_path: Path to the reference template PDF
 
     Returns:
         dict with 'valid' boolean and 'errors' list if invalid,
         or 'warnings' list for non-critical issues
     """
+    from pypdf import PdfReader  # Deferred so prescreening doesn't load pypdf
+
     errors = []
     warnings = []
 
     try:
         # Load the uploaded PDF
-        uploaded_pdf = PdfReader(BytesIO(pdf_bytes))
+        uploaded_pdf = PdfReader(as_pdf_stream(pdf_bytes))
     except Exception as e:
         return {
             'valid': False,
@@ -122,13 +299,15 @@ def get_pdf_info(pdf_bytes):
     Get information about a PDF file.
 
     Args:
-        pdf_bytes: The PDF file as bytes
+        pdf_bytes: The PDF file as bytes or a read-only buffer
 
     Returns:
         dict with PDF information
     """
+    from pypdf import PdfReader
+
     try:
-        pdf = PdfReader(BytesIO(pdf_bytes))
+        pdf = PdfReader(as_pdf_stream(pdf_bytes))
 
         pages_info = []
         for i, page in enumerate(pdf.pages):
@@ -0,0 +1,122 @@
+"""
+Request profiling - run a single fill under a profiler and report where the time went
+
+Enabled with FORM_PROFILING=1 and requested per call with an `X-Profile` header:
+
+    X-Profile: pstats      deterministic cProfile, sorted by cumulative time
+    X-Profile: collapsed   sampled stacks in collapsed format (flamegraph.pl,
+                           speedscope), one "frame;frame;frame count" per line
+
+Both reports start with per-field render timings measured around each field's
+layout in PDFFiller.create_overlay (the page's text is then drawn in one
+batch). When no profile is running, the only cost to a fill is a single
+context variable lookup per overlay.
+"""
+from collections import Counter
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+PROFILE_FORMATS = ('pstats', 'collapsed')
+PSTATS_LIMIT = 60                 # Functions listed in a pstats report
+SAMPLE_INTERVAL = 0.001           # Seconds between stack samples
+
+_field_timings = contextvars.ContextVar('formfiller_field_timings', default=None)
+
+
+def field_timings():
+    """Return the list per-field timings are recorded into, or None if not profiling"""
+    return _field_timings.get()
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Return the samples in collapsed-stack format"""
+        return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common())
+
+
+class RequestProfiler:
+    """
+    Profiles the code run inside a `with` block on the current thread.
+
+    Args:
+        kind: 'pstats' or 'collapsed' (see PROFILE_FORMATS)
+    """
+
+    def __init__(self, kind):
+        if kind not in PROFILE_FORMATS:
+            raise ValueError(f'Unknown profile format: {kind}')
+        self.kind = kind
+        self.fields = []
+        self.elapsed = 0.0
+        self._profiler = None
+        self._sampler = None
+        self._token = None
+
+    def __enter__(self):
+        self._token = _field_timings.set(self.fields)
+        if self.kind == 'pstats':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        _field_timings.reset(self._token)
+        return False
+
+    def report(self):
+        """Return the profile as text: per-field timings followed by the profiler output"""
+        lines = [f'# total: {self.elapsed * 1000:.2f} ms', '# fields (slowest first):']
+        for name, seconds, length in sorted(self.fields, key=lambda f: f[1], reverse=True):
+            lines.append(f'#   {name}: {seconds * 1000:.3f} ms ({length} chars)')
+        lines.append('')
+
+        if self.kind == 'pstats':
+            output = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=output)
+            stats.sort_stats('cumulative').print_stats(PSTATS_LIMIT)
+            lines.append(output.getvalue())
+        else:
+            lines.append(self._sampler.collapsed())
+        return '\n'.join(lines) + '\n'
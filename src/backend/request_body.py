@@ -0,0 +1,150 @@
+"""
+Request bodies - compressed submissions and binary signature parts
+
+Clients may compress fill requests with `Content-Encoding: gzip` (or
+`deflate`, or `br` when the optional `brotli` package is installed). Long
+Hebrew text compresses well, and mobile uploads are what is slow. The body is
+inflated chunk by chunk into a spooled temp file before Flask parses it, so
+the routes see an ordinary body with a correct Content-Length. Inflation stops
+as soon as the output passes the size limit, so a small "compression bomb"
+costs at most the limit, not the size it would inflate to.
+
+A signature can also be sent as a binary multipart part instead of a base64
+data URL inside the JSON; read_signature_part() checks it is an image.
+"""
+import tempfile
+import zlib
+from .upload_buffer import COPY_CHUNK_SIZE, SPOOL_THRESHOLD
+
+try:
+    import brotli
+except ImportError:  # Optional - `br` bodies are refused without it
+    brotli = None
+
+# Content codings accepted in request bodies, in the order advertised
+CONTENT_ENCODINGS = ('gzip', 'deflate') + (('br',) if brotli is not None else ())
+
+# brotli's streaming decoder can't cap its output, so it is fed input in slices
+# this small; one slice can overshoot the limit by a few brotli meta-blocks
+BROTLI_SLICE_SIZE = 16
+
+# Image formats accepted for a binary signature part
+SIGNATURE_MAGIC = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff')
+
+
+class UnsupportedEncoding(ValueError):
+    """The body uses a content coding that can't be decoded"""
+
+
+class BodyTooLarge(ValueError):
+    """The inflated body is over the size limit"""
+
+
+class CorruptBody(ValueError):
+    """The body is not valid data in its content coding"""
+
+
+def _zlib_inflater(wbits):
+    """inflate(data, max_length) and finished() of a zlib stream"""
+    decompressor = zlib.decompressobj(wbits)
+
+    def inflate(data, max_length):
+        """Returns (output, True if input is left over for another call)"""
+        output = decompressor.decompress(decompressor.unconsumed_tail + data, max_length)
+        return output, bool(decompressor.unconsumed_tail)
+
+    def finished():
+        if decompressor.unused_data:
+            raise CorruptBody('Unexpected data after the end of the compressed body')
+        return decompressor.eof
+
+    return inflate, finished
+
+
+def _brotli_inflater():
+    """inflate(data, max_length) and finished() of a brotli stream"""
+    decompressor = brotli.Decompressor()
+
+    def inflate(data, max_length):
+        output = b''.join(decompressor.process(data[start:start + BROTLI_SLICE_SIZE])
+                          for start in range(0, len(data), BROTLI_SLICE_SIZE))
+        return output, False
+
+    return inflate, decompressor.is_finished
+
+
+def decompress_body(stream, encoding, limit, spool_threshold=SPOOL_THRESHOLD):
+    """
+    Inflate a compressed request body.
+
+    Args:
+        stream: The body as sent, a binary file object
+        encoding: Its Content-Encoding
+        limit: Largest inflated size accepted, in bytes
+        spool_threshold: Inflated size above which the body is spooled to disk
+
+    Returns:
+        (file object positioned at the start of the inflated body, its size).
+        The caller closes the file.
+
+    Raises:
+        UnsupportedEncoding, BodyTooLarge or CorruptBody
+    """
+    encoding = encoding.strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        inflate, finished = _zlib_inflater(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        inflate, finished = _zlib_inflater(zlib.MAX_WBITS)
+    elif encoding == 'br' and brotli is not None:
+        inflate, finished = _brotli_inflater()
+    else:
+        raise UnsupportedEncoding(
+            f'Content-Encoding must be one of: {", ".join(CONTENT_ENCODINGS)}'
+        )
+
+    corrupt_errors = (zlib.error,) if brotli is None else (zlib.error, brotli.error)
+    body = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+    size = 0
+    try:
+        for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b''):
+            pending = True
+            while pending:
+                # Ask for one byte past the limit, so going over it is detectable
+                output, pending = inflate(chunk, limit - size + 1)
+                chunk = b''
+                size += len(output)
+                if size > limit:
+                    raise BodyTooLarge(f'Decompressed body is larger than {limit} bytes')
+                body.write(output)
+        if not finished():
+            raise CorruptBody(f'Truncated {encoding} body')
+    except corrupt_errors as e:
+        body.close()
+        raise CorruptBody(f'Invalid {encoding} body: {e}') from None
+    except ValueError:
+        body.close()
+        raise
+    body.seek(0)
+    return body, size
+
+
+def read_signature_part(files):
+    """
+    Read a signature sent as a binary multipart part.
+
+    Args:
+        files: request.files
+
+    Returns:
+        The image bytes, or None if the request has no `signature` part
+
+    Raises:
+        ValueError: if the part is not a PNG or JPEG image
+    """
+    signature = files.get('signature')
+    if signature is None:
+        return None
+    image_bytes = signature.read()
+    if not image_bytes.startswith(SIGNATURE_MAGIC):
+        raise ValueError('Signature must be a PNG or JPEG image')
+    return image_bytes
@@ -0,0 +1,128 @@
+"""
+Template specialization - pre-bake per-tenant constant values into a cached template
+
+Some fields never change for a given agency or office (placement_agency, the
+social worker names, the placement checkboxes). They are declared once per
+tenant in a JSON file, e.g. tenants/tel_aviv.json:
+
+    {"placement_agency": "כח אדם בע\"מ", "placement_israel": true}
+
+The first fill for a tenant renders those values onto the template and caches
+the result; later fills only draw the variable fields on top of it. A cached
+template is rebuilt when the base template, the field mapping or the tenant's
+constants change. Request values for constant fields are ignored.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from .field_mapping import FORM_FIELDS
+from .pdf_output import DEFAULT_OUTPUT_MODE
+
+TENANT_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Digest of the field mapping, so coordinate changes invalidate cached templates
+FIELDS_DIGEST = hashlib.sha256(
+    json.dumps(FORM_FIELDS, sort_keys=True).encode('utf-8')
+).hexdigest()
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class TenantConstants:
+    """Loads tenant constant files, re-reading a file only when it changes"""
+
+    def __init__(self, tenants_dir):
+        self.tenants_dir = tenants_dir
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id):
+        """
+        Return the constant values declared for a tenant.
+
+        Returns:
+            dict of field name -> value, or None if the tenant is unknown
+
+        Raises:
+            ValueError: if the tenant file is malformed or names unknown fields
+        """
+        if not TENANT_ID_RE.match(tenant_id or ''):
+            return None
+        path = os.path.join(self.tenants_dir, f'{tenant_id}.json')
+        try:
+            signature = _file_signature(path)
+        except OSError:
+            return None
+
+        cached = self._cache.get(tenant_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        with open(path, encoding='utf-8') as tenant_file:
+            constants = json.load(tenant_file)
+        if not isinstance(constants, dict):
+            raise ValueError(f'Tenant file {path} must contain a JSON object')
+        unknown = sorted(key for key in constants if key not in FORM_FIELDS)
+        if unknown:
+            raise ValueError(f'Tenant file {path} has unknown fields: {", ".join(unknown)}')
+
+        with self._lock:
+            self._cache[tenant_id] = (signature, constants)
+        return constants
+
+
+class SpecializedTemplateCache:
+    """Caches one specialized template per (base template, tenant)"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template_path, tenant_id, constants):
+        """Return the compiled specialized template, rendering it if stale"""
+        constants_digest = hashlib.sha256(
+            json.dumps(constants, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        key = (_file_signature(template_path), FIELDS_DIGEST, constants_digest)
+
+        entry = self._entries.get((template_path, tenant_id))
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            # Another thread may have rendered it while we waited
+            entry = self._entries.get((template_path, tenant_id))
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            from .merge_plan import CompiledTemplate
+            from .pdf_filler import fill_pdf_form
+            compiled = CompiledTemplate(fill_pdf_form(template_path, constants))
+            self._entries[(template_path, tenant_id)] = (key, compiled)
+            return compiled
+
+    def stats(self):
+        """Return cache statistics"""
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+specialized_templates = SpecializedTemplateCache()
+
+
+def fill_pdf_specialized(template_path, tenant_id, constants, form_data, output_path=None,
+                         output_mode=DEFAULT_OUTPUT_MODE, pages=None):
+    """Fill only the variable fields on top of a tenant's specialized template"""
+    from .pdf_filler import PDFFiller
+    compiled = specialized_templates.get(template_path, tenant_id, constants)
+    variable_data = {k: v for k, v in form_data.items() if k not in constants}
+    return PDFFiller.from_compiled(compiled).fill_form(variable_data, output_path,
+                                                       output_mode=output_mode, pages=pages)
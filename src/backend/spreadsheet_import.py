@@ -0,0 +1,276 @@
+"""
+Spreadsheet import - turn CSV or XLSX rows into form data
+
+Coordinators keep visit data in spreadsheet exports. A mapping file says which
+column fills which field, in JSON (or YAML with PyYAML):
+
+    {
+      "id_column": "מספר ביקור",
+      "columns": {"שם משפחה מעסיק": "employer_last_name", "ת.ז. מעסיק": "employer_id"},
+      "dates": {"תאריך ביקור": "visit_date"},
+      "choices": {"אושפז": {"כן": "was_hospitalized_yes", "לא": "was_hospitalized_no"}}
+    }
+
+- `columns` maps a header to a field. Checkbox fields are checked by values
+  such as "כן", "yes", "x", "1" or "true".
+- `dates` splits a date column into the `<prefix>_day`, `_month` and `_year`
+  fields. Dates are read as day/month/year (or year-month-day when the year
+  comes first); XLSX date cells are used as they are.
+- `choices` maps a column's values to the checkbox field each one checks.
+- `id_column` names the column whose value identifies the row in output file
+  names and the checkpoint. Without it, rows are numbered. Characters that
+  can't be in a file name become "_", and values too long for one are cut
+  short; either way the ID ends in a short hash of the value, so "a/b" and
+  "a_b" stay different rows.
+
+Rows are read one at a time (XLSX in openpyxl's read-only mode), so a large
+export is never loaded whole. Checkpoint records the IDs of rows whose PDFs are
+written, so an interrupted import resumes where it stopped.
+"""
+import csv
+import datetime
+import hashlib
+import os
+import re
+
+try:
+    import openpyxl
+except ImportError:  # Optional - only CSV files are read without it
+    openpyxl = None
+
+# Cell values that check a checkbox field
+CHECKED_VALUES = frozenset({'1', 'x', 'v', '✓', 'y', 'yes', 'true', 'on', 'כן'})
+
+DATE_PARTS = ('day', 'month', 'year')
+DATE_RE = re.compile(r'^\s*(\d{1,4})\s*[./-]\s*(\d{1,2})\s*[./-]\s*(\d{1,4})\s*$')
+
+# Row IDs become file names
+ROW_ID_RE = re.compile(r'[^\w.-]')
+# File systems limit names to 255 bytes; leave room for ".pdf.tmp"
+MAX_ROW_ID_BYTES = 200
+
+
+class ColumnMapping:
+    """A validated mapping file: which column fills which field"""
+
+    def __init__(self, mapping, fields):
+        """
+        Args:
+            mapping: Parsed mapping file (see the module docstring)
+            fields: {field_name: config} of the form being filled
+
+        Raises:
+            ValueError: if the mapping names unknown fields or is malformed
+        """
+        if not isinstance(mapping, dict):
+            raise ValueError('Mapping must be a JSON object')
+        self.fields = fields
+        self.columns = mapping.get('columns') or {}
+        self.dates = mapping.get('dates') or {}
+        self.choices = mapping.get('choices') or {}
+        self.id_column = mapping.get('id_column')
+
+        for header, field_name in self.columns.items():
+            if field_name not in fields:
+                raise ValueError(f'Column {header!r}: unknown field {field_name!r}')
+        for header, prefix in self.dates.items():
+            missing = [f'{prefix}_{part}' for part in DATE_PARTS if f'{prefix}_{part}' not in fields]
+            if missing:
+                raise ValueError(f'Date column {header!r}: unknown fields {", ".join(missing)}')
+        for header, options in self.choices.items():
+            if not isinstance(options, dict):
+                raise ValueError(f'Choice column {header!r}: must map values to fields')
+            for field_name in options.values():
+                if not fields.get(field_name, {}).get('checkbox'):
+                    raise ValueError(f'Choice column {header!r}: {field_name!r} is not a checkbox field')
+        if not (self.columns or self.dates or self.choices):
+            raise ValueError('Mapping has no "columns", "dates" or "choices"')
+
+    def headers(self):
+        """Headers the mapping reads"""
+        headers = list(self.columns) + list(self.dates) + list(self.choices)
+        return headers + ([self.id_column] if self.id_column else [])
+
+    def missing_headers(self, headers):
+        """Mapped headers that are not in a file's header row"""
+        present = set(headers)
+        return [header for header in self.headers() if header not in present]
+
+    def row_id(self, row, row_number):
+        """File-name safe ID of a row: its id_column value, or its row number"""
+        value = cell_text(row.get(self.id_column)) if self.id_column else ''
+        if not value:
+            return f'row{row_number:06d}'
+        safe = ROW_ID_RE.sub('_', value)
+        encoded = safe.encode('utf-8')
+        if safe != value or len(encoded) > MAX_ROW_ID_BYTES:
+            # Tell apart values that only differ in the replaced or cut characters
+            safe = encoded[:MAX_ROW_ID_BYTES - 9].decode('utf-8', 'ignore')
+            safe += '-' + hashlib.sha256(value.encode('utf-8')).hexdigest()[:8]
+        return safe
+
+    def form_data(self, row):
+        """
+        Form data of a row ({header: cell value}).
+
+        Raises:
+            ValueError: if a date or choice cell can't be read
+        """
+        form_data = {}
+        for header, field_name in self.columns.items():
+            value = row.get(header)
+            if self.fields[field_name].get('checkbox'):
+                if cell_text(value).lower() in CHECKED_VALUES:
+                    form_data[field_name] = True
+                continue
+            text = cell_text(value)
+            if text:
+                form_data[field_name] = text
+
+        for header, prefix in self.dates.items():
+            value = row.get(header)
+            if cell_text(value):
+                day, month, year = split_date(value)
+                form_data[f'{prefix}_day'] = f'{day:02d}'
+                form_data[f'{prefix}_month'] = f'{month:02d}'
+                form_data[f'{prefix}_year'] = f'{year:04d}'
+
+        for header, options in self.choices.items():
+            text = cell_text(row.get(header))
+            if not text:
+                continue
+            if text not in options:
+                raise ValueError(f'{header}: {text!r} is not one of {", ".join(options)}')
+            form_data[options[text]] = True
+        return form_data
+
+
+def cell_text(value):
+    """Text of a cell value, as it would be typed into the form"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.strftime('%d/%m/%Y')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # XLSX stores IDs and phone numbers as floats
+    return str(value).strip()
+
+
+def split_date(value):
+    """
+    (day, month, year) of a date cell.
+
+    Raises:
+        ValueError: if it isn't a date
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.day, value.month, value.year
+    match = DATE_RE.match(str(value))
+    if not match:
+        raise ValueError(f'{value!r} is not a date (use day/month/year)')
+    first, month, last = (int(part) for part in match.groups())
+    if len(match.group(1)) == 4:
+        year, day = first, last
+    else:
+        day, year = first, last
+    if year < 100:
+        year += 2000
+    try:
+        datetime.date(year, month, day)
+    except ValueError:
+        raise ValueError(f'{value!r} is not a valid date') from None
+    return day, month, year
+
+
+def read_rows(path, sheet=None):
+    """
+    Read a CSV or XLSX file row by row.
+
+    Returns:
+        (header list, iterator of (row number, {header: value})); row numbers
+        count from the header row as 1, as spreadsheet programs show them
+    """
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        return _read_xlsx(path, sheet)
+    return _read_csv(path)
+
+
+def _read_csv(path):
+    # utf-8-sig: Excel writes a byte order mark in front of UTF-8 exports
+    csv_file = open(path, newline='', encoding='utf-8-sig')
+    reader = csv.reader(csv_file)
+    headers = [header.strip() for header in next(reader, [])]
+
+    def rows():
+        with csv_file:
+            for row_number, values in enumerate(reader, 2):
+                if any(value.strip() for value in values):
+                    yield row_number, dict(zip(headers, values))
+    return headers, rows()
+
+
+def _read_xlsx(path, sheet):
+    if openpyxl is None:
+        raise ValueError('XLSX files need openpyxl (pip install openpyxl); or export as CSV')
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    worksheet = workbook[sheet] if sheet else workbook.active
+    values = worksheet.iter_rows(values_only=True)
+    headers = [cell_text(header) for header in next(values, ())]
+
+    def rows():
+        try:
+            for row_number, row in enumerate(values, 2):
+                if any(cell_text(value) for value in row):
+                    yield row_number, dict(zip(headers, row))
+        finally:
+            workbook.close()
+    return headers, rows()
+
+
+def count_rows(path, sheet=None):
+    """
+    Number of data rows read_rows() yields, for progress reporting (None if
+    unknown). Blank rows are skipped, as read_rows() skips them.
+    """
+    if path.lower().endswith(('.xlsx', '.xlsm')) and openpyxl is None:
+        return None
+    try:
+        _, rows = read_rows(path, sheet)
+    except (OSError, KeyError, ValueError):
+        return None
+    return sum(1 for _ in rows)
+
+
+class Checkpoint:
+    """Append-only file of the IDs of rows that are done"""
+
+    def __init__(self, path):
+        self.path = path
+        lines = []
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as checkpoint_file:
+                lines = checkpoint_file.read().split('\n')
+        # A last line without a newline was cut off mid-write; it doesn't count
+        self.done = {line for line in lines[:-1] if line}
+        self._file = open(path, 'a', encoding='utf-8')
+        if lines[-1:] not in ([], ['']):
+            self._file.write('\n')
+
+    def __contains__(self, row_id):
+        return row_id in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def add(self, row_id):
+        """Record a row as done (after its PDF is written)"""
+        self.done.add(row_id)
+        self._file.write(f'{row_id}\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
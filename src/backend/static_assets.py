@@ -0,0 +1,149 @@
+"""
+Static assets - content-hashed, precompressed copies of the app shell
+
+tools/build_static_assets.py copies each file of SHELL_ASSETS to
+static/dist/ under a name containing its content hash (js/app.3f2a9c1b7e0d.js)
+and writes gzip and, when the optional `brotli` package is installed, brotli
+versions next to it:
+
+    static/dist/js/app.3f2a9c1b7e0d.js
+    static/dist/js/app.3f2a9c1b7e0d.js.gz
+    static/dist/js/app.3f2a9c1b7e0d.js.br
+    static/dist/assets.json       {"js/app.js": {"path": ..., "digest": ...}}
+
+Hashed names never change content, so they are served from /assets/ with a
+one-year `immutable` cache lifetime; a new build simply produces new names.
+AssetManifest maps the source names used in templates to the hashed ones and
+falls back to the plain /static/ file for assets that were never built or
+have changed since the build, so development needs no build step.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:  # Optional - only gzip copies are written without it
+    brotli = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STATIC_DIR = os.path.join(PROJECT_ROOT, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "assets.json"
+
+# Files of the installable app shell, relative to static/
+SHELL_ASSETS = ("js/app.js", "css/style.css", "manifest.json")
+
+# Encodings with precompressed files, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def file_digest(path):
+    """Short content hash used in asset names"""
+    with open(path, "rb") as asset_file:
+        return hashlib.sha256(asset_file.read()).hexdigest()[:12]
+
+
+def build_static_assets(static_dir=STATIC_DIR, dist_dir=DIST_DIR, assets=SHELL_ASSETS):
+    """
+    Write hashed and precompressed copies of the assets and their manifest.
+
+    Old builds are removed, so dist_dir only ever holds the current files.
+
+    Returns:
+        {source name: hashed name} of the assets written
+    """
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+
+    manifest = {}
+    for name in assets:
+        source_path = os.path.join(static_dir, name)
+        digest = file_digest(source_path)
+        stem, extension = os.path.splitext(name)
+        hashed_name = f"{stem}.{digest}{extension}"
+        output_path = os.path.join(dist_dir, hashed_name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        with open(source_path, "rb") as source_file:
+            data = source_file.read()
+        with open(output_path, "wb") as output_file:
+            output_file.write(data)
+        with open(output_path + ".gz", "wb") as output_file:
+            output_file.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(output_path + ".br", "wb") as output_file:
+                output_file.write(brotli.compress(data, quality=11))
+        manifest[name] = {"path": hashed_name, "digest": digest}
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    return {name: entry["path"] for name, entry in manifest.items()}
+
+
+class PrecompressedBody:
+    """A generated response body, compressed once in every available encoding"""
+
+    def __init__(self, body):
+        self.body = body
+        self.encoded = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(body, quality=11)
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+    def select(self, accept_encodings):
+        """Return (data, content encoding or None, ETag) for a request's Accept-Encoding"""
+        for encoding, _ in ENCODINGS:
+            if encoding in self.encoded and accept_encodings[encoding] > 0:
+                # Each encoding is a different representation, so it has its own ETag
+                return self.encoded[encoding], encoding, f"{self.etag}-{encoding}"
+        return self.body, None, self.etag
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names any encoding of this body"""
+        return any(if_none_match.contains_weak(etag)
+                   for etag in [self.etag] + [f"{self.etag}-{encoding}" for encoding in self.encoded])
+
+
+class AssetManifest:
+    """Maps static file names to their hashed builds"""
+
+    def __init__(self, static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+        self.dist_dir = dist_dir
+        self.hashed = {}
+        try:
+            with open(os.path.join(dist_dir, MANIFEST_NAME)) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return
+        for name, entry in manifest.items():
+            # A source edited since the build is served unhashed until the next one
+            source_path = os.path.join(static_dir, name)
+            if os.path.exists(source_path) and file_digest(source_path) == entry["digest"]:
+                self.hashed[name] = entry["path"]
+
+    def hashed_name(self, name):
+        """Hashed name of a built asset (relative to dist_dir), or None"""
+        return self.hashed.get(name)
+
+    def encoded_file(self, hashed_name, accept_encodings):
+        """
+        Pick the file to send for a hashed asset.
+
+        Args:
+            accept_encodings: werkzeug Accept of the request's Accept-Encoding header
+
+        Returns:
+            (path, content encoding or None), or (None, None) if the name is unknown
+        """
+        if hashed_name not in self.hashed.values():
+            return None, None
+        path = os.path.join(self.dist_dir, hashed_name)
+        for encoding, suffix in ENCODINGS:
+            if accept_encodings[encoding] > 0 and os.path.exists(path + suffix):
+                return path + suffix, encoding
+        return path, None
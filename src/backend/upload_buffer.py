@@ -0,0 +1,65 @@
+"""
+Upload buffering - keeps small uploads in memory and spools large ones to disk
+
+Large uploads are exposed as a read-only memory map, so PdfReader pages the file
+in on demand instead of the worker holding a full copy as Python bytes.
+"""
+from contextlib import contextmanager
+from io import BytesIO
+import mmap
+import shutil
+import tempfile
+
+# Uploads at or above this size are spooled to disk and memory-mapped
+SPOOL_THRESHOLD = 1024 * 1024  # 1MB
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+@contextmanager
+def open_upload(file_storage, threshold=SPOOL_THRESHOLD):
+    """
+    Open an uploaded file as a buffer PdfReader can consume.
+
+    Args:
+        file_storage: The werkzeug FileStorage from request.files
+        threshold: Size in bytes above which the upload is memory-mapped
+
+    Yields:
+        bytes for small uploads, or a read-only mmap for large ones.
+        The mmap and any temp file are released when the block exits.
+    """
+    stream = file_storage.stream
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(0)
+
+    if size < threshold or size == 0:
+        yield stream.read()
+        return
+
+    spool_file = None
+    try:
+        fileno = stream.fileno()
+        stream.flush()
+    except (AttributeError, OSError, ValueError):
+        # In-memory stream - copy it into an anonymous temp file first.
+        # TemporaryFile is unlinked on creation, so nothing is left on disk.
+        spool_file = tempfile.TemporaryFile()
+        shutil.copyfileobj(stream, spool_file, COPY_CHUNK_SIZE)
+        spool_file.flush()
+        fileno = spool_file.fileno()
+
+    buffer = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    try:
+        yield buffer
+    finally:
+        buffer.close()
+        if spool_file is not None:
+            spool_file.close()
+
+
+def as_pdf_stream(pdf_data):
+    """Wrap PDF bytes in a stream; buffers from open_upload are returned as-is"""
+    if isinstance(pdf_data, (bytes, bytearray)):
+        return BytesIO(pdf_data)
+    return pdf_data
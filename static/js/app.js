@@ -24,9 +24,18 @@ document.addEventListener('DOMContentLoaded', function() {
     let uploadedPdfFile = null;
     let pdfValidated = false;
 
+    // Field schema from /api/fields (lengths and checkbox groups)
+    let fieldSchema = null;
+
     // Clear form on page load to ensure fresh start
     clearFormOnLoad();
 
+    // Load the schema used to validate before submitting
+    loadFieldSchema();
+
+    // Cache the app for offline use and send queued submissions
+    registerServiceWorker();
+
     // Initialize signature pad
     if (signatureCanvas) {
         initSignaturePad();
@@ -243,6 +252,28 @@ document.addEventListener('DOMContentLoaded', function() {
         return signatureCanvas.toDataURL('image/png');
     }
 
+    function getSignatureBlob() {
+        return new Promise(resolve => signatureCanvas.toBlob(resolve, 'image/png'));
+    }
+
+    // Request options sending a body gzipped, where the browser can compress
+    async function compressedBody(body) {
+        if (typeof CompressionStream === 'undefined') {
+            return { method: 'POST', body: body };
+        }
+        // Serialize the multipart body to learn its boundary, then gzip it
+        const serialized = new Response(body);
+        const contentType = serialized.headers.get('Content-Type');
+        const gzipped = await new Response(
+            serialized.body.pipeThrough(new CompressionStream('gzip'))
+        ).blob();
+        return {
+            method: 'POST',
+            headers: { 'Content-Type': contentType, 'Content-Encoding': 'gzip' },
+            body: gzipped
+        };
+    }
+
     // Validate uploaded PDF
     async function validateUploadedPdf(file) {
         showUploadStatus('validating', 'מאמת את קובץ ה-PDF...');
@@ -329,6 +360,13 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
+        // Catch values the server would reject without a round trip
+        const validationError = validateForm(formDataObj);
+        if (validationError) {
+            showError(validationError);
+            return;
+        }
+
         // Show loading spinner
         showLoading();
         hideError();
@@ -336,25 +374,32 @@ document.addEventListener('DOMContentLoaded', function() {
         try {
             let response;
 
+            // The signature goes as a binary part rather than a base64 data URL
+            const { signature_image, ...fields } = formDataObj;
+            const formData = new FormData();
+            formData.append('form_data', JSON.stringify(fields));
+            if (signature_image) {
+                formData.append('signature', await getSignatureBlob(), 'signature.png');
+            }
+
             if (uploadedPdfFile && pdfValidated) {
-                // Use uploaded PDF - send as multipart form data
-                const formData = new FormData();
+                // Use uploaded PDF - already compressed, so sent as is
                 formData.append('pdf_file', uploadedPdfFile);
-                formData.append('form_data', JSON.stringify(formDataObj));
 
                 response = await fetch('/api/fill-uploaded', {
                     method: 'POST',
                     body: formData
                 });
             } else {
-                // Use template PDF - send as JSON
-                response = await fetch('/api/fill', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(formDataObj)
-                });
+                // Use template PDF - the form text compresses well
+                response = await fetch('/api/fill', await compressedBody(formData));
+            }
+
+            if (response.status === 202) {
+                // Offline - the service worker queued the submission
+                hideLoading();
+                showError('אין חיבור לאינטרנט. הטופס יישלח וה-PDF יורד כשהחיבור יחזור');
+                return;
             }
 
             if (!response.ok) {
@@ -364,18 +409,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
             // Get the PDF blob
             const blob = await response.blob();
-
-            // Create download link
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = `visit_report_${getTimestamp()}.pdf`;
-            document.body.appendChild(a);
-            a.click();
-
-            // Cleanup
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
+            downloadPdf(blob);
 
             hideLoading();
 
@@ -389,6 +423,48 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Save a PDF blob through a temporary download link
+    function downloadPdf(blob) {
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = `visit_report_${getTimestamp()}.pdf`;
+        document.body.appendChild(a);
+        a.click();
+
+        // Cleanup
+        window.URL.revokeObjectURL(url);
+        document.body.removeChild(a);
+    }
+
+    // Register the service worker and handle submissions it sends later
+    function registerServiceWorker() {
+        if (!('serviceWorker' in navigator)) return;
+
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            console.warn('Service worker registration failed', error);
+        });
+
+        navigator.serviceWorker.addEventListener('message', event => {
+            const message = event.data || {};
+            if (message.type === 'fill-completed') {
+                downloadPdf(message.pdf);
+                showSuccess('Queued form sent, PDF downloaded');
+            } else if (message.type === 'fill-failed') {
+                showError(message.error || 'שליחת טופס שהמתין בתור נכשלה');
+            }
+        });
+
+        // Browsers without Background Sync replay the queue from the page
+        const requestReplay = () => {
+            if (navigator.serviceWorker.controller) {
+                navigator.serviceWorker.controller.postMessage({ type: 'replay' });
+            }
+        };
+        window.addEventListener('online', requestReplay);
+        navigator.serviceWorker.ready.then(requestReplay);
+    }
+
     // Convert date from YYYY-MM-DD to DD/MM/YYYY
     function formatDateForPdf(dateValue) {
         if (!dateValue) return '';
@@ -456,11 +532,57 @@ document.addEventListener('DOMContentLoaded', function() {
         return data;
     }
 
-    // Validation (optional - customize as needed)
+    // Fetch the field schema (cached by the browser, revalidated with its ETag)
+    async function loadFieldSchema() {
+        try {
+            const response = await fetch('/api/fields');
+            if (!response.ok) return;
+            fieldSchema = await response.json();
+        } catch (error) {
+            console.warn('Field schema unavailable, skipping client-side validation', error);
+            return;
+        }
+
+        for (const [name, field] of Object.entries(fieldSchema)) {
+            const element = form.elements.namedItem(name);
+            if (!element || element instanceof RadioNodeList) continue;
+            if (field.max_length && (element.type === 'text' || element.tagName === 'TEXTAREA')) {
+                element.maxLength = field.max_length;
+            }
+            if (field.exclusive) {
+                // Checking one box of an exclusive group clears the others
+                element.addEventListener('change', function() {
+                    if (!element.checked) return;
+                    for (const [other, otherField] of Object.entries(fieldSchema)) {
+                        const otherElement = form.elements.namedItem(other);
+                        if (other !== name && otherField.group === field.group && otherElement) {
+                            otherElement.checked = false;
+                        }
+                    }
+                });
+            }
+        }
+    }
+
+    // Validate collected data against the field schema; returns an error message or null
     function validateForm(data) {
-        // Add your validation logic here
-        // Return true if valid, false otherwise
-        return true;
+        if (!fieldSchema) return null;
+
+        const checkedInGroup = {};
+        for (const [name, value] of Object.entries(data)) {
+            const field = fieldSchema[name];
+            if (!field) continue;
+            if (field.type === 'text' && field.max_length && String(value).length > field.max_length) {
+                return `השדה ${name} ארוך מדי (עד ${field.max_length} תווים)`;
+            }
+            if (field.exclusive && value === true) {
+                checkedInGroup[field.group] = (checkedInGroup[field.group] || 0) + 1;
+                if (checkedInGroup[field.group] > 1) {
+                    return `ניתן לסמן אפשרות אחת בלבד בקבוצה ${field.group}`;
+                }
+            }
+        }
+        return null;
     }
 
     // Get current timestamp for filename
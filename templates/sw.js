@@ -0,0 +1,182 @@
+// PDF Form Filler - Service worker (rendered by the /sw.js route)
+//
+// - Caches the app shell (the form page, hashed assets, /api/fields) so the
+//   form opens without a connection
+// - Queues fill submissions made offline in IndexedDB and sends them when the
+//   connection returns; the PDF is handed to an open page to download
+
+const CACHE_PREFIX = 'formfiller-';
+const CACHE_NAME = CACHE_PREFIX + '{{ version }}';
+const SHELL_URLS = {{ shell_urls | tojson }};
+const QUEUED_PATHS = ['/api/fill', '/api/fill-uploaded'];
+const QUEUE_DB = 'formfiller-queue';
+const QUEUE_STORE = 'requests';
+const SYNC_TAG = 'replay-fills';
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => cache.addAll(SHELL_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    // Drop the caches of previous builds
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name.startsWith(CACHE_PREFIX) && name !== CACHE_NAME)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.method === 'POST' && QUEUED_PATHS.includes(url.pathname)) {
+        event.respondWith(sendOrQueue(request));
+    } else if (request.method !== 'GET') {
+        return;
+    } else if (request.mode === 'navigate' || url.pathname === '/api/fields') {
+        // Fresh when online (cheap to revalidate thanks to ETags), cached when not
+        event.respondWith(networkFirst(request));
+    } else if (url.pathname.startsWith('/assets/') || SHELL_URLS.includes(url.pathname)) {
+        // Hashed assets never change
+        event.respondWith(cacheFirst(request));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === SYNC_TAG) {
+        event.waitUntil(replayQueue());
+    }
+});
+
+self.addEventListener('message', event => {
+    // Pages ask for a replay when they load or come back online
+    if (event.data && event.data.type === 'replay') {
+        event.waitUntil(replayQueue());
+    }
+});
+
+async function networkFirst(request) {
+    const cache = await caches.open(CACHE_NAME);
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            cache.put(request.mode === 'navigate' ? '/' : request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = request.mode === 'navigate'
+            ? await cache.match('/')
+            : await cache.match(request);
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+async function cacheFirst(request) {
+    const cache = await caches.open(CACHE_NAME);
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) {
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+// Offline submission queue
+
+async function sendOrQueue(request) {
+    const queued = {
+        url: request.url,
+        headers: [...request.headers],
+        body: await request.clone().blob(),
+        queuedAt: Date.now(),
+    };
+    try {
+        return await fetch(request);
+    } catch (error) {
+        // No connection - keep the submission and send it later
+        await withQueue('readwrite', store => store.add(queued));
+        if (self.registration.sync) {
+            try {
+                await self.registration.sync.register(SYNC_TAG);
+            } catch (syncError) {
+                // Background Sync unavailable - pages trigger the replay instead
+            }
+        }
+        return new Response(JSON.stringify({ queued: true }), {
+            status: 202,
+            headers: { 'Content-Type': 'application/json' },
+        });
+    }
+}
+
+let replaying = null;
+
+function replayQueue() {
+    // One replay at a time, so nothing is submitted twice
+    if (!replaying) {
+        replaying = sendQueued().finally(() => { replaying = null; });
+    }
+    return replaying;
+}
+
+async function sendQueued() {
+    const entries = await withQueue('readonly', store => store.getAll());
+    for (const entry of entries) {
+        // The PDF is delivered to a page, so wait until one is open
+        const clients = await self.clients.matchAll({ type: 'window' });
+        if (!clients.length) return;
+
+        let response;
+        try {
+            response = await fetch(entry.url, {
+                method: 'POST',
+                headers: entry.headers,
+                body: entry.body,
+            });
+        } catch (error) {
+            return;  // Still offline - keep the rest queued
+        }
+        await withQueue('readwrite', store => store.delete(entry.id));
+
+        let message;
+        if (response.ok) {
+            message = { type: 'fill-completed', queuedAt: entry.queuedAt, pdf: await response.blob() };
+        } else {
+            const body = await response.json().catch(() => ({}));
+            message = { type: 'fill-failed', queuedAt: entry.queuedAt, error: body.error || response.statusText };
+        }
+        clients.forEach(client => client.postMessage(message));
+    }
+}
+
+function openQueue() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(QUEUE_DB, 1);
+        open.onupgradeneeded = () => {
+            open.result.createObjectStore(QUEUE_STORE, { keyPath: 'id', autoIncrement: true });
+        };
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+async function withQueue(mode, operation) {
+    const db = await openQueue();
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(QUEUE_STORE, mode);
+        const request = operation(transaction.objectStore(QUEUE_STORE));
+        transaction.oncomplete = () => resolve(request.result);
+        transaction.onerror = () => reject(transaction.error);
+    });
+}
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare the precompiled merge plan against PageObject.merge_page
+
+Checks that both paths render identical pages (pixel comparison via
+pypdfium2, which pdfplumber installs) and times the merge + write step of each.
+
+Usage: python tools/benchmark_merge.py [iterations]
+"""
+import sys
+import os
+import time
+from io import BytesIO
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pypdf import PdfReader
+from backend.pdf_filler import PDFFiller, PDFFillerFromBytes
+from test_filled_form import test_data
+
+TEMPLATE_PATH = "templates/template.pdf"
+
+
+def merge_page_path(template_bytes, overlay_bytes):
+    """Current path: parse template, merge_page every page, rewrite everything"""
+    filler = PDFFillerFromBytes(template_bytes)
+    output = BytesIO()
+    filler._merge_pages(PdfReader(BytesIO(overlay_bytes))).write(output)
+    return output.getvalue()
+
+
+def merge_plan_path(filler, overlay_bytes):
+    """Precompiled path: stamp the overlay XObject, append an update"""
+    output = BytesIO()
+    filler.compiled.merge(PdfReader(BytesIO(overlay_bytes)), output)
+    return output.getvalue()
+
+
+def render_pages(pdf_bytes):
+    import pypdfium2
+    document = pypdfium2.PdfDocument(pdf_bytes)
+    return [page.render(scale=2).to_pil().convert("L").tobytes() for page in document]
+
+
+def verify(legacy_bytes, planned_bytes):
+    """Return a list of differences between the two outputs (empty if identical)"""
+    try:
+        legacy_pages, planned_pages = render_pages(legacy_bytes), render_pages(planned_bytes)
+    except ImportError:
+        print("pypdfium2 not installed - comparing extracted text only")
+        legacy_pages = [p.extract_text() for p in PdfReader(BytesIO(legacy_bytes)).pages]
+        planned_pages = [p.extract_text() for p in PdfReader(BytesIO(planned_bytes)).pages]
+
+    if len(legacy_pages) != len(planned_pages):
+        return [f"page count {len(legacy_pages)} vs {len(planned_pages)}"]
+    return [f"page {n + 1} differs" for n, (a, b) in enumerate(zip(legacy_pages, planned_pages)) if a != b]
+
+
+def timed(func, iterations):
+    func()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with open(TEMPLATE_PATH, 'rb') as template_file:
+        template_bytes = template_file.read()
+
+    filler = PDFFiller(TEMPLATE_PATH)
+    overlay_bytes = filler.create_overlay(test_data).getvalue()
+
+    legacy = merge_page_path(template_bytes, overlay_bytes)
+    planned = merge_plan_path(filler, overlay_bytes)
+    differences = verify(legacy, planned)
+    if differences:
+        print("Outputs differ: " + ", ".join(differences))
+        sys.exit(1)
+    print("Rendered output identical on all pages")
+
+    legacy_ms = timed(lambda: merge_page_path(template_bytes, overlay_bytes), iterations)
+    planned_ms = timed(lambda: merge_plan_path(filler, overlay_bytes), iterations)
+    print(f"merge_page:  {legacy_ms:7.2f} ms/fill  ({len(legacy):,} bytes)")
+    print(f"merge plan:  {planned_ms:7.2f} ms/fill  ({len(planned):,} bytes)")
+    print(f"speedup:     {legacy_ms / planned_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
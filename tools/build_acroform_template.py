@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Build the AcroForm variant of the template (templates/template_acroform.pdf)
+
+Run once after changing the template or field_mapping.py. The server also
+rebuilds it on first use if it is missing or older than the template.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.acroform import build_acroform_template, derived_template_path
+
+
+def main():
+    template_path = sys.argv[1] if len(sys.argv) > 1 else "templates/template.pdf"
+    output_path = sys.argv[2] if len(sys.argv) > 2 else derived_template_path(template_path)
+
+    if not os.path.exists(template_path):
+        print(f"Error: Template not found at {template_path}")
+        sys.exit(1)
+
+    build_acroform_template(template_path, output_path)
+    print(f"Created: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Build the precomputed font metrics table (fonts/font_metrics.bin)
+
+Run after changing the embedded font or upgrading reportlab. Without the file
+(or with a stale one) the server measures text with reportlab as before.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.font_metrics import build_metrics_file, METRICS_PATH
+
+
+def main():
+    output_path = sys.argv[1] if len(sys.argv) > 1 else METRICS_PATH
+
+    fonts = build_metrics_file(output_path)
+    print(f"Created: {output_path} ({', '.join(fonts)}, {os.path.getsize(output_path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
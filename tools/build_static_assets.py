@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Build the hashed, precompressed static assets (static/dist/)
+
+Run after changing the JavaScript, CSS or web app manifest. Until the build is
+rerun, edited files are served unhashed from /static/ as before.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.static_assets import build_static_assets, DIST_DIR, brotli
+
+
+def main():
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else DIST_DIR
+
+    hashed = build_static_assets(dist_dir=output_dir)
+    for name, hashed_name in sorted(hashed.items()):
+        print(f"{name} -> {hashed_name}")
+    encodings = "gzip, br" if brotli is not None else "gzip (install brotli for .br files)"
+    print(f"Created: {output_dir} ({len(hashed)} assets; {encodings})")
+
+
+if __name__ == "__main__":
+    main()
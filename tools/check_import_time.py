@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Check the app's import-time budget with `python -X importtime`
+
+Fails (exit status 1) if:
+- `import app` takes longer than --budget-ms, or the backend package's share
+  of it is more than --backend-ratio times Flask's import time, measured in
+  the same interpreter (best of --repeat fresh interpreters). The ratio holds
+  on a slow or busy machine, where an absolute backend budget was flaky.
+- reportlab, pypdf, arabic_reshaper or bidi are loaded by importing the app
+  or by serving /health and /api/fields
+
+Usage: python tools/check_import_time.py [--budget-ms 400] [--backend-ratio 0.35]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Modules that make up the PDF stack and must only load when a PDF is handled
+HEAVY_MODULES = ('reportlab', 'pypdf', 'arabic_reshaper', 'bidi')
+
+LIGHT_REQUESTS_SCRIPT = """
+import json, sys
+import app
+client = app.app.test_client()
+statuses = [client.get(path).status_code for path in ('/health', '/api/fields')]
+loaded = sorted({name.split('.')[0] for name in sys.modules} & set(json.loads(sys.argv[1])))
+print(json.dumps({'statuses': statuses, 'loaded': loaded}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return [(depth, name, self_us, cumulative_us)] from -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure_import():
+    """Import the app in a fresh interpreter; returns (total ms, backend ms, Flask ms, top modules)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    entries = parse_importtime(result.stderr)
+    total = next(cumulative for depth, name, _, cumulative in entries if name == 'app' and depth == 0)
+    # `import app` is depth 0; everything it imports directly is depth 1
+    backend = sum(cumulative for depth, name, _, cumulative in entries
+                  if depth == 1 and name.split('.')[0] == 'backend')
+    flask = next(cumulative for depth, name, _, cumulative in entries if name == 'flask' and depth == 1)
+    top = sorted(((cumulative, name) for depth, name, _, cumulative in entries if depth == 1),
+                 reverse=True)[:8]
+    return total / 1000, backend / 1000, flask / 1000, top
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import-time budget of app.py')
+    parser.add_argument('--budget-ms', type=float, default=400, help='budget for `import app`')
+    parser.add_argument('--backend-ratio', type=float, default=0.35,
+                        help="budget for the backend package, as a multiple of Flask's import time")
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters to try (best wins)')
+    args = parser.parse_args()
+
+    runs = [measure_import() for _ in range(args.repeat)]
+    total_ms = min(run[0] for run in runs)
+    # Backend and Flask times of the same interpreter, from the run with the best ratio
+    backend_ms, flask_ms = min(((run[1], run[2]) for run in runs), key=lambda pair: pair[0] / pair[1])
+    ratio = backend_ms / flask_ms
+    print(f'import app: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)')
+    print(f'  backend:  {backend_ms:.1f} ms, {ratio:.2f}x Flask\'s {flask_ms:.1f} ms '
+          f'(budget {args.backend_ratio:.2f}x)')
+    for cumulative, name in runs[-1][3]:
+        print(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+    result = subprocess.run(
+        [sys.executable, '-c', LIGHT_REQUESTS_SCRIPT, json.dumps(HEAVY_MODULES)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    light = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"/health, /api/fields: {light['statuses']}, PDF stack loaded: {light['loaded'] or 'none'}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f'import app took {total_ms:.1f} ms (> {args.budget_ms:.0f} ms)')
+    if ratio > args.backend_ratio:
+        failures.append(f'backend imports took {backend_ms:.1f} ms, {ratio:.2f}x Flask\'s import time '
+                        f'(> {args.backend_ratio:.2f}x)')
+    if light['loaded']:
+        failures.append(f"importing the app or serving /health loaded: {', '.join(light['loaded'])}")
+    if any(status != 200 for status in light['statuses']):
+        failures.append(f"/health or /api/fields failed: {light['statuses']}")
+
+    if failures:
+        print('\nFAILED:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('\nOK')
+
+
+if __name__ == '__main__':
+    main()
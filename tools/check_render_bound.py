@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Check that the payload admission limits bound the worst case render time
+
+Renders the most expensive payload admission accepts: every text field at its
+`max_length` with short words cycling through Hebrew, Latin and Cyrillic (so
+wrapping, BiDi and font fallback all do the most work), every checkbox
+checked, and a signature at MAX_SIGNATURE_PIXELS. Then it checks that
+adversarial payloads are rejected, and rejected quickly.
+
+Fails (exit status 1) if:
+- the worst admissible payload is rejected, or takes longer than --budget-ms
+  to fill (best of --repeat, after a warm-up fill)
+- any adversarial payload is admitted, or its check takes longer than
+  --reject-budget-ms
+- filling fails, or renders differently, without the font metrics table
+  (fonts/font_metrics.bin is built at deploy time; a fresh checkout has none)
+
+Usage: python tools/check_render_bound.py [--budget-ms 1000] [--reject-budget-ms 50]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+import zlib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.admission import (
+    check_payload, MAX_KEYS, MAX_SIGNATURE_BYTES, MAX_SIGNATURE_PIXELS, PNG_MAGIC
+)
+from backend.field_schema import get_schema
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+TEMPLATE_PDF = os.path.join(PROJECT_ROOT, 'templates', 'template.pdf')
+
+# Hebrew, Latin and mixed values, which take different font paths
+SAMPLE_PAYLOADS = (
+    {'employer_last_name': 'כהן'},
+    {'employer_email': 'a@b.com'},
+    {'employer_city': 'תל אביב 5'},
+)
+
+# Two-letter words in three scripts: the most words, BiDi runs and font switches per character
+WORST_CASE_WORDS = ('אב', 'ab', 'жз')
+
+
+def png(width, height, rows=None):
+    """A greyscale PNG; rows=None writes only the header, as an attacker could"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    header = chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+    if rows is None:
+        return PNG_MAGIC + header
+    return PNG_MAGIC + header + chunk(b'IDAT', zlib.compress(rows, 9)) + chunk(b'IEND', b'')
+
+
+def worst_case_text(length):
+    text = ''
+    index = 0
+    while len(text) < length:
+        text += WORST_CASE_WORDS[index % len(WORST_CASE_WORDS)] + ' '
+        index += 1
+    return text[:length]
+
+
+def worst_case_payload():
+    """The most expensive form data that admission accepts"""
+    payload = {}
+    for name, field in get_schema().fields.items():
+        payload[name] = True if field['type'] == 'checkbox' else worst_case_text(field['max_length'])
+
+    # A compressible signature as large as allowed, with a stroke so it isn't blank
+    width = 2048
+    height = MAX_SIGNATURE_PIXELS // width
+    row = b'\0' + bytes(255 if 100 < x < 1900 else 0 for x in range(width))
+    blank = b'\0' + bytes(width)
+    rows = b''.join(row if y % 50 == 0 else blank for y in range(height))
+    payload['signature_image'] = 'data:image/png;base64,' + base64.b64encode(png(width, height, rows)).decode()
+    return payload
+
+
+def adversarial_payloads():
+    """(description, form data) that admission must reject"""
+    deep = {}
+    node = deep
+    for _ in range(10000):
+        node['x'] = {}
+        node = node['x']
+    return [
+        ('nesting 10000 deep', deep),
+        (f'{MAX_KEYS * 40} unknown keys', {f'key_{i}': 'x' for i in range(MAX_KEYS * 40)}),
+        ('1MB multiline text', {'notes': 'אב ' * 350000}),
+        ('list value', {'notes': ['x'] * 100000}),
+        (f'signature over {MAX_SIGNATURE_BYTES} bytes',
+         {'signature_image': 'data:image/png;base64,' + 'A' * (MAX_SIGNATURE_BYTES * 2)}),
+        ('30000x30000 signature header',
+         {'signature_image': 'data:image/png;base64,' + base64.b64encode(png(30000, 30000)).decode()}),
+        ('signature that is not an image', {'signature_image': base64.b64encode(b'GIF89a' * 10).decode()}),
+    ]
+
+
+def fill_digests(payloads):
+    """SHA-256 of the filled PDF of each payload"""
+    from backend.pdf_filler import fill_pdf_form
+    return [hashlib.sha256(fill_pdf_form(TEMPLATE_PDF, payload)).hexdigest() for payload in payloads]
+
+
+def check_without_metrics_table(payloads):
+    """Fill payloads in a child process that has no metrics table; failure message or None"""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--without-metrics-table'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return f'filling without the metrics table failed:\n{result.stderr.strip()[-2000:]}'
+    if json.loads(result.stdout.strip().splitlines()[-1]) != fill_digests(payloads):
+        return 'filling without the metrics table renders differently'
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the worst case render time under admission limits')
+    parser.add_argument('--budget-ms', type=float, default=1000,
+                        help='budget for filling the worst admissible payload')
+    parser.add_argument('--reject-budget-ms', type=float, default=50,
+                        help='budget for rejecting each adversarial payload')
+    parser.add_argument('--repeat', type=int, default=3, help='fills to time (best wins)')
+    # Internal: the child process of check_without_metrics_table()
+    parser.add_argument('--without-metrics-table', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    payload = worst_case_payload()
+    if args.without_metrics_table:
+        from backend import font_metrics
+        font_metrics.METRICS_PATH = os.path.join(PROJECT_ROOT, 'fonts', 'missing_font_metrics.bin')
+        print(json.dumps(fill_digests(list(SAMPLE_PAYLOADS) + [payload])))
+        return
+
+    from backend.pdf_filler import fill_pdf_form
+    failures = []
+
+    admission = check_payload(payload)
+    if not admission['valid']:
+        failures.append(f"worst admissible payload was rejected: {admission['errors']}")
+    fill_pdf_form(TEMPLATE_PDF, payload)  # Warm up fonts and the compiled template
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        fill_pdf_form(TEMPLATE_PDF, payload)
+        times.append((time.perf_counter() - start) * 1000)
+    fill_ms = min(times)
+    print(f'worst admissible payload: {fill_ms:.1f} ms (budget {args.budget_ms:.0f} ms)')
+    if fill_ms > args.budget_ms:
+        failures.append(f'worst admissible payload took {fill_ms:.1f} ms (> {args.budget_ms:.0f} ms)')
+
+    for description, form_data in adversarial_payloads():
+        start = time.perf_counter()
+        admission = check_payload(form_data)
+        check_ms = (time.perf_counter() - start) * 1000
+        reasons = '; '.join(admission['errors'])[:100]
+        print(f'  {description}: {check_ms:.2f} ms, {"admitted" if admission["valid"] else reasons}')
+        if admission['valid']:
+            failures.append(f'{description} was admitted')
+        elif check_ms > args.reject_budget_ms:
+            failures.append(f'rejecting {description} took {check_ms:.1f} ms (> {args.reject_budget_ms:.0f} ms)')
+
+    error = check_without_metrics_table(list(SAMPLE_PAYLOADS) + [payload])
+    print(f'without the metrics table: {"identical output" if error is None else "FAILED"}')
+    if error:
+        failures.append(error)
+
+    if failures:
+        print('\nFAILED:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('\nOK')
+
+
+if __name__ == '__main__':
+    main()
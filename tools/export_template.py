@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Export the built-in form as a template registry definition
+
+Writes field_mapping.py's fields, checkbox groups and signature boxes in the
+format of templates/forms/ (see form_registry.py), as a starting point for a
+new form or a revision of the visit report. Copy its PDF next to the output
+file, rename the output to the new template ID and adjust the coordinates.
+"""
+import json
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.field_mapping import CHECKBOX_GROUPS, CHECKBOX_SIZE, FORM_FIELDS, HEBREW_FONT_SIZE, SIGNATURE_CONFIGS
+from backend.form_registry import REGISTRY_DIR
+from backend.pdf_validator import EXPECTED_PAGE_COUNT
+
+# Text fields without a max_length are truncated to 100 characters when drawn
+DEFAULT_MAX_LENGTH = 100
+
+
+def main():
+    output_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(REGISTRY_DIR, "visit_report_copy.json")
+
+    fields = {}
+    for field_name, field_config in FORM_FIELDS.items():
+        fields[field_name] = dict(field_config)
+        if not field_config.get("checkbox"):
+            fields[field_name].setdefault("max_length", DEFAULT_MAX_LENGTH)
+
+    definition = {
+        "name": "Visit report (copy)",
+        "pdf": "template.pdf",
+        "page_count": EXPECTED_PAGE_COUNT,
+        "fonts": {"text_size": HEBREW_FONT_SIZE, "checkbox_size": CHECKBOX_SIZE},
+        "fields": fields,
+        "checkbox_groups": CHECKBOX_GROUPS,
+        "signatures": SIGNATURE_CONFIGS,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        json.dump(definition, output_file, ensure_ascii=False, indent=2)
+    print(f"Created: {output_path} ({len(fields)} fields)")
+    print("Copy the form's PDF next to it as template.pdf (or edit \"pdf\")")
+
+
+if __name__ == "__main__":
+    main()
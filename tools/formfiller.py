@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+formfiller - fill PDFs from NDJSON payloads in resident worker processes
+
+Reads one form data object per line (the JSON body of /api/fill) from a file
+or stdin, and writes the filled PDFs to a directory or as a tar stream. The
+interpreter, PDF stack, fonts and template are loaded once per worker, not
+once per document (see src/backend/bulk_fill.py).
+
+Usage:
+    # Fill every payload on all cores into out/
+    python tools/formfiller.py payloads.ndjson --output-dir out/
+
+    # Stream from another program, tar to stdout, files named by employer_id
+    generate_reports | python tools/formfiller.py --tar - --name-field employer_id > reports.tar
+
+    # A form from the template registry, 4 workers
+    python tools/formfiller.py payloads.ndjson --template visit_report_2026 --jobs 4 -d out/
+
+A JSON status line per record goes to stderr, e.g.
+    {"line": 3, "file": "000003.pdf", "status": "ok", "bytes": 224662, "ms": 41.2}
+    {"line": 4, "file": null, "status": "error", "error": "visit_date_day: 4 characters (limit 2)"}
+followed by a summary. Rejected or failing records don't stop the run; the
+exit status is 1 if any record failed.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+import tarfile
+import time
+from io import BytesIO
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.bulk_fill import BulkFiller, CHUNK_SIZE
+from backend.form_registry import REGISTRY_DIR, TemplateRegistry
+from backend.pdf_output import DEFAULT_OUTPUT_MODE, OUTPUT_MODES
+
+# File systems limit names to 255 bytes; leave room for suffixes and ".pdf.tmp"
+MAX_NAME_BYTES = 200
+
+
+def read_records(input_file, name_field, report):
+    """
+    Parse NDJSON lines into ((line, file name), form_data) records.
+
+    Lines that aren't JSON are reported as failed here and not filled.
+    """
+    for line_number, line in enumerate(input_file, 1):
+        if not line.strip():
+            continue
+        try:
+            form_data = json.loads(line)
+        except json.JSONDecodeError as e:
+            report({'line': line_number, 'file': None, 'status': 'error',
+                    'error': f'Invalid JSON: {e}'})
+            continue
+        name = None
+        if name_field and isinstance(form_data, dict) and form_data.get(name_field):
+            name = file_name_part(str(form_data[name_field]))
+        yield (line_number, name or f'{line_number:06d}'), form_data
+
+
+def file_name_part(value):
+    """
+    `value` made safe for a file name. Values too long for one are cut short
+    and end in a hash of the whole value, so they stay distinct.
+    """
+    name = re.sub(r'[^\w.-]', '_', value)
+    encoded = name.encode('utf-8')
+    if len(encoded) > MAX_NAME_BYTES:
+        digest = hashlib.sha256(value.encode('utf-8')).hexdigest()[:8]
+        name = encoded[:MAX_NAME_BYTES - 9].decode('utf-8', 'ignore') + '-' + digest
+    return name
+
+
+def unique_file_name(names, name, line_number):
+    """
+    `name`.pdf, or with the line number appended if that file name was used
+    already (and then a counter, until the file name is unused).
+    """
+    file_name = f'{name}.pdf'
+    candidates = (f'{name}-{line_number}' + (f'-{n}' if n > 1 else '') for n in itertools.count(1))
+    while file_name in names:
+        file_name = f'{next(candidates)}.pdf'
+    names.add(file_name)
+    return file_name
+
+
+class DirectoryOutput:
+    """Writes each PDF to a file in a directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.names = set()
+
+    def write(self, name, line_number, pdf):
+        file_name = unique_file_name(self.names, name, line_number)
+        path = os.path.join(self.directory, file_name)
+        # Never leave a truncated PDF behind if the run is interrupted
+        with open(path + '.tmp', 'wb') as pdf_file:
+            pdf_file.write(pdf)
+        os.replace(path + '.tmp', path)
+        return file_name
+
+    def close(self):
+        pass
+
+
+class TarOutput:
+    """Writes the PDFs as members of an uncompressed tar stream"""
+
+    def __init__(self, path):
+        if path == '-':
+            # The stream gets its own copy of stdout; anything else printed
+            # there, by this process or the workers, goes to stderr instead
+            sys.stdout.flush()
+            self.file = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+            os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        else:
+            self.file = open(path, 'wb')
+        self.tar = tarfile.open(fileobj=self.file, mode='w|')
+        self.names = set()
+
+    def write(self, name, line_number, pdf):
+        file_name = unique_file_name(self.names, name, line_number)
+        info = tarfile.TarInfo(file_name)
+        info.size = len(pdf)
+        info.mtime = int(time.time())
+        self.tar.addfile(info, BytesIO(pdf))
+        return file_name
+
+    def close(self):
+        self.tar.close()
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill PDFs from NDJSON form payloads')
+    parser.add_argument('input', nargs='?', default='-', help="NDJSON payloads ('-' = stdin, the default)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('-d', '--output-dir', help='write PDFs to this directory')
+    output.add_argument('--tar', metavar='PATH', help="write PDFs as a tar stream ('-' = stdout)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--template', default='visit_report', help='template ID (see form_registry.py)')
+    parser.add_argument('--registry', default=REGISTRY_DIR, help='directory of form definitions')
+    parser.add_argument('--name-field', help='name each PDF after this field (default: line number)')
+    parser.add_argument('--output-mode', choices=OUTPUT_MODES, default=DEFAULT_OUTPUT_MODE,
+                        help='fast (append to the template) or small (compacted files)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='records per worker task')
+    args = parser.parse_args()
+
+    if args.tar == '-' and sys.stdout.isatty():
+        parser.error('refusing to write a tar stream to a terminal')
+    registry = TemplateRegistry(args.registry)
+    registry.refresh()
+    form = registry.get(args.template)
+    if form is None:
+        parser.error(f'unknown template {args.template!r} '
+                     f'(have: {", ".join(t.template_id for t in registry.templates())})')
+
+    failed = []
+
+    def report(status):
+        print(json.dumps(status, ensure_ascii=False), file=sys.stderr, flush=True)
+
+    def report_failure(status):
+        failed.append(status['line'])
+        report(status)
+
+    filled = 0
+    start = time.perf_counter()
+    input_file = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    writer = TarOutput(args.tar) if args.tar else DirectoryOutput(args.output_dir)
+    try:
+        with BulkFiller(form.pdf_path, form, args.jobs, args.chunk_size, args.output_mode) as filler:
+            records = read_records(input_file, args.name_field, report_failure)
+            for result in filler.fill(records):
+                line_number, name = result.key
+                if result.error:
+                    report_failure({'line': line_number, 'file': None, 'status': 'error', 'error': result.error})
+                    continue
+                try:
+                    file_name = writer.write(name, line_number, result.pdf)
+                except OSError as e:
+                    report_failure({'line': line_number, 'file': None, 'status': 'error',
+                                    'error': f'Could not write the PDF: {e}'})
+                    continue
+                filled += 1
+                report({'line': line_number, 'file': file_name, 'status': 'ok',
+                        'bytes': len(result.pdf), 'ms': round(result.seconds * 1000, 1)})
+    except KeyboardInterrupt:
+        report({'status': 'interrupted', 'filled': filled, 'failed': len(failed)})
+        sys.exit(130)
+    finally:
+        writer.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+
+    elapsed = time.perf_counter() - start
+    report({'status': 'done', 'filled': filled, 'failed': len(failed), 'jobs': args.jobs,
+            'seconds': round(elapsed, 2), 'per_second': round(filled / elapsed, 1) if elapsed else None})
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Import visit reports from a CSV or XLSX export, one PDF per row
+
+Maps columns onto form fields with a mapping file (see
+src/backend/spreadsheet_import.py), fills the rows in resident worker
+processes (see src/backend/bulk_fill.py) and writes <row id>.pdf files. Each
+row's ID is appended to a checkpoint file once its PDF is written, so running
+the same command again after an interruption skips the finished rows.
+
+Usage:
+    python tools/import_spreadsheet.py visits.csv --mapping mapping.json -d reports/
+    python tools/import_spreadsheet.py visits.xlsx --sheet "ביקורים" --mapping mapping.yaml -d reports/ --jobs 4
+
+Progress and throughput are printed to stderr every few seconds, along with
+each row that could not be filled (bad dates, values over the field limits).
+The exit status is 1 if any row failed; failed rows are retried on the next run.
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.bulk_fill import BulkFiller, CHUNK_SIZE
+from backend.form_registry import REGISTRY_DIR, TemplateRegistry, load_definition
+from backend.pdf_output import DEFAULT_OUTPUT_MODE, OUTPUT_MODES
+from backend.spreadsheet_import import Checkpoint, ColumnMapping, count_rows, read_rows
+
+CHECKPOINT_NAME = '.import-checkpoint'
+
+
+class Progress:
+    """Counts rows and prints a progress line every interval seconds"""
+
+    def __init__(self, total, interval):
+        self.total = total
+        self.interval = interval
+        self.written = 0
+        self.failed = 0
+        self.skipped = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def tick(self):
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.start
+        filled = self.written + self.failed
+        rate = filled / elapsed if elapsed else 0.0
+        seen = filled + self.skipped
+        line = f'{seen:,}'
+        if self.total:
+            line += f'/{self.total:,} rows ({seen / self.total:.0%})'
+        else:
+            line += ' rows'
+        line += (f' | {self.written:,} written, {self.failed:,} failed, {self.skipped:,} already done'
+                 f' | {rate:.1f} rows/s')
+        if self.total and rate and not final:
+            remaining = max(self.total - seen, 0) / rate
+            line += f' | ETA {int(remaining // 60)}m{int(remaining % 60):02d}s'
+        if final:
+            line += f' | {elapsed:.1f}s'
+        print(line, file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill one PDF per row of a CSV or XLSX file')
+    parser.add_argument('input', help='CSV or XLSX file (XLSX needs openpyxl)')
+    parser.add_argument('--mapping', required=True, help='column mapping file (JSON or YAML)')
+    parser.add_argument('-d', '--output-dir', required=True, help='write <row id>.pdf files here')
+    parser.add_argument('--checkpoint', help=f'completed row IDs (default: <output dir>/{CHECKPOINT_NAME})')
+    parser.add_argument('--sheet', help='XLSX worksheet (default: the active one)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--template', default='visit_report', help='template ID (see form_registry.py)')
+    parser.add_argument('--registry', default=REGISTRY_DIR, help='directory of form definitions')
+    parser.add_argument('--output-mode', choices=OUTPUT_MODES, default=DEFAULT_OUTPUT_MODE,
+                        help='fast (append to the template) or small (compacted files)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per worker task')
+    parser.add_argument('--interval', type=float, default=5, help='seconds per progress line')
+    args = parser.parse_args()
+
+    registry = TemplateRegistry(args.registry)
+    registry.refresh()
+    form = registry.get(args.template)
+    if form is None:
+        parser.error(f'unknown template {args.template!r}')
+    try:
+        mapping = ColumnMapping(load_definition(args.mapping), form.fields)
+        headers, rows = read_rows(args.input, args.sheet)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    missing = mapping.missing_headers(headers)
+    if missing:
+        parser.error(f'columns not in {args.input}: {", ".join(missing)}')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.output_dir, CHECKPOINT_NAME))
+    progress = Progress(count_rows(args.input, args.sheet), args.interval)
+    if len(checkpoint):
+        print(f'Resuming: {len(checkpoint):,} rows already done', file=sys.stderr)
+
+    def report_failure(row_number, row_id, message):
+        progress.failed += 1
+        print(f'Row {row_number} ({row_id}): {message}', file=sys.stderr, flush=True)
+
+    def records():
+        """(row number, row ID), form data of the rows still to fill"""
+        seen = set()
+        for row_number, row in rows:
+            row_id = mapping.row_id(row, row_number)
+            if row_id in seen:
+                report_failure(row_number, row_id, 'duplicate row ID')
+                continue
+            seen.add(row_id)
+            if row_id in checkpoint:
+                progress.skipped += 1
+                continue
+            try:
+                form_data = mapping.form_data(row)
+            except ValueError as e:
+                report_failure(row_number, row_id, e)
+                continue
+            yield (row_number, row_id), form_data
+
+    try:
+        with BulkFiller(form.pdf_path, form, args.jobs, args.chunk_size, args.output_mode) as filler:
+            for result in filler.fill(records()):
+                row_number, row_id = result.key
+                if result.error:
+                    report_failure(row_number, row_id, result.error)
+                else:
+                    path = os.path.join(args.output_dir, f'{row_id}.pdf')
+                    try:
+                        # A PDF is only ever complete: written aside, then renamed
+                        with open(path + '.tmp', 'wb') as pdf_file:
+                            pdf_file.write(result.pdf)
+                        os.replace(path + '.tmp', path)
+                    except OSError as e:
+                        report_failure(row_number, row_id, f'could not write the PDF: {e}')
+                    else:
+                        checkpoint.add(row_id)
+                        progress.written += 1
+                progress.tick()
+    except KeyboardInterrupt:
+        progress.report(final=True)
+        print(f'Interrupted - rerun the same command to resume ({len(checkpoint):,} rows done)',
+              file=sys.stderr)
+        sys.exit(130)
+    finally:
+        checkpoint.close()
+
+    progress.report(final=True)
+    sys.exit(1 if progress.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
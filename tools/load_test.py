@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Local HTTP load test - start the app, drive a traffic mix, report latency over time
+
+Runs entirely on this machine: the app is started as a subprocess (gunicorn or
+the Flask dev server) and driven with synthetic payloads from bench/corpus.py
+or an NDJSON corpus file. Uploads use the template PDF.
+
+Usage:
+    # 8 clients in a closed loop for 30s against 2 gunicorn workers
+    python tools/load_test.py --server gunicorn --workers 2 --concurrency 8 --duration 30
+
+    # Fixed arrival rate (open loop), 10% uploads, 5% validations
+    python tools/load_test.py --rate 5 --mix fill=85,fill-uploaded=10,validate=5
+
+    # Against an already running instance
+    python tools/load_test.py --server none --url http://127.0.0.1:5001
+
+In fixed-rate mode latency is measured from each request's scheduled start, so
+queueing behind a saturated server shows up in the percentiles instead of
+silently lowering the request rate.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'bench'))
+
+from corpus import iter_corpus, read_corpus
+
+TEMPLATE_PATH = os.path.join(PROJECT_ROOT, 'templates', 'template.pdf')
+ENDPOINTS = {
+    'fill': '/api/fill',
+    'fill-uploaded': '/api/fill-uploaded',
+    'validate': '/api/validate-pdf',
+}
+STARTUP_TIMEOUT = 30  # Seconds to wait for /health
+
+
+def parse_mix(text):
+    """Parse 'fill=8,fill-uploaded=1' into [(endpoint, weight), ...]"""
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'Unknown endpoint {name!r} (use {", ".join(ENDPOINTS)})')
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def multipart_body(fields, files):
+    """Encode form fields and (name, filename, bytes) files as multipart/form-data"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                     .encode('utf-8') + value.encode('utf-8') + b'\r\n')
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: application/pdf\r\n\r\n'
+                     .encode('utf-8') + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode('ascii'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class RequestFactory:
+    """Builds request bodies for each endpoint, cycling through the corpus"""
+
+    def __init__(self, payloads, pdf_bytes):
+        self._payloads = itertools.cycle(payloads)
+        self._lock = threading.Lock()
+        self.pdf_bytes = pdf_bytes
+
+    def build(self, endpoint):
+        """Return (path, body, content type)"""
+        with self._lock:
+            payload = next(self._payloads)
+        if endpoint == 'fill':
+            return ENDPOINTS[endpoint], json.dumps(payload).encode('utf-8'), 'application/json'
+        fields = {'form_data': json.dumps(payload)} if endpoint == 'fill-uploaded' else {}
+        body, content_type = multipart_body(fields, [('pdf_file', 'report.pdf', self.pdf_bytes)])
+        return ENDPOINTS[endpoint], body, content_type
+
+
+class Recorder:
+    """Collects (endpoint, start, latency, ok, bytes) samples from all clients"""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, start, latency, ok, size):
+        with self._lock:
+            self.samples.append((endpoint, start, latency, ok, size))
+
+    def window(self, since, until):
+        with self._lock:
+            return [s for s in self.samples if since <= s[1] + s[2] < until]
+
+
+def send(url, path, body, content_type, timeout):
+    """POST a request; returns (ok, response size)"""
+    parsed = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+    try:
+        connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+        response = connection.getresponse()
+        data = response.read()
+        return response.status == 200, len(data)
+    except (OSError, http.client.HTTPException):
+        return False, 0
+    finally:
+        connection.close()
+
+
+def closed_loop(args, factory, recorder, mix, deadline):
+    """`concurrency` clients, each sending its next request as soon as one completes"""
+    names, weights = zip(*mix)
+
+    def client(seed):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            endpoint = rng.choices(names, weights)[0]
+            path, body, content_type = factory.build(endpoint)
+            start = time.monotonic()
+            ok, size = send(args.url, path, body, content_type, args.timeout)
+            recorder.add(endpoint, start, time.monotonic() - start, ok, size)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True)
+               for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def open_loop(args, factory, recorder, mix, deadline):
+    """Requests scheduled at a fixed arrival rate, served by a pool of clients"""
+    names, weights = zip(*mix)
+    scheduled = queue.Queue()
+
+    def scheduler():
+        rng = random.Random(0)
+        next_start = time.monotonic()
+        while next_start < deadline:
+            scheduled.put((next_start, rng.choices(names, weights)[0]))
+            next_start += 1.0 / args.rate
+            time.sleep(max(0.0, next_start - time.monotonic()))
+        for _ in range(args.max_inflight):
+            scheduled.put(None)
+
+    def client():
+        while True:
+            item = scheduled.get()
+            if item is None:
+                return
+            start, endpoint = item
+            path, body, content_type = factory.build(endpoint)
+            ok, size = send(args.url, path, body, content_type, args.timeout)
+            recorder.add(endpoint, start, time.monotonic() - start, ok, size)
+
+    threads = [threading.Thread(target=scheduler, daemon=True)]
+    threads += [threading.Thread(target=client, daemon=True) for _ in range(args.max_inflight)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def process_tree_rss(pid):
+    """Resident memory (KB) of a process and its descendants, from /proc (Linux only)"""
+    children = {}
+    try:
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f'/proc/{entry}/stat') as stat_file:
+                        fields = stat_file.read().rsplit(')', 1)[1].split()
+                    children.setdefault(int(fields[1]), []).append(int(entry))
+                except OSError:
+                    continue
+    except OSError:
+        return None
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f'/proc/{current}/status') as status_file:
+                for line in status_file:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, seconds):
+    latencies = sorted(s[2] for s in samples)
+    errors = sum(1 for s in samples if not s[3])
+    return {
+        'requests': len(samples),
+        'throughput_per_s': round(len(samples) / seconds, 2) if seconds else 0.0,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+def start_server(args):
+    """Start the app as a subprocess and wait until /health answers"""
+    port = urllib.parse.urlsplit(args.url).port
+    env = dict(os.environ)
+    if args.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(args.workers), '--threads', str(args.threads)]
+    else:
+        # Flask dev server: threaded, no reloader
+        command = [sys.executable, '-c',
+                   f'from app import app; app.run(host="127.0.0.1", port={port}, threaded=True)']
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    parsed = urllib.parse.urlsplit(args.url)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{args.server} exited with status {process.returncode}')
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=1)
+        try:
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            pass  # Not listening yet
+        finally:
+            connection.close()
+        # Also after a non-200 answer, e.g. while workers are still booting
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{args.server} did not answer /health within {STARTUP_TIMEOUT}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the form filler locally')
+    parser.add_argument('--server', choices=['gunicorn', 'dev', 'none'], default='gunicorn',
+                        help="server to start ('none' = use a running instance at --url)")
+    parser.add_argument('--url', default='http://127.0.0.1:5055', help='base URL of the app')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('fill=8,fill-uploaded=1,validate=1'),
+                        help='endpoint weights, e.g. fill=8,fill-uploaded=1,validate=1')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', type=int, default=4, help='closed-loop clients (default)')
+    mode.add_argument('--rate', type=float, help='open-loop arrival rate in requests/second')
+    parser.add_argument('--max-inflight', type=int, default=64, help='client pool size for --rate')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load')
+    parser.add_argument('--interval', type=float, default=5, help='seconds per progress line')
+    parser.add_argument('--corpus', help='NDJSON payloads (default: 200 generated by bench/corpus.py)')
+    parser.add_argument('--timeout', type=float, default=60, help='per-request timeout')
+    parser.add_argument('-o', '--output', help='write the report JSON here')
+    args = parser.parse_args()
+
+    payloads = list(read_corpus(args.corpus)) if args.corpus else list(iter_corpus(200, seed=0))
+    with open(TEMPLATE_PATH, 'rb') as template_file:
+        factory = RequestFactory(payloads, template_file.read())
+    recorder = Recorder()
+
+    process = start_server(args) if args.server != 'none' else None
+    try:
+        start = time.monotonic()
+        deadline = start + args.duration
+        if args.rate:
+            print(f'Open loop at {args.rate}/s for {args.duration:.0f}s against {args.url}')
+            threads = open_loop(args, factory, recorder, args.mix, deadline)
+        else:
+            print(f'{args.concurrency} clients for {args.duration:.0f}s against {args.url}')
+            threads = closed_loop(args, factory, recorder, args.mix, deadline)
+
+        timeline = []
+        print(f"{'time':>6} {'req/s':>7} {'errors':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'rss MB':>8}")
+        window_start = start
+        while time.monotonic() < deadline or any(t.is_alive() for t in threads):
+            time.sleep(args.interval)
+            now = time.monotonic()
+            rss = process_tree_rss(process.pid) if process else None
+            stats = summarize(recorder.window(window_start, now), now - window_start)
+            stats.update({'elapsed_s': round(now - start, 1), 'server_rss_kb': rss})
+            timeline.append(stats)
+            print(f"{stats['elapsed_s']:6.0f} {stats['throughput_per_s']:7.1f} "
+                  f"{stats['error_rate']:7.1%} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+                  f"{stats['p99_ms']:8.1f} {rss / 1024 if rss else float('nan'):8.1f}")
+            window_start = now
+        elapsed = time.monotonic() - start
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = {
+        'config': {'server': args.server, 'workers': args.workers, 'threads': args.threads,
+                   'mix': dict(args.mix), 'concurrency': None if args.rate else args.concurrency,
+                   'rate': args.rate, 'duration_s': args.duration},
+        'overall': summarize(recorder.samples, elapsed),
+        'endpoints': {
+            name: summarize([s for s in recorder.samples if s[0] == name], elapsed)
+            for name in sorted({s[0] for s in recorder.samples})
+        },
+        'timeline': timeline,
+    }
+    print('\n{:13} '.format('overall') + json.dumps(report['overall']))
+    for name, stats in report['endpoints'].items():
+        print(f'{name:13} ' + json.dumps(stats))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()